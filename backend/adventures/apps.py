@@ -32,4 +32,7 @@ class AdventuresConfig(AppConfig):
     def ready(self):
         from backup_scheduler import start_backup_scheduler
 
+        from .views.embedding_index import connect_embedding_signals
+
         start_backup_scheduler()
+        connect_embedding_signals()
@@ -0,0 +1,129 @@
+"""Public catalog read model: one `PublishedCatalogEntry` row per published template.
+
+The catalog list reads only this table. Rows are rebuilt on publish and by the
+`refresh_catalog` command, and nudged in place by the cheap events that happen
+often (a run started, the template renamed, cards added or deleted), so the list
+never joins or counts.
+"""
+from __future__ import annotations
+
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, Max, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import (
+    Adventure,
+    AdventureEvent,
+    Character,
+    Faction,
+    Location,
+    PublishedAdventure,
+    PublishedCatalogEntry,
+    Race,
+    SkillSystem,
+)
+
+CATALOG_COUNTS = {
+    "locations_count": Location,
+    "characters_count": Character,
+    "races_count": Race,
+    "factions_count": Faction,
+    "systems_count": SkillSystem,
+    "events_count": AdventureEvent,
+}
+CATALOG_FIELDS = (
+    "title",
+    "description",
+    "author_username",
+    "published_at",
+    *CATALOG_COUNTS,
+    "runs_count",
+    "last_run_at",
+    "last_activity_at",
+    "updated_at",
+)
+
+
+def _count(queryset, field: str = "adventure"):
+    counted = queryset.order_by().values(field).annotate(total=Count("*")).values("total")
+    return Coalesce(Subquery(counted, output_field=IntegerField()), Value(0))
+
+
+def refresh_catalog(adventure_ids=None) -> int:
+    """Rebuilds catalog rows of the given templates (all when `None`); returns the row count."""
+    published = PublishedAdventure.objects.all()
+    if adventure_ids is not None:
+        published = published.filter(adventure_id__in=adventure_ids)
+    runs = Adventure.objects.filter(template_adventure=OuterRef("adventure_id"))
+    rows = published.values(
+        "adventure_id",
+        "published_at",
+        title=F("adventure__title"),
+        description=F("adventure__description"),
+        author_username=F("adventure__author_user__username"),
+        edited_at=F("adventure__updated_at"),
+        runs_count=_count(runs, "template_adventure"),
+        last_run_at=Subquery(
+            runs.order_by().values("template_adventure").annotate(last=Max("created_at")).values("last")
+        ),
+        **{
+            name: _count(model.objects.filter(adventure=OuterRef("adventure_id")))
+            for name, model in CATALOG_COUNTS.items()
+        },
+    )
+    now = timezone.now()
+    entries = []
+    for row in rows:
+        edited_at = row.pop("edited_at")
+        moments = [row["published_at"], edited_at, row["last_run_at"]]
+        row["last_activity_at"] = max(moment for moment in moments if moment is not None)
+        entries.append(PublishedCatalogEntry(updated_at=now, **row))
+
+    with transaction.atomic():
+        stale = PublishedCatalogEntry.objects.exclude(adventure_id__in=[entry.adventure_id for entry in entries])
+        if adventure_ids is not None:
+            stale = stale.filter(adventure_id__in=adventure_ids)
+        stale.delete()
+        PublishedCatalogEntry.objects.bulk_create(
+            entries,
+            update_conflicts=True,
+            unique_fields=["adventure"],
+            update_fields=list(CATALOG_FIELDS),
+        )
+    return len(entries)
+
+
+def note_run_started(template: Adventure, started_at) -> None:
+    """Counts a new run of the template without recounting its runs."""
+    PublishedCatalogEntry.objects.filter(adventure=template).update(
+        runs_count=F("runs_count") + 1,
+        last_run_at=started_at,
+        last_activity_at=started_at,
+        updated_at=timezone.now(),
+    )
+
+
+def note_cards_changed(template: Adventure, counts: dict[str, int]) -> None:
+    """Shifts the card counts of the template's catalog row by `{model label: delta}`."""
+    if not template.is_template:
+        return
+    changes = {
+        name: F(name) + counts[model._meta.label]
+        for name, model in CATALOG_COUNTS.items()
+        if counts.get(model._meta.label)
+    }
+    if changes:
+        PublishedCatalogEntry.objects.filter(adventure=template).update(
+            **changes, updated_at=timezone.now()
+        )
+
+
+def note_template_edited(template: Adventure) -> None:
+    """Copies the edited title and description into the template's catalog row, if any."""
+    PublishedCatalogEntry.objects.filter(adventure=template).update(
+        title=template.title,
+        description=template.description,
+        last_activity_at=template.updated_at,
+        updated_at=timezone.now(),
+    )
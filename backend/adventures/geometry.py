@@ -0,0 +1,66 @@
+"""PostgreSQL geometric expressions over location rectangles.
+
+A location covers the cells `[x, x + width) x [y, y + height)`. `LocationBox` is
+the `box` of that rectangle and is the expression indexed by
+`idx_locations_box_gist`, so filters and orderings must use it verbatim for the
+planner to pick the index.
+"""
+from __future__ import annotations
+
+from django.db import models
+from django.db.models import F, Func, Value
+
+
+class BoxField(models.Field):
+    """Output type of `box` expressions; never used as a column."""
+
+    def db_type(self, connection):
+        return "box"
+
+
+class PointField(models.Field):
+    def db_type(self, connection):
+        return "point"
+
+
+class Point(Func):
+    function = "point"
+    output_field = PointField()
+
+
+class Box(Func):
+    function = "box"
+    output_field = BoxField()
+
+
+class LocationBox(Box):
+    def __init__(self) -> None:
+        super().__init__(
+            Point(F("x"), F("y")),
+            Point(F("x") + F("width"), F("y") + F("height")),
+        )
+
+
+def rectangle(x: float, y: float, width: float, height: float) -> Box:
+    return Box(Point(Value(x), Value(y)), Point(Value(x + width), Value(y + height)))
+
+
+class Distance(Func):
+    """`box <-> point`: zero inside the box; KNN-ordered by the GiST index."""
+
+    arg_joiner = " <-> "
+    template = "(%(expressions)s)"
+    output_field = models.FloatField()
+
+    def __init__(self, box, x: float, y: float) -> None:
+        super().__init__(box, Point(Value(float(x)), Value(float(y))))
+
+
+@BoxField.register_lookup
+class Overlaps(models.Lookup):
+    lookup_name = "overlaps"
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f"{lhs} && {rhs}", (*lhs_params, *rhs_params)
@@ -0,0 +1,84 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from adventures.catalog import refresh_catalog
+from adventures.models import PublishedAdventure
+from benchmarks.worldgen import SIZES, generate_run, generate_template, resolve_size
+
+
+class Command(BaseCommand):
+    help = "Generate a deterministic synthetic template and runs for scale testing."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--size", choices=sorted(SIZES), default="medium")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--runs", type=int, default=1, help="runs of the template to create")
+        parser.add_argument("--author", default="worldgen", help="template author, created if missing")
+        parser.add_argument("--player", default="", help="player of the runs (defaults to the author)")
+        parser.add_argument("--publish", action="store_true", help="publish the template for all players")
+        for name in (
+            "locations",
+            "races",
+            "characters",
+            "systems",
+            "techniques-per-system",
+            "factions",
+            "other-info",
+            "events",
+            "history",
+        ):
+            parser.add_argument(f"--{name}", type=int, default=None, help=f"override the preset {name}")
+
+    def _get_user(self, username: str):
+        user_model = get_user_model()
+        user = user_model.objects.filter(username=username).first()
+        if user is None:
+            user = user_model.objects.create_user(
+                username=username, email=f"{username}@worldgen.local", password=None
+            )
+        return user
+
+    def handle(self, *args, **options):
+        size = resolve_size(
+            options["size"],
+            locations=options["locations"],
+            races=options["races"],
+            characters=options["characters"],
+            systems=options["systems"],
+            techniques_per_system=options["techniques_per_system"],
+            factions=options["factions"],
+            other_info=options["other_info"],
+            events=options["events"],
+            history=options["history"],
+        )
+        seed = options["seed"]
+        author = self._get_user(options["author"])
+        player = self._get_user(options["player"]) if options["player"] else author
+
+        started = time.perf_counter()
+        with transaction.atomic():
+            template = generate_template(author, size, seed=seed)
+            if options["publish"]:
+                PublishedAdventure.objects.create(adventure=template)
+        self.stdout.write(f"Template {template.id} ({size}) in {time.perf_counter() - started:.1f}s")
+
+        for index in range(options["runs"]):
+            started = time.perf_counter()
+            with transaction.atomic():
+                run = generate_run(
+                    template,
+                    player,
+                    size,
+                    seed=seed,
+                    run_index=index,
+                    progress=lambda created: self.stderr.write(f"  {created} history entries"),
+                )
+            self.stdout.write(
+                f"Run {run.id} with {size.history} history entries in {time.perf_counter() - started:.1f}s"
+            )
+        if options["publish"]:
+            refresh_catalog([template.id])
+        self.stdout.write(self.style.SUCCESS(f"World {seed} generated: template {template.id}"))
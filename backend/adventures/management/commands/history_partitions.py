@@ -0,0 +1,134 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from adventures.models import AdventureHistory
+
+TABLE = AdventureHistory._meta.db_table
+PARTITIONS_SQL = """
+SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), s.n_live_tup, s.n_dead_tup,
+       pg_total_relation_size(c.oid), pg_indexes_size(c.oid),
+       GREATEST(s.last_vacuum, s.last_autovacuum)
+FROM pg_inherits i
+JOIN pg_class c ON c.oid = i.inhrelid
+LEFT JOIN pg_stat_user_tables s ON s.relid = c.oid
+WHERE i.inhparent = %s::regclass
+"""
+_BOUND_RE = re.compile(r"modulus (\d+), remainder (\d+)")
+
+
+def _partitions() -> list[dict]:
+    with connection.cursor() as cursor:
+        cursor.execute(PARTITIONS_SQL, [TABLE])
+        rows = cursor.fetchall()
+    partitions = []
+    for name, bound, live, dead, size, index_size, vacuumed in rows:
+        modulus, remainder = map(int, _BOUND_RE.search(bound).groups())
+        partitions.append(
+            {
+                "name": name,
+                "modulus": modulus,
+                "remainder": remainder,
+                "live": live or 0,
+                "dead": dead or 0,
+                "size": size,
+                "index_size": index_size,
+                "vacuumed": vacuumed,
+            }
+        )
+    return sorted(partitions, key=lambda partition: (partition["modulus"], partition["remainder"]))
+
+
+def _mib(size: int) -> str:
+    return f"{size / 1024 / 1024:.1f}"
+
+
+class Command(BaseCommand):
+    help = (
+        "Show the partitions of the adventure history, vacuum them one by one, or split a grown "
+        "partition in two (locks the history table while rows are copied)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--vacuum", action="store_true", help="VACUUM (ANALYZE) partitions with dead rows")
+        parser.add_argument(
+            "--min-dead-ratio",
+            type=float,
+            default=0.05,
+            help="vacuum only partitions where dead rows exceed this share of live rows",
+        )
+        parser.add_argument("--freeze", action="store_true", help="vacuum with FREEZE")
+        parser.add_argument(
+            "--partition", action="append", dest="partitions", help="only this partition (repeatable)"
+        )
+        parser.add_argument("--split", metavar="PARTITION", help="replace a partition with two of twice its modulus")
+
+    def handle(self, *args, **options):
+        partitions = _partitions()
+        if not partitions:
+            raise CommandError(f"{TABLE} is not partitioned; apply the migrations first")
+        by_name = {partition["name"]: partition for partition in partitions}
+        unknown = set(options["partitions"] or ()) - set(by_name)
+        if options["split"] and options["split"] not in by_name:
+            unknown.add(options["split"])
+        if unknown:
+            raise CommandError(f"Unknown partitions: {', '.join(sorted(unknown))}")
+
+        if options["split"]:
+            self._split(by_name[options["split"]])
+        elif options["vacuum"]:
+            selected = [by_name[name] for name in options["partitions"]] if options["partitions"] else partitions
+            self._vacuum(selected, options["min_dead_ratio"], options["freeze"])
+        else:
+            self._report(partitions)
+
+    def _report(self, partitions: list[dict]) -> None:
+        self.stdout.write(
+            f"{'partition':<40} {'bound':>8} {'live':>12} {'dead':>10} {'MiB':>10} {'index MiB':>10}  last vacuum"
+        )
+        for partition in partitions:
+            vacuumed = partition["vacuumed"].strftime("%Y-%m-%d %H:%M") if partition["vacuumed"] else "-"
+            self.stdout.write(
+                f"{partition['name']:<40} {partition['remainder']:>3}/{partition['modulus']:<4} "
+                f"{partition['live']:>12} {partition['dead']:>10} {_mib(partition['size']):>10} "
+                f"{_mib(partition['index_size']):>10}  {vacuumed}"
+            )
+
+    def _vacuum(self, partitions: list[dict], min_dead_ratio: float, freeze: bool) -> None:
+        # One partition per statement: locks and I/O stay bounded by its size.
+        options = "FREEZE, ANALYZE" if freeze else "ANALYZE"
+        vacuumed = 0
+        with connection.cursor() as cursor:
+            for partition in partitions:
+                if not freeze and partition["dead"] <= partition["live"] * min_dead_ratio:
+                    continue
+                cursor.execute(f"VACUUM ({options}) {connection.ops.quote_name(partition['name'])}")
+                vacuumed += 1
+                self.stdout.write(f"vacuumed {partition['name']} ({partition['dead']} dead rows)")
+        self.stdout.write(self.style.SUCCESS(f"Vacuumed {vacuumed} of {len(partitions)} partitions"))
+
+    def _split(self, partition: dict) -> None:
+        # Hash bounds stay valid as long as every modulus divides the larger
+        # ones, so remainder r of modulus m becomes remainders r and r + m of 2m.
+        modulus = partition["modulus"] * 2
+        columns = ", ".join(field.column for field in AdventureHistory._meta.concrete_fields)
+        qn = connection.ops.quote_name
+        old = qn(partition["name"])
+        remainders = (partition["remainder"], partition["remainder"] + partition["modulus"])
+        new_names = [f"{TABLE}_m{modulus}_r{remainder}" for remainder in remainders]
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f"ALTER TABLE {qn(TABLE)} DETACH PARTITION {old}")
+            for name, remainder in zip(new_names, remainders):
+                cursor.execute(
+                    f"CREATE TABLE {qn(name)} PARTITION OF {qn(TABLE)} "
+                    f"FOR VALUES WITH (MODULUS {modulus}, REMAINDER {remainder})"
+                )
+            cursor.execute(f"INSERT INTO {qn(TABLE)} ({columns}) SELECT {columns} FROM {old}")
+            moved = cursor.rowcount
+            cursor.execute(f"DROP TABLE {old}")
+            for name in new_names:
+                cursor.execute(f"ANALYZE {qn(name)}")
+        self.stdout.write(
+            self.style.SUCCESS(f"Split {partition['name']} into {', '.join(new_names)}: {moved} rows moved")
+        )
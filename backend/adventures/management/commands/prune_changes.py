@@ -0,0 +1,43 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from adventures.models import Adventure, AdventureChange
+
+# Old changes are replaced with one `prune` row per adventure carrying the last
+# pruned version, so clients that synced before it are told to reload.
+PRUNE_SQL = f"""
+WITH pruned AS (
+    DELETE FROM {AdventureChange._meta.db_table} WHERE created_at < %s RETURNING adventure_id, version
+)
+INSERT INTO {AdventureChange._meta.db_table} (adventure_id, version, kind, object_id, operation, created_at)
+SELECT pruned.adventure_id, max(pruned.version), 'adventure', pruned.adventure_id, %s, now()
+FROM pruned JOIN {Adventure._meta.db_table} a ON a.id = pruned.adventure_id
+GROUP BY pruned.adventure_id
+"""
+ORPHANS_SQL = f"""
+DELETE FROM {AdventureChange._meta.db_table} c
+WHERE NOT EXISTS (SELECT 1 FROM {Adventure._meta.db_table} a WHERE a.id = c.adventure_id)
+"""
+
+
+class Command(BaseCommand):
+    help = "Drop old entries of the adventure change log and entries of deleted adventures."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=30, help="keep changes of the last N days")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=max(0, options["days"]))
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(ORPHANS_SQL)
+            orphans = cursor.rowcount
+            cursor.execute(PRUNE_SQL, [cutoff, AdventureChange.Operation.PRUNE])
+            adventures = cursor.rowcount
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Change log pruned for {adventures} adventures, {orphans} entries of deleted adventures removed"
+            )
+        )
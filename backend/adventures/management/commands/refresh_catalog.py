@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from adventures.catalog import refresh_catalog
+
+
+class Command(BaseCommand):
+    help = "Recount the public catalog: entity counts, runs and last activity of published templates."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--adventure", type=int, action="append", dest="adventures", help="only this template (repeatable)"
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        refreshed = refresh_catalog(options["adventures"])
+        self.stdout.write(
+            self.style.SUCCESS(f"Catalog refreshed: {refreshed} entries in {time.perf_counter() - started:.2f}s")
+        )
@@ -0,0 +1,74 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks.cases import CASES
+from benchmarks.runner import (
+    DEFAULT_BASELINE,
+    compare_with_baseline,
+    load_baseline,
+    run_suite,
+    save_baseline,
+)
+from benchmarks.worldgen import SIZES
+
+
+class Command(BaseCommand):
+    help = "Benchmark the hot paths on synthetic data and compare with the stored baseline."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--size", choices=sorted(SIZES), default="small")
+        parser.add_argument("--case", action="append", choices=sorted(CASES), dest="cases")
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--baseline", default=str(DEFAULT_BASELINE))
+        parser.add_argument("--tolerance", type=float, default=0.25)
+        parser.add_argument("--update-baseline", action="store_true")
+        parser.add_argument(
+            "--require-baseline",
+            action="store_true",
+            help="fail when the baseline has no entry for the size",
+        )
+        parser.add_argument("--output", default="", help="write the report as JSON")
+
+    def handle(self, *args, **options):
+        names = options["cases"] or list(CASES)
+        repeat = max(1, options["repeat"])
+        report = run_suite(
+            options["size"],
+            SIZES[options["size"]],
+            names,
+            repeat=repeat,
+            seed=options["seed"],
+            progress=lambda line: self.stderr.write(line),
+        )
+
+        self.stdout.write(f"{'case':<20} {'wall ms':>10} {'min ms':>10} {'queries':>8} {'peak KiB':>10}")
+        for name, result in report["cases"].items():
+            self.stdout.write(
+                f"{name:<20} {result['wall_ms']:>10.2f} {result['min_ms']:>10.2f} "
+                f"{result['queries']:>8} {result['peak_kib']:>10.1f}"
+            )
+        if options["output"]:
+            Path(options["output"]).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+
+        baseline_path = Path(options["baseline"])
+        if options["update_baseline"]:
+            save_baseline(baseline_path, report)
+            self.stdout.write(self.style.SUCCESS(f"Baseline for {options['size']} saved to {baseline_path}"))
+            return
+
+        regressions = compare_with_baseline(report, load_baseline(baseline_path), options["tolerance"])
+        if regressions is None:
+            if options["require_baseline"]:
+                raise CommandError(f"No {options['size']} baseline in {baseline_path}.")
+            self.stdout.write(
+                self.style.WARNING(
+                    f"No {options['size']} baseline in {baseline_path}; run with --update-baseline to create it."
+                )
+            )
+            return
+        if regressions:
+            raise CommandError("Benchmark regressions:\n  " + "\n  ".join(regressions))
+        self.stdout.write(self.style.SUCCESS("No regressions against the baseline."))
@@ -0,0 +1,43 @@
+from django.db import migrations, models
+from django.db.models import Q
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("adventures", "0023_update_faction_relationship_triggers"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="adventurememory",
+            name="level",
+            field=models.IntegerField(
+                choices=[(0, "chunk"), (1, "chapter"), (2, "saga")],
+                default=0,
+            ),
+        ),
+        migrations.AddField(
+            model_name="adventurememory",
+            name="history_start_id",
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="adventurememory",
+            name="history_end_id",
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name="adventurememory",
+            constraint=models.CheckConstraint(
+                name="memories_level_chk",
+                condition=Q(level__in=[0, 1, 2]),
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="adventurememory",
+            index=models.Index(
+                fields=["adventure", "kind", "level"],
+                name="idx_memories_adv_kind_level",
+            ),
+        ),
+    ]
@@ -0,0 +1,33 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("adventures", "0024_memory_summary_levels"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LLMCallTicket",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("provider", models.TextField()),
+                ("user_id", models.BigIntegerField(blank=True, null=True)),
+                (
+                    "priority",
+                    models.IntegerField(
+                        choices=[(0, "background"), (10, "interactive")],
+                        default=10,
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("granted_at", models.DateTimeField(blank=True, null=True)),
+                ("heartbeat_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(fields=["provider", "granted_at"], name="idx_llm_tickets_provider"),
+                ],
+            },
+        ),
+    ]
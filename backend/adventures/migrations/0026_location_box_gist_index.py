@@ -0,0 +1,17 @@
+from django.contrib.postgres.indexes import GistIndex
+from django.db import migrations
+
+from adventures.geometry import LocationBox
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("adventures", "0025_llm_call_tickets"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="location",
+            index=GistIndex(LocationBox(), name="idx_locations_box_gist"),
+        ),
+    ]
@@ -0,0 +1,62 @@
+from django.db import migrations
+
+# Text columns of every searchable table with their tsvector weights. Titles
+# outrank tags, tags outrank descriptions.
+SEARCH_COLUMNS = {
+    "adventures_location": (("title", "A"), ("tags", "B"), ("description", "C")),
+    "adventures_race": (("title", "A"), ("tags", "B"), ("description", "C")),
+    "adventures_character": (("title", "A"), ("tags", "B"), ("description", "C")),
+    "adventures_faction": (("title", "A"), ("tags", "B"), ("description", "C")),
+    "adventures_otherinfo": (("title", "A"), ("category", "B"), ("tags", "B"), ("description", "C")),
+    "adventures_skillsystem": (("title", "A"), ("tags", "B"), ("description", "C"), ("formula_hint", "D")),
+    "adventures_technique": (("title", "A"), ("tags", "B"), ("description", "C")),
+    "adventures_adventureevent": (("title", "A"), ("trigger_hint", "C"), ("state", "D")),
+}
+SEARCH_CONFIGS = ("russian", "english")
+ARRAY_COLUMNS = {"tags"}
+
+# array_to_string is only STABLE, which generated columns reject; for text[] it
+# is immutable in practice.
+CREATE_FUNCTION_SQL = """
+CREATE FUNCTION adventures_search_text(text[]) RETURNS text
+LANGUAGE sql IMMUTABLE PARALLEL SAFE
+AS $$ SELECT array_to_string($1, ' ') $$;
+"""
+DROP_FUNCTION_SQL = "DROP FUNCTION IF EXISTS adventures_search_text(text[]);"
+
+
+def _vector_sql(columns) -> str:
+    parts = []
+    for column, weight in columns:
+        source = f"adventures_search_text({column})" if column in ARRAY_COLUMNS else f"coalesce({column}, '')"
+        for config in SEARCH_CONFIGS:
+            parts.append(f"setweight(to_tsvector('{config}'::regconfig, {source}), '{weight}')")
+    return "\n        || ".join(parts)
+
+
+def _table_sql(table: str, columns) -> str:
+    return f"""
+ALTER TABLE {table} ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+        {_vector_sql(columns)}
+) STORED;
+CREATE INDEX idx_{table.removeprefix("adventures_")}_search_gin ON {table} USING gin (search_vector);
+"""
+
+
+CREATE_COLUMNS_SQL = "".join(_table_sql(table, columns) for table, columns in SEARCH_COLUMNS.items())
+DROP_COLUMNS_SQL = "".join(
+    f"ALTER TABLE {table} DROP COLUMN IF EXISTS search_vector;\n" for table in SEARCH_COLUMNS
+)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("adventures", "0026_location_box_gist_index"),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            CREATE_FUNCTION_SQL + CREATE_COLUMNS_SQL,
+            reverse_sql=DROP_COLUMNS_SQL + DROP_FUNCTION_SQL,
+        ),
+    ]
@@ -0,0 +1,22 @@
+from django.db import migrations
+
+# A stored generated column is updated by the row's own INSERT, so the index
+# follows inserts, deletes and rollbacks of history entries transactionally.
+CREATE_SQL = """
+ALTER TABLE adventures_adventurehistory ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+        to_tsvector('russian'::regconfig, content)
+        || to_tsvector('english'::regconfig, content)
+) STORED;
+CREATE INDEX idx_history_search_gin ON adventures_adventurehistory USING gin (search_vector);
+"""
+DROP_SQL = "ALTER TABLE adventures_adventurehistory DROP COLUMN IF EXISTS search_vector;"
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("adventures", "0027_world_search_vectors"),
+    ]
+
+    operations = [
+        migrations.RunSQL(CREATE_SQL, reverse_sql=DROP_SQL),
+    ]
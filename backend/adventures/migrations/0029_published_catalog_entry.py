@@ -0,0 +1,74 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+BACKFILL_SQL = """
+INSERT INTO adventures_publishedcatalogentry (
+    adventure_id, title, description, author_username, published_at,
+    locations_count, characters_count, races_count, factions_count, systems_count, events_count,
+    runs_count, last_run_at, last_activity_at, updated_at
+)
+SELECT
+    p.adventure_id, a.title, a.description, u.username, p.published_at,
+    (SELECT count(*) FROM adventures_location t WHERE t.adventure_id = a.id),
+    (SELECT count(*) FROM adventures_character t WHERE t.adventure_id = a.id),
+    (SELECT count(*) FROM adventures_race t WHERE t.adventure_id = a.id),
+    (SELECT count(*) FROM adventures_faction t WHERE t.adventure_id = a.id),
+    (SELECT count(*) FROM adventures_skillsystem t WHERE t.adventure_id = a.id),
+    (SELECT count(*) FROM adventures_adventureevent t WHERE t.adventure_id = a.id),
+    r.runs_count, r.last_run_at,
+    greatest(p.published_at, a.updated_at, r.last_run_at),
+    now()
+FROM adventures_publishedadventure p
+JOIN adventures_adventure a ON a.id = p.adventure_id
+JOIN users_user u ON u.id = a.author_user_id
+CROSS JOIN LATERAL (
+    SELECT count(*) AS runs_count, max(created_at) AS last_run_at
+    FROM adventures_adventure run WHERE run.template_adventure_id = a.id
+) r;
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("adventures", "0028_history_search_vector"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PublishedCatalogEntry",
+            fields=[
+                (
+                    "adventure",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="catalog_entry",
+                        serialize=False,
+                        to="adventures.adventure",
+                    ),
+                ),
+                ("title", models.TextField()),
+                ("description", models.TextField(blank=True)),
+                ("author_username", models.TextField()),
+                ("published_at", models.DateTimeField()),
+                ("locations_count", models.IntegerField(default=0)),
+                ("characters_count", models.IntegerField(default=0)),
+                ("races_count", models.IntegerField(default=0)),
+                ("factions_count", models.IntegerField(default=0)),
+                ("systems_count", models.IntegerField(default=0)),
+                ("events_count", models.IntegerField(default=0)),
+                ("runs_count", models.IntegerField(default=0)),
+                ("last_run_at", models.DateTimeField(blank=True, null=True)),
+                ("last_activity_at", models.DateTimeField()),
+                ("updated_at", models.DateTimeField()),
+            ],
+            options={
+                "indexes": [
+                    models.Index(fields=["-published_at", "-adventure"], name="idx_catalog_published"),
+                    models.Index(fields=["-runs_count", "-published_at", "-adventure"], name="idx_catalog_popular"),
+                    models.Index(fields=["-last_activity_at", "-adventure"], name="idx_catalog_activity"),
+                ],
+            },
+        ),
+        migrations.RunSQL(BACKFILL_SQL, reverse_sql=migrations.RunSQL.noop),
+    ]
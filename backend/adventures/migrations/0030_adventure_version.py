@@ -0,0 +1,94 @@
+from django.db import migrations, models
+
+# Tables whose rows belong to an adventure: (table, key column, table the key points to
+# when it is not the adventure itself). History and memories are not versioned, they
+# change on every turn and have their own endpoints.
+VERSIONED_TABLES = (
+    ("adventures_location", "adventure_id", None),
+    ("adventures_race", "adventure_id", None),
+    ("adventures_character", "adventure_id", None),
+    ("adventures_skillsystem", "adventure_id", None),
+    ("adventures_faction", "adventure_id", None),
+    ("adventures_otherinfo", "adventure_id", None),
+    ("adventures_adventureevent", "adventure_id", None),
+    ("adventures_adventureherosetup", "adventure_id", None),
+    ("adventures_moderationentry", "adventure_id", None),
+    ("adventures_publishedadventure", "adventure_id", None),
+    ("adventures_technique", "system_id", "adventures_skillsystem"),
+    ("adventures_charactersystem", "character_id", "adventures_character"),
+    ("adventures_charactertechnique", "character_id", "adventures_character"),
+    ("adventures_characterfaction", "character_id", "adventures_character"),
+    ("adventures_characterrelationship", "from_character_id", "adventures_character"),
+)
+
+# Statement-level triggers: a bulk insert of thousands of cards bumps the version
+# of their adventure once, not once per row.
+FUNCTIONS_SQL = """
+CREATE FUNCTION adventures_next_version() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.version := OLD.version + 1;
+    RETURN NEW;
+END
+$$;
+CREATE TRIGGER adventures_adventure_version BEFORE UPDATE ON adventures_adventure
+    FOR EACH ROW EXECUTE FUNCTION adventures_next_version();
+
+CREATE FUNCTION adventures_bump_version() RETURNS trigger LANGUAGE plpgsql AS $$
+DECLARE
+    ids text := format(
+        'SELECT %I FROM %s',
+        TG_ARGV[0],
+        CASE WHEN TG_OP = 'DELETE' THEN 'old_rows' ELSE 'new_rows' END
+    );
+BEGIN
+    IF TG_NARGS > 1 THEN
+        ids := format('SELECT parent.adventure_id FROM %I parent WHERE parent.id IN (%s)', TG_ARGV[1], ids);
+    END IF;
+    EXECUTE format('UPDATE adventures_adventure SET version = version + 1 WHERE id IN (%s)', ids);
+    RETURN NULL;
+END
+$$;
+"""
+DROP_FUNCTIONS_SQL = """
+DROP TRIGGER IF EXISTS adventures_adventure_version ON adventures_adventure;
+DROP FUNCTION IF EXISTS adventures_next_version();
+DROP FUNCTION IF EXISTS adventures_bump_version();
+"""
+
+
+def _trigger_sql(table: str, column: str, parent: str | None) -> str:
+    args = f"'{column}'" + (f", '{parent}'" if parent else "")
+    return "\n".join(
+        f"CREATE TRIGGER {table}_version_{suffix} AFTER {event} ON {table} "
+        f"REFERENCING {rows} FOR EACH STATEMENT EXECUTE FUNCTION adventures_bump_version({args});"
+        for suffix, event, rows in (
+            ("ins", "INSERT", "NEW TABLE AS new_rows"),
+            ("upd", "UPDATE", "NEW TABLE AS new_rows"),
+            ("del", "DELETE", "OLD TABLE AS old_rows"),
+        )
+    )
+
+
+def _drop_trigger_sql(table: str) -> str:
+    return "\n".join(
+        f"DROP TRIGGER IF EXISTS {table}_version_{suffix} ON {table};" for suffix in ("ins", "upd", "del")
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("adventures", "0029_published_catalog_entry"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="adventure",
+            name="version",
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.RunSQL(FUNCTIONS_SQL, reverse_sql=DROP_FUNCTIONS_SQL),
+        migrations.RunSQL(
+            "\n".join(_trigger_sql(*table) for table in VERSIONED_TABLES),
+            reverse_sql="\n".join(_drop_trigger_sql(table) for table, _, _ in VERSIONED_TABLES),
+        ),
+    ]
@@ -0,0 +1,182 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Rows of each table name the changed object and the adventure it belongs to.
+# The functions use static SQL, so their plans are cached per table; the
+# transition table is called `changed_rows` for every event.
+CHANGED_ROWS = {
+    "adventures_log_card_changes": "SELECT r.id AS object_id, r.adventure_id FROM changed_rows r",
+    "adventures_log_owned_changes": "SELECT r.adventure_id AS object_id, r.adventure_id FROM changed_rows r",
+    "adventures_log_technique_changes": (
+        "SELECT r.id AS object_id, s.adventure_id FROM changed_rows r "
+        "JOIN adventures_skillsystem s ON s.id = r.system_id"
+    ),
+    "adventures_log_character_link_changes": (
+        "SELECT r.id AS object_id, c.adventure_id FROM changed_rows r "
+        "JOIN adventures_character c ON c.id = r.character_id"
+    ),
+    "adventures_log_relationship_changes": (
+        "SELECT r.id AS object_id, c.adventure_id FROM changed_rows r "
+        "JOIN adventures_character c ON c.id = r.from_character_id"
+    ),
+}
+# (table, kind in the change log, function, arguments of the 0030 trigger it replaces).
+VERSIONED_TABLES = (
+    ("adventures_location", "location", "adventures_log_card_changes", "'adventure_id'"),
+    ("adventures_race", "race", "adventures_log_card_changes", "'adventure_id'"),
+    ("adventures_character", "character", "adventures_log_card_changes", "'adventure_id'"),
+    ("adventures_skillsystem", "system", "adventures_log_card_changes", "'adventure_id'"),
+    ("adventures_faction", "faction", "adventures_log_card_changes", "'adventure_id'"),
+    ("adventures_otherinfo", "other_info", "adventures_log_card_changes", "'adventure_id'"),
+    ("adventures_adventureevent", "event", "adventures_log_card_changes", "'adventure_id'"),
+    ("adventures_adventureherosetup", "hero_setup", "adventures_log_card_changes", "'adventure_id'"),
+    ("adventures_moderationentry", "moderation", "adventures_log_owned_changes", "'adventure_id'"),
+    ("adventures_publishedadventure", "publication", "adventures_log_owned_changes", "'adventure_id'"),
+    (
+        "adventures_technique",
+        "technique",
+        "adventures_log_technique_changes",
+        "'system_id', 'adventures_skillsystem'",
+    ),
+    (
+        "adventures_charactersystem",
+        "character_system",
+        "adventures_log_character_link_changes",
+        "'character_id', 'adventures_character'",
+    ),
+    (
+        "adventures_charactertechnique",
+        "character_technique",
+        "adventures_log_character_link_changes",
+        "'character_id', 'adventures_character'",
+    ),
+    (
+        "adventures_characterfaction",
+        "character_faction",
+        "adventures_log_character_link_changes",
+        "'character_id', 'adventures_character'",
+    ),
+    (
+        "adventures_characterrelationship",
+        "character_relationship",
+        "adventures_log_relationship_changes",
+        "'from_character_id', 'adventures_character'",
+    ),
+)
+TRIGGER_EVENTS = (
+    ("ins", "INSERT", "NEW TABLE", "new_rows"),
+    ("upd", "UPDATE", "NEW TABLE", "new_rows"),
+    ("del", "DELETE", "OLD TABLE", "old_rows"),
+)
+
+
+# One statement bumps the version of every adventure it touched once and logs
+# its rows with that version.
+def _log_function_sql(name: str, changed_rows: str) -> str:
+    return f"""
+CREATE FUNCTION {name}() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    WITH changed AS ({changed_rows}),
+    bumped AS (
+        UPDATE adventures_adventure a SET version = a.version + 1
+        WHERE a.id IN (SELECT adventure_id FROM changed)
+        RETURNING a.id, a.version
+    )
+    INSERT INTO adventures_adventurechange (adventure_id, version, kind, object_id, operation, created_at)
+    SELECT changed.adventure_id, bumped.version, TG_ARGV[0], changed.object_id, lower(TG_OP), now()
+    FROM changed JOIN bumped ON bumped.id = changed.adventure_id
+    ORDER BY changed.object_id;
+    RETURN NULL;
+END
+$$;
+"""
+
+
+def _triggers_sql(table: str, function: str, args: str, rows_name: str | None = None) -> str:
+    return "\n".join(
+        [f"DROP TRIGGER IF EXISTS {table}_version_{suffix} ON {table};" for suffix, *_ in TRIGGER_EVENTS]
+        + [
+            f"CREATE TRIGGER {table}_version_{suffix} AFTER {event} ON {table} "
+            f"REFERENCING {rows} AS {rows_name or default_name} "
+            f"FOR EACH STATEMENT EXECUTE FUNCTION {function}({args});"
+            for suffix, event, rows, default_name in TRIGGER_EVENTS
+        ]
+    )
+
+
+TRIGGERS_SQL = "\n".join(
+    _triggers_sql(table, function, f"'{kind}'", "changed_rows") for table, kind, function, _ in VERSIONED_TABLES
+)
+OLD_TRIGGERS_SQL = "\n".join(
+    _triggers_sql(table, "adventures_bump_version", old_args) for table, _, _, old_args in VERSIONED_TABLES
+)
+FUNCTIONS_SQL = "".join(_log_function_sql(name, rows) for name, rows in CHANGED_ROWS.items()) + """
+-- Changes of the adventure row itself, except the version bumps made above.
+CREATE FUNCTION adventures_log_adventure_update() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO adventures_adventurechange (adventure_id, version, kind, object_id, operation, created_at)
+    SELECT n.id, n.version, 'adventure', n.id, 'update', now()
+    FROM new_rows n JOIN old_rows o ON o.id = n.id
+    WHERE to_jsonb(n) - 'version' - 'updated_at' IS DISTINCT FROM to_jsonb(o) - 'version' - 'updated_at';
+    RETURN NULL;
+END
+$$;
+CREATE TRIGGER adventures_adventure_changes AFTER UPDATE ON adventures_adventure
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION adventures_log_adventure_update();
+"""
+DROP_FUNCTIONS_SQL = "\n".join(
+    [
+        "DROP TRIGGER IF EXISTS adventures_adventure_changes ON adventures_adventure;",
+        "DROP FUNCTION IF EXISTS adventures_log_adventure_update();",
+        *(f"DROP FUNCTION IF EXISTS {name}();" for name in CHANGED_ROWS),
+    ]
+)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("adventures", "0030_adventure_version"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AdventureChange",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                ("version", models.BigIntegerField()),
+                ("kind", models.TextField()),
+                ("object_id", models.BigIntegerField(null=True)),
+                (
+                    "operation",
+                    models.TextField(
+                        choices=[
+                            ("insert", "insert"),
+                            ("update", "update"),
+                            ("delete", "delete"),
+                            ("prune", "prune"),
+                        ]
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "adventure",
+                    models.ForeignKey(
+                        db_constraint=False,
+                        db_index=False,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="changes",
+                        to="adventures.adventure",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(fields=["adventure", "version", "id"], name="idx_changes_adv_version"),
+                    models.Index(fields=["created_at"], name="idx_changes_created"),
+                ],
+            },
+        ),
+        migrations.RunSQL(FUNCTIONS_SQL, reverse_sql=DROP_FUNCTIONS_SQL),
+        migrations.RunSQL(TRIGGERS_SQL, reverse_sql=OLD_TRIGGERS_SQL),
+    ]
@@ -0,0 +1,259 @@
+from django.db import migrations
+
+# The row-level triggers of 0002, 0020 and 0023 ran two lookups per inserted row.
+# These run once per statement over its transition table: a bulk insert of
+# thousands of links is validated by one join. AFTER triggers with transition
+# tables cannot share INSERT and UPDATE, hence the `_ins`/`_upd` pairs.
+# `foreign_key_violation` makes Django raise IntegrityError.
+CHECKS = {
+    "adventures_character": (
+        "trg_characters_same_adventure_refs",
+        "enforce_character_same_adventure_refs",
+        """
+    SELECT format('Race %s / location %s of character %s belong to another adventure than %s',
+                  c.race_id, c.location_id, c.id, c.adventure_id)
+    INTO violation
+    FROM changed_rows c
+    LEFT JOIN adventures_race r ON r.id = c.race_id
+    LEFT JOIN adventures_location l ON l.id = c.location_id
+    WHERE (c.race_id IS NOT NULL AND r.adventure_id IS DISTINCT FROM c.adventure_id)
+       OR (c.location_id IS NOT NULL AND l.adventure_id IS DISTINCT FROM c.adventure_id)
+    LIMIT 1;""",
+    ),
+    "adventures_charactersystem": (
+        "trg_character_systems_same_adventure",
+        "enforce_character_system_same_adventure",
+        """
+    SELECT format('Adventure mismatch in character_systems: char %s, system %s', c.adventure_id, s.adventure_id)
+    INTO violation
+    FROM changed_rows cs
+    LEFT JOIN adventures_character c ON c.id = cs.character_id
+    LEFT JOIN adventures_skillsystem s ON s.id = cs.system_id
+    WHERE c.adventure_id IS NULL OR s.adventure_id IS NULL OR c.adventure_id <> s.adventure_id
+    LIMIT 1;""",
+    ),
+    "adventures_charactertechnique": (
+        "trg_character_techniques_same_adventure",
+        "enforce_character_technique_same_adventure",
+        """
+    SELECT format('Adventure mismatch in character_techniques: char %s, tech %s', c.adventure_id, s.adventure_id)
+    INTO violation
+    FROM changed_rows ct
+    LEFT JOIN adventures_character c ON c.id = ct.character_id
+    LEFT JOIN adventures_technique t ON t.id = ct.technique_id
+    LEFT JOIN adventures_skillsystem s ON s.id = t.system_id
+    WHERE c.adventure_id IS NULL OR s.adventure_id IS NULL OR c.adventure_id <> s.adventure_id
+    LIMIT 1;""",
+    ),
+    "adventures_characterfaction": (
+        "trg_characters_factions_same_adventure",
+        "enforce_character_faction_same_adventure",
+        """
+    SELECT format('Adventure mismatch in character_factions: char %s, faction %s', c.adventure_id, f.adventure_id)
+    INTO violation
+    FROM changed_rows cf
+    LEFT JOIN adventures_character c ON c.id = cf.character_id
+    LEFT JOIN adventures_faction f ON f.id = cf.faction_id
+    WHERE c.adventure_id IS NULL OR f.adventure_id IS NULL OR c.adventure_id <> f.adventure_id
+    LIMIT 1;""",
+    ),
+    "adventures_characterrelationship": (
+        "trg_relationships_same_adventure",
+        "enforce_relationship_same_adventure",
+        """
+    SELECT format('Adventure mismatch in relationships: from %s, to %s', f.adventure_id, t.adventure_id)
+    INTO violation
+    FROM changed_rows r
+    LEFT JOIN adventures_character f ON f.id = r.from_character_id
+    LEFT JOIN adventures_character t ON t.id = r.to_character_id
+    WHERE f.adventure_id IS NULL OR t.adventure_id IS NULL OR f.adventure_id <> t.adventure_id
+    LIMIT 1;""",
+    ),
+}
+
+CREATE_TRIGGERS_SQL = "".join(
+    f"""
+DROP TRIGGER IF EXISTS {trigger} ON {table};
+DROP FUNCTION IF EXISTS {function}();
+
+CREATE FUNCTION {function}()
+RETURNS TRIGGER AS $$
+DECLARE
+    violation TEXT;
+BEGIN{check}
+
+    IF violation IS NOT NULL THEN
+        RAISE EXCEPTION '%', violation USING ERRCODE = 'foreign_key_violation';
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER {trigger}_ins
+AFTER INSERT ON {table}
+REFERENCING NEW TABLE AS changed_rows
+FOR EACH STATEMENT EXECUTE FUNCTION {function}();
+
+CREATE TRIGGER {trigger}_upd
+AFTER UPDATE ON {table}
+REFERENCING NEW TABLE AS changed_rows
+FOR EACH STATEMENT EXECUTE FUNCTION {function}();
+"""
+    for table, (trigger, function, check) in CHECKS.items()
+)
+
+DROP_TRIGGERS_SQL = "".join(
+    f"""
+DROP TRIGGER IF EXISTS {trigger}_ins ON {table};
+DROP TRIGGER IF EXISTS {trigger}_upd ON {table};
+DROP FUNCTION IF EXISTS {function}();
+"""
+    for table, (trigger, function, _) in CHECKS.items()
+)
+
+RESTORE_ROW_TRIGGERS_SQL = """
+CREATE OR REPLACE FUNCTION enforce_character_same_adventure_refs()
+RETURNS TRIGGER AS $$
+DECLARE
+    r_adv BIGINT;
+    l_adv BIGINT;
+BEGIN
+    IF NEW.race_id IS NOT NULL THEN
+        SELECT adventure_id INTO r_adv FROM adventures_race WHERE id = NEW.race_id;
+        IF r_adv IS NULL OR r_adv <> NEW.adventure_id THEN
+            RAISE EXCEPTION 'Race % belongs to adventure %, but character adventure is %',
+                NEW.race_id, r_adv, NEW.adventure_id;
+        END IF;
+    END IF;
+
+    IF NEW.location_id IS NOT NULL THEN
+        SELECT adventure_id INTO l_adv FROM adventures_location WHERE id = NEW.location_id;
+        IF l_adv IS NULL OR l_adv <> NEW.adventure_id THEN
+            RAISE EXCEPTION 'Location % belongs to adventure %, but character adventure is %',
+                NEW.location_id, l_adv, NEW.adventure_id;
+        END IF;
+    END IF;
+
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_characters_same_adventure_refs
+BEFORE INSERT OR UPDATE ON adventures_character
+FOR EACH ROW EXECUTE FUNCTION enforce_character_same_adventure_refs();
+
+CREATE OR REPLACE FUNCTION enforce_character_system_same_adventure()
+RETURNS TRIGGER AS $$
+DECLARE
+    c_adv BIGINT;
+    s_adv BIGINT;
+BEGIN
+    SELECT adventure_id INTO c_adv FROM adventures_character WHERE id = NEW.character_id;
+    SELECT adventure_id INTO s_adv FROM adventures_skillsystem WHERE id = NEW.system_id;
+
+    IF c_adv IS NULL OR s_adv IS NULL THEN
+        RAISE EXCEPTION 'Character % or system % not found', NEW.character_id, NEW.system_id;
+    END IF;
+
+    IF c_adv <> s_adv THEN
+        RAISE EXCEPTION 'Adventure mismatch in character_systems: char %, system %', c_adv, s_adv;
+    END IF;
+
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_character_systems_same_adventure
+BEFORE INSERT OR UPDATE ON adventures_charactersystem
+FOR EACH ROW EXECUTE FUNCTION enforce_character_system_same_adventure();
+
+CREATE OR REPLACE FUNCTION enforce_character_technique_same_adventure()
+RETURNS TRIGGER AS $$
+DECLARE
+    c_adv BIGINT;
+    t_adv BIGINT;
+BEGIN
+    SELECT adventure_id INTO c_adv FROM adventures_character WHERE id = NEW.character_id;
+    SELECT s.adventure_id INTO t_adv
+    FROM adventures_technique t
+    JOIN adventures_skillsystem s ON s.id = t.system_id
+    WHERE t.id = NEW.technique_id;
+
+    IF c_adv IS NULL OR t_adv IS NULL THEN
+        RAISE EXCEPTION 'Character % or technique % not found', NEW.character_id, NEW.technique_id;
+    END IF;
+
+    IF c_adv <> t_adv THEN
+        RAISE EXCEPTION 'Adventure mismatch in character_techniques: char %, tech %', c_adv, t_adv;
+    END IF;
+
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_character_techniques_same_adventure
+BEFORE INSERT OR UPDATE ON adventures_charactertechnique
+FOR EACH ROW EXECUTE FUNCTION enforce_character_technique_same_adventure();
+
+CREATE OR REPLACE FUNCTION enforce_character_faction_same_adventure()
+RETURNS TRIGGER AS $$
+DECLARE
+    c_adv BIGINT;
+    f_adv BIGINT;
+BEGIN
+    SELECT adventure_id INTO c_adv FROM adventures_character WHERE id = NEW.character_id;
+    SELECT adventure_id INTO f_adv FROM adventures_faction WHERE id = NEW.faction_id;
+
+    IF c_adv IS NULL OR f_adv IS NULL THEN
+        RAISE EXCEPTION 'Character % or faction % not found', NEW.character_id, NEW.faction_id;
+    END IF;
+
+    IF c_adv <> f_adv THEN
+        RAISE EXCEPTION 'Adventure mismatch in character_factions: char %, faction %', c_adv, f_adv;
+    END IF;
+
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_characters_factions_same_adventure
+BEFORE INSERT OR UPDATE ON adventures_characterfaction
+FOR EACH ROW EXECUTE FUNCTION enforce_character_faction_same_adventure();
+
+CREATE OR REPLACE FUNCTION enforce_relationship_same_adventure()
+RETURNS TRIGGER AS $$
+DECLARE
+    from_adv BIGINT;
+    to_adv BIGINT;
+BEGIN
+    SELECT adventure_id INTO from_adv FROM adventures_character WHERE id = NEW.from_character_id;
+    SELECT adventure_id INTO to_adv FROM adventures_character WHERE id = NEW.to_character_id;
+
+    IF from_adv IS NULL OR to_adv IS NULL THEN
+        RAISE EXCEPTION 'Relationship characters not found: % -> %',
+            NEW.from_character_id, NEW.to_character_id;
+    END IF;
+
+    IF from_adv <> to_adv THEN
+        RAISE EXCEPTION 'Adventure mismatch in relationships: from %, to %', from_adv, to_adv;
+    END IF;
+
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_relationships_same_adventure
+BEFORE INSERT OR UPDATE ON adventures_characterrelationship
+FOR EACH ROW EXECUTE FUNCTION enforce_relationship_same_adventure();
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("adventures", "0031_adventure_change_log"),
+    ]
+
+    operations = [
+        migrations.RunSQL(CREATE_TRIGGERS_SQL, reverse_sql=DROP_TRIGGERS_SQL + RESTORE_ROW_TRIGGERS_SQL),
+    ]
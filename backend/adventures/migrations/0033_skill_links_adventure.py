@@ -0,0 +1,237 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+# (table, kind in the change log, parent the adventure is copied from, key to the parent).
+LINKED_TABLES = (
+    ("adventures_technique", "technique", "adventures_skillsystem", "system_id"),
+    ("adventures_charactersystem", "character_system", "adventures_character", "character_id"),
+    ("adventures_charactertechnique", "character_technique", "adventures_character", "character_id"),
+)
+OLD_LOG_FUNCTIONS = {
+    "adventures_technique": "adventures_log_technique_changes",
+    "adventures_charactersystem": "adventures_log_character_link_changes",
+    "adventures_charactertechnique": "adventures_log_character_link_changes",
+}
+TRIGGER_EVENTS = (("ins", "INSERT", "NEW TABLE"), ("upd", "UPDATE", "NEW TABLE"), ("del", "DELETE", "OLD TABLE"))
+
+
+def _log_triggers_sql(table: str, kind: str, function: str) -> str:
+    return "\n".join(
+        f"CREATE TRIGGER {table}_version_{suffix} AFTER {event} ON {table} "
+        f"REFERENCING {rows} AS changed_rows FOR EACH STATEMENT EXECUTE FUNCTION {function}('{kind}');"
+        for suffix, event, rows in TRIGGER_EVENTS
+    )
+
+
+DROP_LOG_TRIGGERS_SQL = "\n".join(
+    f"DROP TRIGGER IF EXISTS {table}_version_{suffix} ON {table};"
+    for table, *_ in LINKED_TABLES
+    for suffix, *_ in TRIGGER_EVENTS
+)
+# The rows carry their adventure now, so the generic card function logs them
+# without joining the parent.
+LOG_TRIGGERS_SQL = "\n".join(
+    _log_triggers_sql(table, kind, "adventures_log_card_changes") for table, kind, *_ in LINKED_TABLES
+) + "\nDROP FUNCTION IF EXISTS adventures_log_technique_changes();"
+OLD_LOG_TRIGGERS_SQL = """
+CREATE FUNCTION adventures_log_technique_changes() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    WITH changed AS (
+        SELECT r.id AS object_id, s.adventure_id FROM changed_rows r
+        JOIN adventures_skillsystem s ON s.id = r.system_id
+    ),
+    bumped AS (
+        UPDATE adventures_adventure a SET version = a.version + 1
+        WHERE a.id IN (SELECT adventure_id FROM changed)
+        RETURNING a.id, a.version
+    )
+    INSERT INTO adventures_adventurechange (adventure_id, version, kind, object_id, operation, created_at)
+    SELECT changed.adventure_id, bumped.version, TG_ARGV[0], changed.object_id, lower(TG_OP), now()
+    FROM changed JOIN bumped ON bumped.id = changed.adventure_id
+    ORDER BY changed.object_id;
+    RETURN NULL;
+END
+$$;
+""" + "\n".join(_log_triggers_sql(table, kind, OLD_LOG_FUNCTIONS[table]) for table, kind, *_ in LINKED_TABLES)
+
+BACKFILL_SQL = "\n".join(
+    f"UPDATE {table} t SET adventure_id = p.adventure_id FROM {parent} p WHERE p.id = t.{column};"
+    for table, _, parent, column in LINKED_TABLES
+)
+
+# Composite keys make a link to a card of another adventure impossible, so the
+# statement triggers of 0032 on the link tables are no longer needed.
+COMPOSITE_KEYS = (
+    ("adventures_technique", "techniques_system_same_adventure", "system_id", "adventures_skillsystem"),
+    (
+        "adventures_charactersystem",
+        "character_system_character_same_adventure",
+        "character_id",
+        "adventures_character",
+    ),
+    ("adventures_charactersystem", "character_system_system_same_adventure", "system_id", "adventures_skillsystem"),
+    (
+        "adventures_charactertechnique",
+        "character_technique_character_same_adventure",
+        "character_id",
+        "adventures_character",
+    ),
+    (
+        "adventures_charactertechnique",
+        "character_technique_technique_same_adventure",
+        "technique_id",
+        "adventures_technique",
+    ),
+)
+LINK_CHECKS = {
+    "adventures_charactersystem": (
+        "trg_character_systems_same_adventure",
+        "enforce_character_system_same_adventure",
+        """
+    SELECT format('Adventure mismatch in character_systems: char %s, system %s', c.adventure_id, s.adventure_id)
+    INTO violation
+    FROM changed_rows cs
+    LEFT JOIN adventures_character c ON c.id = cs.character_id
+    LEFT JOIN adventures_skillsystem s ON s.id = cs.system_id
+    WHERE c.adventure_id IS NULL OR s.adventure_id IS NULL OR c.adventure_id <> s.adventure_id
+    LIMIT 1;""",
+    ),
+    "adventures_charactertechnique": (
+        "trg_character_techniques_same_adventure",
+        "enforce_character_technique_same_adventure",
+        """
+    SELECT format('Adventure mismatch in character_techniques: char %s, tech %s', c.adventure_id, s.adventure_id)
+    INTO violation
+    FROM changed_rows ct
+    LEFT JOIN adventures_character c ON c.id = ct.character_id
+    LEFT JOIN adventures_technique t ON t.id = ct.technique_id
+    LEFT JOIN adventures_skillsystem s ON s.id = t.system_id
+    WHERE c.adventure_id IS NULL OR s.adventure_id IS NULL OR c.adventure_id <> s.adventure_id
+    LIMIT 1;""",
+    ),
+}
+DROP_LINK_CHECKS_SQL = "".join(
+    f"""
+DROP TRIGGER IF EXISTS {trigger}_ins ON {table};
+DROP TRIGGER IF EXISTS {trigger}_upd ON {table};
+DROP FUNCTION IF EXISTS {function}();
+"""
+    for table, (trigger, function, _) in LINK_CHECKS.items()
+)
+RESTORE_LINK_CHECKS_SQL = "".join(
+    f"""
+CREATE FUNCTION {function}()
+RETURNS TRIGGER AS $$
+DECLARE
+    violation TEXT;
+BEGIN{check}
+
+    IF violation IS NOT NULL THEN
+        RAISE EXCEPTION '%', violation USING ERRCODE = 'foreign_key_violation';
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER {trigger}_ins
+AFTER INSERT ON {table}
+REFERENCING NEW TABLE AS changed_rows
+FOR EACH STATEMENT EXECUTE FUNCTION {function}();
+
+CREATE TRIGGER {trigger}_upd
+AFTER UPDATE ON {table}
+REFERENCING NEW TABLE AS changed_rows
+FOR EACH STATEMENT EXECUTE FUNCTION {function}();
+"""
+    for table, (trigger, function, check) in LINK_CHECKS.items()
+)
+COMPOSITE_KEYS_SQL = "\n".join(
+    f"ALTER TABLE {table} ADD CONSTRAINT {name} "
+    f"FOREIGN KEY (adventure_id, {column}) REFERENCES {parent} (adventure_id, id);"
+    for table, name, column, parent in COMPOSITE_KEYS
+)
+DROP_COMPOSITE_KEYS_SQL = "\n".join(
+    f"ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {name};" for table, name, _, _ in COMPOSITE_KEYS
+)
+
+
+def _adventure_field(related_name: str, null: bool = False) -> models.ForeignKey:
+    return models.ForeignKey(
+        db_index=False,
+        null=null,
+        on_delete=django.db.models.deletion.CASCADE,
+        related_name=related_name,
+        to="adventures.adventure",
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("adventures", "0032_statement_consistency_triggers"),
+    ]
+
+    operations = [
+        # The backfill must neither bump versions nor fill the change log.
+        migrations.RunSQL(
+            DROP_LOG_TRIGGERS_SQL + DROP_LINK_CHECKS_SQL,
+            reverse_sql=RESTORE_LINK_CHECKS_SQL + OLD_LOG_TRIGGERS_SQL,
+        ),
+        migrations.AddField(
+            model_name="technique",
+            name="adventure",
+            field=_adventure_field("techniques", null=True),
+        ),
+        migrations.AddField(
+            model_name="charactersystem",
+            name="adventure",
+            field=_adventure_field("character_systems", null=True),
+        ),
+        migrations.AddField(
+            model_name="charactertechnique",
+            name="adventure",
+            field=_adventure_field("character_techniques", null=True),
+        ),
+        migrations.RunSQL(BACKFILL_SQL, reverse_sql=migrations.RunSQL.noop),
+        migrations.AlterField(
+            model_name="technique",
+            name="adventure",
+            field=_adventure_field("techniques"),
+        ),
+        migrations.AlterField(
+            model_name="charactersystem",
+            name="adventure",
+            field=_adventure_field("character_systems"),
+        ),
+        migrations.AlterField(
+            model_name="charactertechnique",
+            name="adventure",
+            field=_adventure_field("character_techniques"),
+        ),
+        migrations.AddConstraint(
+            model_name="character",
+            constraint=models.UniqueConstraint(fields=("adventure", "id"), name="uq_characters_adventure_id"),
+        ),
+        migrations.AddConstraint(
+            model_name="skillsystem",
+            constraint=models.UniqueConstraint(fields=("adventure", "id"), name="uq_skill_systems_adventure_id"),
+        ),
+        migrations.AddConstraint(
+            model_name="technique",
+            constraint=models.UniqueConstraint(fields=("adventure", "id"), name="uq_techniques_adventure_id"),
+        ),
+        migrations.AddIndex(
+            model_name="technique",
+            index=models.Index(fields=["adventure", "system"], name="idx_techniques_adv_system"),
+        ),
+        migrations.AddIndex(
+            model_name="charactersystem",
+            index=models.Index(fields=["adventure", "character"], name="idx_char_systems_adv_char"),
+        ),
+        migrations.AddIndex(
+            model_name="charactertechnique",
+            index=models.Index(fields=["adventure", "character"], name="idx_char_techniques_adv_char"),
+        ),
+        migrations.RunSQL(COMPOSITE_KEYS_SQL, reverse_sql=DROP_COMPOSITE_KEYS_SQL),
+        migrations.RunSQL(LOG_TRIGGERS_SQL, reverse_sql=DROP_LOG_TRIGGERS_SQL),
+    ]
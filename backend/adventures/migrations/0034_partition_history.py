@@ -0,0 +1,94 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+# History is hash-partitioned by adventure: every read and write of it filters by
+# adventure, so the planner touches one partition, and indexes and vacuum work
+# per partition. Partitions are named by their bounds; `history_partitions
+# --split` replaces one with two of twice the modulus as the table grows.
+PARTITIONS = 16
+TABLE = "adventures_adventurehistory"
+OLD_TABLE = "adventures_adventurehistory_unpartitioned"
+COLUMNS = "id, role, content, metadata, created_at, adventure_id"
+COLUMNS_SQL = """
+    role text NOT NULL,
+    content text NOT NULL,
+    metadata jsonb NOT NULL,
+    created_at timestamp with time zone NOT NULL,
+    adventure_id bigint NOT NULL,
+    search_vector tsvector GENERATED ALWAYS AS (
+        to_tsvector('russian'::regconfig, content) || to_tsvector('english'::regconfig, content)
+    ) STORED,
+    CONSTRAINT history_role_chk CHECK (role IN ('user', 'ai', 'system'))"""
+# Built after the copy: one index build and one validating join instead of
+# per-row work.
+INDEXES_SQL = f"""
+CREATE INDEX idx_history_adv_entry_desc ON {TABLE} (adventure_id, id DESC);
+CREATE INDEX idx_history_search_gin ON {TABLE} USING gin (search_vector);
+ALTER TABLE {TABLE} ADD CONSTRAINT adventures_adventure_adventure_id_51b38d0b_fk_adventure
+    FOREIGN KEY (adventure_id) REFERENCES adventures_adventure (id) DEFERRABLE INITIALLY DEFERRED;
+"""
+
+
+def _swap_sql(create_table: str, renamed: str) -> str:
+    """Move the rows of the current table into `create_table`, keeping ids and the id sequence."""
+    return f"""
+ALTER TABLE {TABLE} RENAME TO {renamed};
+ALTER SEQUENCE {TABLE}_id_seq RENAME TO {renamed}_id_seq;
+ALTER INDEX {TABLE}_pkey RENAME TO {renamed}_pkey;
+ALTER INDEX idx_history_adv_entry_desc RENAME TO {renamed}_adv_entry_desc;
+ALTER INDEX idx_history_search_gin RENAME TO {renamed}_search_gin;
+{create_table}
+INSERT INTO {TABLE} ({COLUMNS}) SELECT {COLUMNS} FROM {renamed};
+{INDEXES_SQL}
+SELECT setval(
+    pg_get_serial_sequence('{TABLE}', 'id'),
+    GREATEST((SELECT last_value FROM {renamed}_id_seq), (SELECT COALESCE(max(id), 0) FROM {TABLE}), 1)
+);
+DROP TABLE {renamed};
+"""
+
+
+PARTITION_SQL = _swap_sql(
+    f"""
+CREATE TABLE {TABLE} (
+    id bigint GENERATED BY DEFAULT AS IDENTITY,{COLUMNS_SQL},
+    CONSTRAINT {TABLE}_pkey PRIMARY KEY (id, adventure_id)
+) PARTITION BY HASH (adventure_id);
+"""
+    + "\n".join(
+        f"CREATE TABLE {TABLE}_m{PARTITIONS}_r{remainder} PARTITION OF {TABLE} "
+        f"FOR VALUES WITH (MODULUS {PARTITIONS}, REMAINDER {remainder});"
+        for remainder in range(PARTITIONS)
+    ),
+    OLD_TABLE,
+)
+UNPARTITION_SQL = _swap_sql(
+    f"""
+CREATE TABLE {TABLE} (
+    id bigint GENERATED BY DEFAULT AS IDENTITY,{COLUMNS_SQL},
+    CONSTRAINT {TABLE}_pkey PRIMARY KEY (id)
+);
+""",
+    "adventures_adventurehistory_partitioned",
+)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("adventures", "0033_skill_links_adventure"),
+    ]
+
+    operations = [
+        # Covered by idx_history_adv_entry_desc; dropped before the copy.
+        migrations.AlterField(
+            model_name="adventurehistory",
+            name="adventure",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="history",
+                to="adventures.adventure",
+            ),
+        ),
+        migrations.RunSQL(PARTITION_SQL, reverse_sql=UNPARTITION_SQL),
+    ]
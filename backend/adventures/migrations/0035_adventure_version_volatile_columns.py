@@ -0,0 +1,38 @@
+from django.db import migrations
+
+# `is_waiting_ai` flips twice per turn and `rollback_min_history_id` moves as history
+# grows; neither changes the world, so they must not invalidate cached pages. The
+# statement triggers of card tables raise the version themselves and are kept.
+NEXT_VERSION_SQL = """
+CREATE OR REPLACE FUNCTION adventures_next_version() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    IF NEW.version > OLD.version
+        OR to_jsonb(NEW) - ARRAY['version', 'is_waiting_ai', 'rollback_min_history_id']
+            IS DISTINCT FROM to_jsonb(OLD) - ARRAY['version', 'is_waiting_ai', 'rollback_min_history_id']
+    THEN
+        NEW.version := OLD.version + 1;
+    ELSE
+        NEW.version := OLD.version;
+    END IF;
+    RETURN NEW;
+END
+$$;
+"""
+PREVIOUS_NEXT_VERSION_SQL = """
+CREATE OR REPLACE FUNCTION adventures_next_version() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.version := OLD.version + 1;
+    RETURN NEW;
+END
+$$;
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("adventures", "0034_partition_history"),
+    ]
+
+    operations = [
+        migrations.RunSQL(NEXT_VERSION_SQL, reverse_sql=PREVIOUS_NEXT_VERSION_SQL),
+    ]
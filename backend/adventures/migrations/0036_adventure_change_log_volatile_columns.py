@@ -0,0 +1,47 @@
+from django.db import migrations
+
+# Log the adventure row from a row trigger whose WHEN clause skips updates that only
+# touch the version or the turn bookkeeping columns, so version bumps from card
+# triggers and the `is_waiting_ai` flips of every turn do not call the function.
+IGNORED_COLUMNS = "ARRAY['version', 'updated_at', 'is_waiting_ai', 'rollback_min_history_id']"
+LOG_ADVENTURE_UPDATE_SQL = f"""
+DROP TRIGGER adventures_adventure_changes ON adventures_adventure;
+DROP FUNCTION adventures_log_adventure_update();
+CREATE FUNCTION adventures_log_adventure_update() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO adventures_adventurechange (adventure_id, version, kind, object_id, operation, created_at)
+    VALUES (NEW.id, NEW.version, 'adventure', NEW.id, 'update', now());
+    RETURN NULL;
+END
+$$;
+CREATE TRIGGER adventures_adventure_changes AFTER UPDATE ON adventures_adventure
+    FOR EACH ROW
+    WHEN (to_jsonb(OLD) - {IGNORED_COLUMNS} IS DISTINCT FROM to_jsonb(NEW) - {IGNORED_COLUMNS})
+    EXECUTE FUNCTION adventures_log_adventure_update();
+"""
+PREVIOUS_LOG_ADVENTURE_UPDATE_SQL = """
+DROP TRIGGER adventures_adventure_changes ON adventures_adventure;
+DROP FUNCTION adventures_log_adventure_update();
+CREATE FUNCTION adventures_log_adventure_update() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO adventures_adventurechange (adventure_id, version, kind, object_id, operation, created_at)
+    SELECT n.id, n.version, 'adventure', n.id, 'update', now()
+    FROM new_rows n JOIN old_rows o ON o.id = n.id
+    WHERE to_jsonb(n) - 'version' - 'updated_at' IS DISTINCT FROM to_jsonb(o) - 'version' - 'updated_at';
+    RETURN NULL;
+END
+$$;
+CREATE TRIGGER adventures_adventure_changes AFTER UPDATE ON adventures_adventure
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION adventures_log_adventure_update();
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("adventures", "0035_adventure_version_volatile_columns"),
+    ]
+
+    operations = [
+        migrations.RunSQL(LOG_ADVENTURE_UPDATE_SQL, reverse_sql=PREVIOUS_LOG_ADVENTURE_UPDATE_SQL),
+    ]
@@ -3,11 +3,13 @@ from __future__ import annotations
 
 from django.conf import settings
 from django.contrib.postgres.fields import ArrayField
-from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.indexes import GinIndex, GistIndex
 from django.core.exceptions import ValidationError
 from django.db import models
 from django.db.models import F, Q
 
+from .geometry import LocationBox
+
 
 class Adventure(models.Model):
     is_template = models.BooleanField(default=False)
@@ -45,6 +47,8 @@ class Adventure(models.Model):
     spec_instructions = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Bumped by database triggers on every write to the adventure or its cards.
+    version = models.BigIntegerField(default=0, editable=False)
 
     class Meta:
         constraints = [
@@ -156,6 +160,7 @@ class Location(models.Model):
         ]
         indexes = [
             models.Index(fields=["adventure", "x", "y"], name="idx_locations_adv_xy"),
+            GistIndex(LocationBox(), name="idx_locations_box_gist"),
             GinIndex(fields=["tags"], name="idx_locations_tags_gin"),
         ]
 
@@ -240,6 +245,8 @@ class Character(models.Model):
                 name="characters_will_progress_range",
                 condition=Q(will_power_progress__gte=0) & Q(will_power_progress__lte=100),
             ),
+            # Target of the composite foreign keys of the character links.
+            models.UniqueConstraint(fields=["adventure", "id"], name="uq_characters_adventure_id"),
         ]
         indexes = [
             models.Index(
@@ -281,6 +288,41 @@ class PublishedAdventure(models.Model):
         return f"Published: {self.adventure.title}"
 
 
+class PublishedCatalogEntry(models.Model):
+    """Denormalized row of the public catalog, maintained by `adventures.catalog`."""
+
+    adventure = models.OneToOneField(
+        Adventure,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="catalog_entry",
+    )
+    title = models.TextField()
+    description = models.TextField(blank=True)
+    author_username = models.TextField()
+    published_at = models.DateTimeField()
+    locations_count = models.IntegerField(default=0)
+    characters_count = models.IntegerField(default=0)
+    races_count = models.IntegerField(default=0)
+    factions_count = models.IntegerField(default=0)
+    systems_count = models.IntegerField(default=0)
+    events_count = models.IntegerField(default=0)
+    runs_count = models.IntegerField(default=0)
+    last_run_at = models.DateTimeField(null=True, blank=True)
+    last_activity_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["-published_at", "-adventure"], name="idx_catalog_published"),
+            models.Index(fields=["-runs_count", "-published_at", "-adventure"], name="idx_catalog_popular"),
+            models.Index(fields=["-last_activity_at", "-adventure"], name="idx_catalog_activity"),
+        ]
+
+    def __str__(self) -> str:
+        return f"Catalog: {self.title}"
+
+
 class SkillSystem(models.Model):
     adventure = models.ForeignKey(Adventure, on_delete=models.CASCADE, related_name="skill_systems")
     title = models.TextField()
@@ -303,6 +345,7 @@ class SkillSystem(models.Model):
                 name="skill_systems_weights_not_all_zero",
                 condition=Q(w_body__gt=0) | Q(w_mind__gt=0) | Q(w_will__gt=0),
             ),
+            models.UniqueConstraint(fields=["adventure", "id"], name="uq_skill_systems_adventure_id"),
         ]
         indexes = [
             models.Index(fields=["adventure"], name="idx_skill_systems_adv"),
@@ -314,6 +357,10 @@ class SkillSystem(models.Model):
 
 
 class Technique(models.Model):
+    # Copy of `system.adventure_id`; composite foreign keys keep it in sync.
+    adventure = models.ForeignKey(
+        Adventure, on_delete=models.CASCADE, related_name="techniques", db_index=False
+    )
     system = models.ForeignKey(SkillSystem, on_delete=models.CASCADE, related_name="techniques")
     title = models.TextField()
     description = models.TextField(blank=True)
@@ -338,8 +385,10 @@ class Technique(models.Model):
                 name="techniques_required_level_nonneg",
                 condition=Q(required_system_level__gte=0),
             ),
+            models.UniqueConstraint(fields=["adventure", "id"], name="uq_techniques_adventure_id"),
         ]
         indexes = [
+            models.Index(fields=["adventure", "system"], name="idx_techniques_adv_system"),
             GinIndex(fields=["tags"], name="idx_techniques_tags_gin"),
         ]
 
@@ -383,6 +432,9 @@ class OtherInfo(models.Model):
 
 class CharacterSystem(models.Model):
     id = models.BigAutoField(primary_key=True)
+    adventure = models.ForeignKey(
+        Adventure, on_delete=models.CASCADE, related_name="character_systems", db_index=False
+    )
     character = models.ForeignKey(
         Character,
         on_delete=models.CASCADE,
@@ -412,6 +464,9 @@ class CharacterSystem(models.Model):
                 condition=Q(progress_percent__gte=0) & Q(progress_percent__lte=100),
             ),
         ]
+        indexes = [
+            models.Index(fields=["adventure", "character"], name="idx_char_systems_adv_char"),
+        ]
 
     def clean(self) -> None:
         if (
@@ -424,6 +479,9 @@ class CharacterSystem(models.Model):
 
 class CharacterTechnique(models.Model):
     id = models.BigAutoField(primary_key=True)
+    adventure = models.ForeignKey(
+        Adventure, on_delete=models.CASCADE, related_name="character_techniques", db_index=False
+    )
     character = models.ForeignKey(
         Character,
         on_delete=models.CASCADE,
@@ -444,10 +502,13 @@ class CharacterTechnique(models.Model):
                 name="uq_character_technique",
             ),
         ]
+        indexes = [
+            models.Index(fields=["adventure", "character"], name="idx_char_techniques_adv_char"),
+        ]
 
     def clean(self) -> None:
         if self.character_id and self.technique_id:
-            if self.character.adventure_id != self.technique.system.adventure_id:
+            if self.character.adventure_id != self.technique.adventure_id:
                 raise ValidationError("Character/technique adventure mismatch.")
 
 
@@ -522,7 +583,9 @@ class AdventureHistory(models.Model):
         AI = "ai", "ai"
         SYSTEM = "system", "system"
 
-    adventure = models.ForeignKey(Adventure, on_delete=models.CASCADE, related_name="history")
+    # The table is hash-partitioned by adventure (migration 0034); its primary
+    # key is (id, adventure_id), `id` alone stays unique through the sequence.
+    adventure = models.ForeignKey(Adventure, on_delete=models.CASCADE, related_name="history", db_index=False)
     role = models.TextField(choices=Role.choices)
     content = models.TextField()
     metadata = models.JSONField(default=dict, blank=True)
@@ -543,6 +606,41 @@ class AdventureHistory(models.Model):
         ]
 
 
+class AdventureChange(models.Model):
+    """Append-only log of writes to an adventure and its cards, filled by database triggers.
+
+    Rows carry the adventure version the write produced. There is no foreign key
+    constraint: deleting an adventure deletes its cards first, and the triggers
+    log those deletes; `prune_changes` removes the leftovers.
+    """
+
+    class Operation(models.TextChoices):
+        INSERT = "insert", "insert"
+        UPDATE = "update", "update"
+        DELETE = "delete", "delete"
+        PRUNE = "prune", "prune"
+
+    id = models.BigAutoField(primary_key=True)
+    adventure = models.ForeignKey(
+        Adventure,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        db_index=False,
+        related_name="changes",
+    )
+    version = models.BigIntegerField()
+    kind = models.TextField()
+    object_id = models.BigIntegerField(null=True)
+    operation = models.TextField(choices=Operation.choices)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["adventure", "version", "id"], name="idx_changes_adv_version"),
+            models.Index(fields=["created_at"], name="idx_changes_created"),
+        ]
+
+
 class AdventureMemory(models.Model):
     class Kind(models.TextChoices):
         SUMMARY = "summary", "summary"
@@ -550,11 +648,19 @@ class AdventureMemory(models.Model):
         RULE = "rule", "rule"
         GOAL = "goal", "goal"
 
+    class Level(models.IntegerChoices):
+        CHUNK = 0, "chunk"
+        CHAPTER = 1, "chapter"
+        SAGA = 2, "saga"
+
     adventure = models.ForeignKey(Adventure, on_delete=models.CASCADE, related_name="memories")
     kind = models.TextField(choices=Kind.choices)
+    level = models.IntegerField(choices=Level.choices, default=Level.CHUNK)
     title = models.TextField(blank=True)
     content = models.TextField()
     importance = models.IntegerField(default=0)
+    history_start_id = models.BigIntegerField(null=True, blank=True)
+    history_end_id = models.BigIntegerField(null=True, blank=True)
     tags = ArrayField(models.TextField(), default=list, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -564,13 +670,21 @@ class AdventureMemory(models.Model):
             models.CheckConstraint(
                 name="memories_kind_chk",
                 condition=Q(kind__in=["summary", "fact", "rule", "goal"]),
-            )
+            ),
+            models.CheckConstraint(
+                name="memories_level_chk",
+                condition=Q(level__in=[0, 1, 2]),
+            ),
         ]
         indexes = [
             models.Index(
                 fields=["adventure", "-importance"],
                 name="idx_memories_adv_importance",
             ),
+            models.Index(
+                fields=["adventure", "kind", "level"],
+                name="idx_memories_adv_kind_level",
+            ),
             GinIndex(fields=["tags"], name="idx_memories_tags_gin"),
         ]
 
@@ -610,3 +724,23 @@ class AdventureEvent(models.Model):
 
     def __str__(self) -> str:
         return self.title
+
+
+class LLMCallTicket(models.Model):
+    """A queued or running LLM call; the rows of one provider form a cross-process semaphore."""
+
+    class Priority(models.IntegerChoices):
+        BACKGROUND = 0, "background"
+        INTERACTIVE = 10, "interactive"
+
+    provider = models.TextField()
+    user_id = models.BigIntegerField(null=True, blank=True)
+    priority = models.IntegerField(choices=Priority.choices, default=Priority.INTERACTIVE)
+    created_at = models.DateTimeField(auto_now_add=True)
+    granted_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["provider", "granted_at"], name="idx_llm_tickets_provider"),
+        ]
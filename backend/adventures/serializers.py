@@ -10,6 +10,7 @@ from .models import (
     AdventureHeroSetup,
     ModerationEntry,
     PublishedAdventure,
+    PublishedCatalogEntry,
     Character,
     CharacterSystem,
     CharacterTechnique,
@@ -112,15 +113,27 @@ class ModerationEntrySerializer(serializers.ModelSerializer):
         fields = ("adventure_id", "title", "author_username", "submitted_at")
 
 
-class PublishedAdventureSerializer(serializers.ModelSerializer):
-    adventure_id = serializers.IntegerField(source="adventure.id", read_only=True)
-    title = serializers.CharField(source="adventure.title", read_only=True)
-    description = serializers.CharField(source="adventure.description", read_only=True)
-    author_username = serializers.CharField(source="adventure.author_user.username", read_only=True)
+class PublishedCatalogEntrySerializer(serializers.ModelSerializer):
+    adventure_id = serializers.IntegerField(read_only=True)
 
     class Meta:
-        model = PublishedAdventure
-        fields = ("adventure_id", "title", "description", "author_username", "published_at")
+        model = PublishedCatalogEntry
+        fields = (
+            "adventure_id",
+            "title",
+            "description",
+            "author_username",
+            "published_at",
+            "locations_count",
+            "characters_count",
+            "races_count",
+            "factions_count",
+            "systems_count",
+            "events_count",
+            "runs_count",
+            "last_run_at",
+            "last_activity_at",
+        )
 
 
 class AdventureHeroSetupSerializer(serializers.ModelSerializer):
@@ -220,6 +233,94 @@ class LocationSerializer(serializers.ModelSerializer):
         read_only_fields = ("id", "created_at", "updated_at")
 
 
+LOCATION_AREA_MAX_LIMIT = 2000
+LOCATION_TILE_MAX_SIZE = 1024
+LOCATION_NEAREST_MAX_LIMIT = 100
+
+
+class LocationViewportQuerySerializer(serializers.Serializer):
+    """Query of a map viewport: the rectangle `[x, x + width) x [y, y + height)`."""
+
+    x = serializers.IntegerField()
+    y = serializers.IntegerField()
+    width = serializers.IntegerField(min_value=1)
+    height = serializers.IntegerField(min_value=1)
+    limit = serializers.IntegerField(min_value=1, max_value=LOCATION_AREA_MAX_LIMIT, default=500)
+
+
+class LocationTileQuerySerializer(serializers.Serializer):
+    """Query of the square tile `(tx, ty)` of a `size` x `size` grid."""
+
+    tx = serializers.IntegerField()
+    ty = serializers.IntegerField()
+    size = serializers.IntegerField(min_value=1, max_value=LOCATION_TILE_MAX_SIZE, default=64)
+    limit = serializers.IntegerField(
+        min_value=1, max_value=LOCATION_AREA_MAX_LIMIT, default=LOCATION_AREA_MAX_LIMIT
+    )
+
+
+class LocationNearestQuerySerializer(serializers.Serializer):
+    """Nearest locations to a point or to another location of the same adventure."""
+
+    x = serializers.FloatField(required=False)
+    y = serializers.FloatField(required=False)
+    location = serializers.IntegerField(required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=LOCATION_NEAREST_MAX_LIMIT, default=10)
+    max_distance = serializers.FloatField(min_value=0, required=False)
+
+    def validate(self, attrs):
+        has_point = "x" in attrs and "y" in attrs
+        if has_point == ("location" in attrs):
+            raise serializers.ValidationError("Pass either x and y or location.")
+        return attrs
+
+
+WORLD_SEARCH_KINDS = (
+    "location",
+    "race",
+    "character",
+    "faction",
+    "other_info",
+    "system",
+    "technique",
+    "event",
+)
+WORLD_SEARCH_MAX_LIMIT = 100
+
+
+class WorldSearchQuerySerializer(serializers.Serializer):
+    """Search query; `kind` may be repeated to restrict the card kinds."""
+
+    q = serializers.CharField(max_length=200)
+    kind = serializers.MultipleChoiceField(choices=WORLD_SEARCH_KINDS, required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=WORLD_SEARCH_MAX_LIMIT, default=20)
+    prefix = serializers.BooleanField(default=True)
+
+
+HISTORY_SEARCH_MAX_LIMIT = 100
+
+
+class HistorySearchQuerySerializer(serializers.Serializer):
+    """Search over run history; `cursor` is the id of the last entry of the previous page."""
+
+    q = serializers.CharField(max_length=200)
+    role = serializers.ChoiceField(choices=AdventureHistory.Role.choices, required=False)
+    order = serializers.ChoiceField(choices=("asc", "desc"), default="desc")
+    cursor = serializers.IntegerField(min_value=1, required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=HISTORY_SEARCH_MAX_LIMIT, default=20)
+    prefix = serializers.BooleanField(default=True)
+
+
+CHANGES_MAX_LIMIT = 1000
+
+
+class AdventureChangesQuerySerializer(serializers.Serializer):
+    """Changes after the `since` version the client has already seen."""
+
+    since = serializers.IntegerField(min_value=0)
+    limit = serializers.IntegerField(min_value=1, max_value=CHANGES_MAX_LIMIT, default=500)
+
+
 class RaceSerializer(serializers.ModelSerializer):
     class Meta:
         model = Race
@@ -409,9 +510,9 @@ class CharacterTechniqueSerializer(serializers.ModelSerializer):
         if character and character.adventure_id != adventure.id:
             raise serializers.ValidationError({"character": "Персонаж из другого приключения."})
         technique = attrs.get("technique", getattr(self.instance, "technique", None))
-        if technique and technique.system.adventure_id != adventure.id:
+        if technique and technique.adventure_id != adventure.id:
             raise serializers.ValidationError({"technique": "Прием из другого приключения."})
-        if character and technique and character.adventure_id != technique.system.adventure_id:
+        if character and technique and character.adventure_id != technique.adventure_id:
             raise serializers.ValidationError({"technique": "Прием из другого приключения."})
         return attrs
 
@@ -446,3 +547,56 @@ class AdventureHistorySerializer(serializers.ModelSerializer):
         model = AdventureHistory
         fields = ("id", "role", "content", "metadata", "created_at")
         read_only_fields = ("id", "created_at")
+
+
+BATCH_KINDS = (
+    "location",
+    "race",
+    "system",
+    "faction",
+    "other_info",
+    "technique",
+    "character",
+    "event",
+    "character_system",
+    "character_technique",
+)
+BATCH_MAX_OPERATIONS = 1000
+
+
+def is_batch_ref(value) -> bool:
+    return isinstance(value, str) and value.startswith("$") and len(value) > 1
+
+
+class BatchOperationSerializer(serializers.Serializer):
+    """One operation of a batch; `ref` names a created card, `id` may be such a `$ref`."""
+
+    op = serializers.ChoiceField(choices=("create", "update", "delete"))
+    kind = serializers.ChoiceField(choices=BATCH_KINDS)
+    ref = serializers.CharField(required=False, max_length=100)
+    id = serializers.JSONField(required=False)
+    data = serializers.DictField(required=False, default=dict)
+
+    def validate(self, attrs: dict) -> dict:
+        if "ref" in attrs:
+            if attrs["op"] != "create":
+                raise serializers.ValidationError({"ref": "Ссылку можно задать только при создании."})
+            if not is_batch_ref(attrs["ref"]):
+                raise serializers.ValidationError({"ref": "Ссылка должна начинаться с $."})
+        if attrs["op"] == "create":
+            attrs.pop("id", None)
+            return attrs
+        card_id = attrs.get("id")
+        if not (is_batch_ref(card_id) or (isinstance(card_id, int) and not isinstance(card_id, bool))):
+            raise serializers.ValidationError({"id": "Нужен id карточки или $ссылка."})
+        return attrs
+
+
+class BatchSerializer(serializers.Serializer):
+    operations = BatchOperationSerializer(many=True, allow_empty=False, max_length=BATCH_MAX_OPERATIONS)
+
+    def validate_operations(self, operations: list[dict]) -> list[dict]:
+        refs = [operation["ref"] for operation in operations if "ref" in operation]
+        if len(refs) != len(set(refs)):
+            raise serializers.ValidationError("Ссылки $ в пакете должны быть уникальны.")
+        return operations
@@ -0,0 +1,36 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from backend.query_budget import QueryBudgetExceeded
+
+from .models import Adventure, Location
+from .views.template_views import LocationListCreateView
+
+
+class QueryBudgetTests(TestCase):
+    """The test runner enforces the budgets views declare."""
+
+    def setUp(self):
+        user = get_user_model().objects.create_user(
+            username="author", email="author@example.com", password=None
+        )
+        template = Adventure.objects.create(author_user=user, is_template=True, title="Template")
+        Location.objects.create(adventure=template, title="Harbour")
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+        self.url = f"/api/adventures/templates/{template.id}/locations/"
+
+    def test_locations_list_within_budget(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(
+            int(response["X-DB-Queries"]), LocationListCreateView.query_budget["GET"]
+        )
+
+    def test_request_over_budget_fails(self):
+        with mock.patch.object(LocationListCreateView, "query_budget", {"GET": 0}):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get(self.url)
@@ -9,6 +9,10 @@ from .views import (
     AdventureEventDetailView,
     AdventureEventListCreateView,
     AdventureTemplateExportView,
+    AdventureBatchView,
+    AdventureChangesView,
+    AdventureSearchView,
+    AdventureRunHistorySearchView,
     AdventureTemplateImportView,
     AdventureRunBootstrapView,
     AdventureRunCharactersView,
@@ -37,6 +41,9 @@ from .views import (
     FactionListCreateView,
     LocationDetailView,
     LocationListCreateView,
+    LocationNearestView,
+    LocationTileView,
+    LocationViewportView,
     OtherInfoDetailView,
     OtherInfoListCreateView,
     RaceDetailView,
@@ -65,6 +72,21 @@ urlpatterns = [
         LocationDetailView.as_view(),
         name="adventure_location_detail",
     ),
+    path(
+        "templates/<int:template_id>/locations/viewport/",
+        LocationViewportView.as_view(),
+        name="adventure_locations_viewport",
+    ),
+    path(
+        "templates/<int:template_id>/locations/tile/",
+        LocationTileView.as_view(),
+        name="adventure_locations_tile",
+    ),
+    path(
+        "templates/<int:template_id>/locations/nearest/",
+        LocationNearestView.as_view(),
+        name="adventure_locations_nearest",
+    ),
     path(
         "templates/<int:template_id>/races/",
         RaceListCreateView.as_view(),
@@ -155,6 +177,21 @@ urlpatterns = [
         AdventureEventDetailView.as_view(),
         name="adventure_event_detail",
     ),
+    path(
+        "templates/<int:template_id>/batch/",
+        AdventureBatchView.as_view(),
+        name="adventure_template_batch",
+    ),
+    path(
+        "templates/<int:template_id>/search/",
+        AdventureSearchView.as_view(),
+        name="adventure_template_search",
+    ),
+    path(
+        "templates/<int:template_id>/changes/",
+        AdventureChangesView.as_view(),
+        name="adventure_template_changes",
+    ),
     path(
         "templates/<int:template_id>/export/",
         AdventureTemplateExportView.as_view(),
@@ -215,6 +252,26 @@ urlpatterns = [
         AdventureRunHeroSetupView.as_view(),
         name="adventure_run_hero",
     ),
+    path(
+        "runs/<int:run_id>/batch/",
+        AdventureBatchView.as_view(),
+        name="adventure_run_batch",
+    ),
+    path(
+        "runs/<int:run_id>/search/",
+        AdventureSearchView.as_view(),
+        name="adventure_run_search",
+    ),
+    path(
+        "runs/<int:run_id>/changes/",
+        AdventureChangesView.as_view(),
+        name="adventure_run_changes",
+    ),
+    path(
+        "runs/<int:run_id>/history/search/",
+        AdventureRunHistorySearchView.as_view(),
+        name="adventure_run_history_search",
+    ),
     path(
         "runs/<int:run_id>/history/",
         AdventureRunHistoryView.as_view(),
@@ -265,6 +322,21 @@ urlpatterns = [
         LocationDetailView.as_view(),
         name="adventure_run_location_detail",
     ),
+    path(
+        "runs/<int:run_id>/locations/viewport/",
+        LocationViewportView.as_view(),
+        name="adventure_run_locations_viewport",
+    ),
+    path(
+        "runs/<int:run_id>/locations/tile/",
+        LocationTileView.as_view(),
+        name="adventure_run_locations_tile",
+    ),
+    path(
+        "runs/<int:run_id>/locations/nearest/",
+        LocationNearestView.as_view(),
+        name="adventure_run_locations_nearest",
+    ),
     path(
         "runs/<int:run_id>/races/",
         RaceListCreateView.as_view(),
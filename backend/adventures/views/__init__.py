@@ -24,6 +24,9 @@ from .template_views import (
     AdventureHeroSetupDetailView,
     LocationListCreateView,
     LocationDetailView,
+    LocationViewportView,
+    LocationTileView,
+    LocationNearestView,
     RaceListCreateView,
     RaceDetailView,
     SkillSystemListCreateView,
@@ -43,6 +46,9 @@ from .template_views import (
     AdventureEventListCreateView,
     AdventureEventDetailView,
 )
+from .batch_views import AdventureBatchView
+from .change_views import AdventureChangesView
+from .search_views import AdventureRunHistorySearchView, AdventureSearchView
 from .transfer_views import AdventureTemplateExportView, AdventureTemplateImportView
 from .moderation_views import (
     ModerationQueueListView,
@@ -69,6 +75,9 @@ __all__ = [
     "AdventureRunCharactersView",
     "LocationListCreateView",
     "LocationDetailView",
+    "LocationViewportView",
+    "LocationTileView",
+    "LocationNearestView",
     "RaceListCreateView",
     "RaceDetailView",
     "SkillSystemListCreateView",
@@ -87,6 +96,10 @@ __all__ = [
     "CharacterTechniqueDetailView",
     "AdventureEventListCreateView",
     "AdventureEventDetailView",
+    "AdventureBatchView",
+    "AdventureChangesView",
+    "AdventureSearchView",
+    "AdventureRunHistorySearchView",
     "AdventureTemplateExportView",
     "AdventureTemplateImportView",
     "ModerationQueueListView",
@@ -1,6 +1,9 @@
 """Views that invoke AI generation for adventure history."""
 from __future__ import annotations
 
+import logging
+import time
+
 from django.db import transaction
 from rest_framework import permissions, status
 from rest_framework.response import Response
@@ -10,17 +13,61 @@ from backend.llm import get_llm_client
 
 from .base import AdventureRunMixin
 from .history_utils import _prepare_history_for_prompt, _set_ai_waiting
+from .instrumentation import TurnTimer, _record_llm_usage
+from .memory_utils import schedule_history_summaries
 from .prompts import _build_generation_prompt
 from ..models import Adventure, AdventureHistory
 from ..serializers import AdventureHistorySerializer
 
+logger = logging.getLogger(__name__)
+
+
+def _generate_ai_entry(
+    adventure: Adventure,
+    user_id: int,
+    timer: TurnTimer,
+) -> AdventureHistory:
+    """Run one generation turn and store the AI entry with its usage and phase timings."""
+    client = get_llm_client()
+    history_entries, context = _prepare_history_for_prompt(adventure, client, timer)
+    with timer.phase("generation_prompt"):
+        system, prompt = _build_generation_prompt(adventure, history_entries, context=context)
+    started = time.perf_counter()
+    with timer.phase("generation_llm"):
+        response = client.generate(
+            prompt=prompt,
+            system=system,
+            max_tokens=120,
+            use_cache=False,
+            user_id=user_id,
+        )
+    usage = _record_llm_usage(
+        client, "generation", prompt, system, response, time.perf_counter() - started
+    )
+    content = response.text.strip()
+    if not content:
+        raise ValueError("Empty model response.")
+    with timer.phase("persist"):
+        entry = AdventureHistory.objects.create(
+            adventure=adventure,
+            role=AdventureHistory.Role.AI,
+            content=content,
+            metadata={"llm": usage, "timings_ms": timer.timings_ms()},
+        )
+    schedule_history_summaries(adventure.id)
+    logger.info(
+        "AI turn for adventure %s (%s): %s", adventure.id, timer.view, timer.timings_ms()
+    )
+    return entry
+
 
 class AdventureRunHistoryGenerateView(AdventureRunMixin, APIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def post(self, request, run_id):
         adventure = self.get_adventure()
-        with transaction.atomic():
+        timer = TurnTimer("generate")
+        with timer.phase("lock"), transaction.atomic():
             locked = Adventure.objects.select_for_update().get(id=adventure.id)
             if locked.is_waiting_ai:
                 return Response(
@@ -30,26 +77,18 @@ class AdventureRunHistoryGenerateView(AdventureRunMixin, APIView):
             locked.is_waiting_ai = True
             locked.save(update_fields=["is_waiting_ai"])
         try:
-            client = get_llm_client()
-            history_entries = _prepare_history_for_prompt(adventure, client)
-            prompt = _build_generation_prompt(adventure, history_entries)
-            response = client.generate(prompt=prompt, max_tokens=120)
-            content = response.text.strip()
-            if not content:
-                raise ValueError("Empty model response.")
-            entry = AdventureHistory.objects.create(
-                adventure=adventure,
-                role=AdventureHistory.Role.AI,
-                content=content,
-                metadata={},
-            )
+            entry = _generate_ai_entry(adventure, request.user.id, timer)
         except ValueError as exc:
             _set_ai_waiting(adventure.id, False)
+            timer.finish("invalid")
             return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception:
+            logger.exception("AI generation failed for adventure %s", adventure.id)
             _set_ai_waiting(adventure.id, False)
+            timer.finish("failed")
             return Response({"detail": "Model response failed."}, status=status.HTTP_502_BAD_GATEWAY)
         _set_ai_waiting(adventure.id, False)
+        timer.finish("ok")
         return Response(AdventureHistorySerializer(entry).data, status=status.HTTP_201_CREATED)
 
 
@@ -62,7 +101,8 @@ class AdventureRunHeroPromptView(AdventureRunMixin, APIView):
         content = (payload.get("content") or "").strip()
         if not content:
             return Response({"detail": "Content is required."}, status=status.HTTP_400_BAD_REQUEST)
-        with transaction.atomic():
+        timer = TurnTimer("hero_prompt")
+        with timer.phase("lock"), transaction.atomic():
             locked = Adventure.objects.select_for_update().get(id=adventure.id)
             if locked.is_waiting_ai:
                 return Response(
@@ -80,21 +120,10 @@ class AdventureRunHeroPromptView(AdventureRunMixin, APIView):
             metadata={},
         )
         try:
-            client = get_llm_client()
-            history_entries = _prepare_history_for_prompt(adventure, client)
-            prompt = _build_generation_prompt(adventure, history_entries)
-            response = client.generate(prompt=prompt, max_tokens=120)
-            ai_text = response.text.strip()
-            if not ai_text:
-                raise ValueError("Empty model response.")
-            ai_entry = AdventureHistory.objects.create(
-                adventure=adventure,
-                role=AdventureHistory.Role.AI,
-                content=ai_text,
-                metadata={},
-            )
+            ai_entry = _generate_ai_entry(adventure, request.user.id, timer)
         except ValueError as exc:
             _set_ai_waiting(adventure.id, False)
+            timer.finish("invalid")
             return Response(
                 {
                     "detail": str(exc),
@@ -104,7 +133,9 @@ class AdventureRunHeroPromptView(AdventureRunMixin, APIView):
                 status=status.HTTP_201_CREATED,
             )
         except Exception:
+            logger.exception("AI generation failed for adventure %s", adventure.id)
             _set_ai_waiting(adventure.id, False)
+            timer.finish("failed")
             return Response(
                 {
                     "detail": "Model response failed.",
@@ -114,6 +145,7 @@ class AdventureRunHeroPromptView(AdventureRunMixin, APIView):
                 status=status.HTTP_201_CREATED,
             )
         _set_ai_waiting(adventure.id, False)
+        timer.finish("ok")
         return Response(
             {
                 "user_entry": AdventureHistorySerializer(user_entry).data,
@@ -155,7 +187,8 @@ class AdventureRunHistoryRegenerateView(AdventureRunMixin, APIView):
 
     def post(self, request, run_id):
         adventure = self.get_adventure()
-        with transaction.atomic():
+        timer = TurnTimer("regenerate")
+        with timer.phase("lock"), transaction.atomic():
             locked = Adventure.objects.select_for_update().get(id=adventure.id)
             if locked.is_waiting_ai:
                 return Response(
@@ -180,24 +213,16 @@ class AdventureRunHistoryRegenerateView(AdventureRunMixin, APIView):
             locked.is_waiting_ai = True
             locked.save(update_fields=["is_waiting_ai"])
         try:
-            client = get_llm_client()
-            history_entries = _prepare_history_for_prompt(adventure, client)
-            prompt = _build_generation_prompt(adventure, history_entries)
-            response = client.generate(prompt=prompt, max_tokens=120)
-            content = response.text.strip()
-            if not content:
-                raise ValueError("Empty model response.")
-            entry = AdventureHistory.objects.create(
-                adventure=adventure,
-                role=AdventureHistory.Role.AI,
-                content=content,
-                metadata={},
-            )
+            entry = _generate_ai_entry(adventure, request.user.id, timer)
         except ValueError as exc:
             _set_ai_waiting(adventure.id, False)
+            timer.finish("invalid")
             return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception:
+            logger.exception("AI generation failed for adventure %s", adventure.id)
             _set_ai_waiting(adventure.id, False)
+            timer.finish("failed")
             return Response({"detail": "Model response failed."}, status=status.HTTP_502_BAD_GATEWAY)
         _set_ai_waiting(adventure.id, False)
+        timer.finish("ok")
         return Response(AdventureHistorySerializer(entry).data, status=status.HTTP_201_CREATED)
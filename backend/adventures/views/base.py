@@ -5,10 +5,16 @@ from django.shortcuts import get_object_or_404
 from rest_framework.exceptions import PermissionDenied
 from rest_framework.permissions import SAFE_METHODS
 
+from ..catalog import note_cards_changed
 from ..utils import is_moderator
 
 from ..models import Adventure, ModerationEntry, PublishedAdventure
 
+# Query budgets (see backend.query_budget) of the generic card endpoints: reads are
+# constant, writes validate a few foreign keys, deletes cascade.
+LIST_QUERY_BUDGET = {"GET": 4, "POST": 8}
+DETAIL_QUERY_BUDGET = {"GET": 4, "PUT": 8, "PATCH": 8, "DELETE": 15}
+
 
 class AdventureTemplateMixin:
     def get_adventure(self) -> Adventure:
@@ -21,14 +27,15 @@ class AdventureTemplateMixin:
                 )
                 if adventure.author_user_id == self.request.user.id:
                     self._adventure = adventure
-                elif (
-                    self.request.method in SAFE_METHODS
-                    and is_moderator(self.request.user)
-                    and (
-                        ModerationEntry.objects.filter(adventure=adventure).exists()
-                        or PublishedAdventure.objects.filter(adventure=adventure).exists()
-                    )
-                ):
+                elif self.request.method in SAFE_METHODS and is_moderator(self.request.user):
+                    self._adventure_published = PublishedAdventure.objects.filter(
+                        adventure=adventure
+                    ).exists()
+                    if not (
+                        self._adventure_published
+                        or ModerationEntry.objects.filter(adventure=adventure).exists()
+                    ):
+                        raise PermissionDenied("Недостаточно прав для доступа к приключению.")
                     self._adventure = adventure
                 else:
                     raise PermissionDenied("Недостаточно прав для доступа к приключению.")
@@ -54,3 +61,19 @@ class AdventureRunMixin:
                 is_template=False,
             )
         return self._adventure
+
+
+class CatalogCountsMixin:
+    """Keeps the card counts in the catalog row of a published template current."""
+
+    def create(self, request, *args, **kwargs):
+        response = super().create(request, *args, **kwargs)
+        model = self.get_serializer_class().Meta.model
+        note_cards_changed(self.get_adventure(), {model._meta.label: 1})
+        return response
+
+    def perform_destroy(self, instance):
+        _, deleted = instance.delete()
+        note_cards_changed(
+            self.get_adventure(), {label: -count for label, count in deleted.items()}
+        )
@@ -0,0 +1,296 @@
+"""Batch create/update/delete of world cards in one request and one transaction."""
+from __future__ import annotations
+
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import permissions, serializers, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .base import AdventureTemplateMixin
+from .embedding_index import schedule_embedding_refresh
+from ..catalog import note_cards_changed
+from ..models import (
+    Adventure,
+    AdventureEvent,
+    Character,
+    CharacterSystem,
+    CharacterTechnique,
+    Faction,
+    Location,
+    OtherInfo,
+    Race,
+    SkillSystem,
+    Technique,
+)
+from ..serializers import (
+    AdventureEventSerializer,
+    BatchSerializer,
+    CharacterSerializer,
+    CharacterSystemSerializer,
+    CharacterTechniqueSerializer,
+    FactionSerializer,
+    LocationSerializer,
+    OtherInfoSerializer,
+    RaceSerializer,
+    SkillSystemSerializer,
+    TechniqueSerializer,
+    is_batch_ref,
+)
+
+# kind -> (model, serializer). Cards of a level only reference cards of earlier
+# levels, so creating level by level resolves every `$ref` before it is validated.
+BATCH_KINDS = {
+    "location": (Location, LocationSerializer),
+    "race": (Race, RaceSerializer),
+    "system": (SkillSystem, SkillSystemSerializer),
+    "faction": (Faction, FactionSerializer),
+    "other_info": (OtherInfo, OtherInfoSerializer),
+    "technique": (Technique, TechniqueSerializer),
+    "character": (Character, CharacterSerializer),
+    "event": (AdventureEvent, AdventureEventSerializer),
+    "character_system": (CharacterSystem, CharacterSystemSerializer),
+    "character_technique": (CharacterTechnique, CharacterTechniqueSerializer),
+}
+BATCH_LEVELS = (
+    ("location", "race", "system", "faction", "other_info"),
+    ("technique", "character", "event"),
+    ("character_system", "character_technique"),
+)
+
+
+class _BatchError(Exception):
+    def __init__(self, errors: dict) -> None:
+        super().__init__(errors)
+        self.errors = errors
+
+
+class _PrefetchedRows:
+    """Stands in for a `PrimaryKeyRelatedField` queryset with rows loaded in one query."""
+
+    def __init__(self, model, rows: dict) -> None:
+        self.model = model
+        self.rows = rows
+
+    def get(self, pk):
+        try:
+            return self.rows[int(pk)]
+        except KeyError:
+            raise self.model.DoesNotExist from None
+
+
+def _relation_fields(serializer) -> dict:
+    return {
+        name: field
+        for name, field in serializer.fields.items()
+        if isinstance(field, serializers.PrimaryKeyRelatedField) and not field.read_only
+    }
+
+
+class _Batch:
+    def __init__(self, adventure: Adventure, operations: list[dict], context: dict) -> None:
+        self.adventure = adventure
+        self.operations = operations
+        self.context = context
+        self.refs: dict[str, int] = {}
+        self.results: dict[int, dict] = {}
+        self.primary_hero_id = adventure.primary_hero_id
+        self.card_counts: dict[str, int] = defaultdict(int)
+
+    def run(self) -> list[dict]:
+        for kinds in BATCH_LEVELS:
+            self._create_level(kinds)
+        self._update()
+        self._delete()
+        if self.primary_hero_id != self.adventure.primary_hero_id:
+            self.adventure.primary_hero_id = self.primary_hero_id
+            self.adventure.save(update_fields=["primary_hero", "updated_at"])
+        note_cards_changed(self.adventure, self.card_counts)
+        return [self.results[index] for index in range(len(self.operations))]
+
+    def _indexed(self, op: str, kinds) -> dict[str, list[int]]:
+        grouped = defaultdict(list)
+        for index, operation in enumerate(self.operations):
+            if operation["op"] == op and operation["kind"] in kinds:
+                grouped[operation["kind"]].append(index)
+        return grouped
+
+    def _resolve(self, value, index: int, field: str):
+        if not is_batch_ref(value):
+            return value
+        if value not in self.refs:
+            raise _BatchError({index: {field: [f"Неизвестная ссылка {value}."]}})
+        return self.refs[value]
+
+    def _serializers(self, kind: str, indexes: list[int], instances: dict | None = None) -> list:
+        """Validated serializers of the operations; relation lookups hit prefetched rows."""
+        serializer_class = BATCH_KINDS[kind][1]
+        relations = _relation_fields(serializer_class(context=self.context))
+        items = []
+        errors = {}
+        relation_ids = defaultdict(set)
+        for index in indexes:
+            data = dict(self.operations[index]["data"])
+            try:
+                for name in relations:
+                    if name in data:
+                        data[name] = self._resolve(data[name], index, name)
+            except _BatchError as exc:
+                errors.update(exc.errors)
+                continue
+            for name, field in relations.items():
+                if name not in data:
+                    continue
+                if isinstance(data[name], (int, str)) and not isinstance(data[name], bool):
+                    try:
+                        relation_ids[field.queryset.model].add(int(data[name]))
+                    except ValueError:
+                        pass
+            instance = instances[index] if instances is not None else None
+            serializer = serializer_class(
+                instance, data=data, partial=instance is not None, context=self.context
+            )
+            items.append((index, serializer))
+
+        prefetched = {
+            model: _PrefetchedRows(model, model._default_manager.in_bulk(ids))
+            for model, ids in relation_ids.items()
+        }
+        for index, serializer in items:
+            for field in _relation_fields(serializer).values():
+                if field.queryset.model in prefetched:
+                    field.queryset = prefetched[field.queryset.model]
+            if not serializer.is_valid():
+                errors[index] = serializer.errors
+        if errors:
+            raise _BatchError(errors)
+        return items
+
+    def _card_queryset(self, kind: str):
+        model = BATCH_KINDS[kind][0]
+        return model.objects.filter(adventure=self.adventure)
+
+    def _track_hero(self, character: Character, created: bool) -> None:
+        """Mirror of the character views: a player character is the primary hero."""
+        if character.is_player:
+            self.primary_hero_id = character.id
+        elif not created and self.primary_hero_id == character.id:
+            self.primary_hero_id = None
+
+    def _create_level(self, kinds) -> None:
+        for kind, indexes in self._indexed("create", kinds).items():
+            model, serializer_class = BATCH_KINDS[kind]
+            items = self._serializers(kind, indexes)
+            instances = [model(**serializer.validated_data, adventure=self.adventure) for _, serializer in items]
+            if kind == "character":
+                for instance in instances:
+                    if instance.is_player:
+                        instance.in_party = True
+            model.objects.bulk_create(instances)
+            self.card_counts[model._meta.label] += len(instances)
+            for (index, serializer), instance in zip(items, instances):
+                if kind == "character":
+                    self._track_hero(instance, created=True)
+                ref = self.operations[index].get("ref")
+                if ref:
+                    self.refs[ref] = instance.id
+                self.results[index] = {
+                    "op": "create",
+                    "kind": kind,
+                    "ref": ref,
+                    "id": instance.id,
+                    "data": serializer_class(instance, context=self.context).data,
+                }
+
+    def _load(self, kind: str, indexes: list[int]) -> dict[int, object]:
+        ids = {}
+        for index in indexes:
+            ids[index] = self._resolve(self.operations[index]["id"], index, "id")
+        rows = self._card_queryset(kind).in_bulk(set(ids.values()))
+        missing = {index: {"id": ["Карточка не найдена."]} for index, card_id in ids.items() if card_id not in rows}
+        if missing:
+            raise _BatchError(missing)
+        return {index: rows[card_id] for index, card_id in ids.items()}
+
+    def _update(self) -> None:
+        for kind, indexes in self._indexed("update", BATCH_KINDS).items():
+            model, serializer_class = BATCH_KINDS[kind]
+            instances = self._load(kind, indexes)
+            if len({instance.id for instance in instances.values()}) != len(instances):
+                raise _BatchError({indexes[-1]: {"id": ["Карточка обновляется в пакете дважды."]}})
+            items = self._serializers(kind, indexes, instances)
+            fields = set()
+            now = timezone.now()
+            for index, serializer in items:
+                instance = instances[index]
+                for name, value in serializer.validated_data.items():
+                    setattr(instance, name, value)
+                    fields.add(name)
+                if kind == "character":
+                    if instance.is_player and not instance.in_party:
+                        instance.in_party = True
+                        fields.add("in_party")
+                    self._track_hero(instance, created=False)
+                if hasattr(instance, "updated_at"):
+                    instance.updated_at = now
+                    fields.add("updated_at")
+            if fields:
+                model.objects.bulk_update(list(instances.values()), sorted(fields))
+            for index, serializer in items:
+                self.results[index] = {
+                    "op": "update",
+                    "kind": kind,
+                    "id": instances[index].id,
+                    "data": serializer_class(instances[index], context=self.context).data,
+                }
+
+    def _delete(self) -> None:
+        deletes = self._indexed("delete", BATCH_KINDS)
+        loaded = {kind: self._load(kind, indexes) for kind, indexes in deletes.items()}
+        for kinds in reversed(BATCH_LEVELS):
+            for kind in kinds:
+                if kind not in loaded:
+                    continue
+                ids = {instance.id for instance in loaded[kind].values()}
+                if kind == "character" and self.primary_hero_id in ids:
+                    self.primary_hero_id = None
+                _, deleted = self._card_queryset(kind).filter(id__in=ids).delete()
+                for label, count in deleted.items():
+                    self.card_counts[label] -= count
+                for index, instance in loaded[kind].items():
+                    self.results[index] = {"op": "delete", "kind": kind, "id": instance.id}
+
+
+class AdventureBatchView(AdventureTemplateMixin, APIView):
+    """Applies many card operations at once: all of them or none.
+
+    Creates run first, in dependency order (locations and systems before the
+    characters and techniques that point at them), then updates, then deletes.
+    Queries grow with the number of card kinds in the batch, not with its size.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+    query_budget = 150
+
+    def post(self, request, *args, **kwargs):
+        batch = BatchSerializer(data=request.data)
+        batch.is_valid(raise_exception=True)
+        adventure = self.get_adventure()
+        context = {"request": request, "view": self, "adventure": adventure}
+        try:
+            with transaction.atomic():
+                results = _Batch(adventure, batch.validated_data["operations"], context).run()
+                # Bulk writes send no model signals.
+                schedule_embedding_refresh(adventure.id)
+        except _BatchError as exc:
+            return Response({"errors": exc.errors}, status=status.HTTP_400_BAD_REQUEST)
+        except IntegrityError:
+            # Operations that are valid one by one but conflict with each other,
+            # e.g. the same system given to a character twice.
+            return Response(
+                {"detail": "Batch operations conflict with each other."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return Response({"results": results})
@@ -0,0 +1,77 @@
+"""Conditional GET for adventure resources based on `Adventure.version`.
+
+Triggers bump the version on every write to an adventure or its cards, so the
+version read together with the access check identifies the state of the whole
+world. Turn bookkeeping columns (`is_waiting_ai`, `rollback_min_history_id`) do
+not bump it; views that return them list them in `etag_fields`. A matching
+`If-None-Match` is answered with `304` before any card table is queried.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+
+def _get_published_cache_seconds() -> int:
+    return max(0, int(os.getenv("PUBLISHED_CACHE_SECONDS", "60")))
+
+
+class _NotModified(Exception):
+    pass
+
+
+class AdventureETagMixin:
+    """ETag and Cache-Control for GET of views with `get_adventure()`.
+
+    The version is read before the response is built, so a write racing with
+    the request can only make the next revalidation return the page again.
+    """
+
+    etag_methods = ("GET", "HEAD")
+    etag_fields: tuple[str, ...] = ()
+
+    def get_etag(self, request) -> str:
+        adventure = self.get_adventure()
+        reader = "shared" if self.is_shared_cacheable(adventure) else request.user.id
+        key = f"{adventure.id}:{adventure.version}:{reader}:{request.get_full_path()}"
+        for field in self.etag_fields:
+            key += f":{getattr(adventure, field)}"
+        return quote_etag(hashlib.md5(key.encode()).hexdigest())
+
+    def is_shared_cacheable(self, adventure) -> bool:
+        """Published templates read by a non-author: the same page for every reader."""
+        return (
+            adventure.is_template
+            and adventure.author_user_id != self.request.user.id
+            and getattr(self, "_adventure_published", False)
+        )
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in self.etag_methods:
+            self._etag = self.get_etag(request)
+            if self._etag in parse_etags(request.headers.get("If-None-Match", "")):
+                raise _NotModified()
+
+    def handle_exception(self, exc):
+        if isinstance(exc, _NotModified):
+            return Response(status=status.HTTP_304_NOT_MODIFIED)
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        etag = getattr(self, "_etag", None)
+        if etag and response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            response["ETag"] = etag
+            seconds = _get_published_cache_seconds()
+            if seconds and self.is_shared_cacheable(self.get_adventure()):
+                patch_cache_control(response, public=True, max_age=0, s_maxage=seconds)
+            else:
+                patch_cache_control(response, private=True, no_cache=True)
+            patch_vary_headers(response, ["Authorization"])
+        return response
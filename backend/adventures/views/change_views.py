@@ -0,0 +1,63 @@
+"""Incremental sync of an adventure from its change log."""
+from __future__ import annotations
+
+from rest_framework import permissions
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .base import AdventureTemplateMixin
+from ..models import Adventure, AdventureChange
+from ..serializers import AdventureChangesQuerySerializer
+
+
+def changes_since(adventure: Adventure, since: int, limit: int) -> dict:
+    """Changes after version `since`, cut at a version boundary.
+
+    `version` of the result is the version the client is in sync with after
+    applying `changes`; `reset` means the log no longer covers `since` (it was
+    pruned, or one write touched more than `limit` rows) and the client has to
+    reload the adventure.
+    """
+    if since >= adventure.version:
+        return {"version": adventure.version, "reset": False, "has_more": False, "changes": []}
+    rows = list(
+        AdventureChange.objects.filter(adventure=adventure, version__gt=since)
+        .order_by("version", "id")
+        .values("version", "kind", "object_id", "operation")[: limit + 1]
+    )
+    if any(row["operation"] == AdventureChange.Operation.PRUNE for row in rows):
+        return {"version": adventure.version, "reset": True, "has_more": False, "changes": []}
+    has_more = len(rows) > limit
+    version = max([adventure.version, *(row["version"] for row in rows)])
+    if has_more:
+        last_version = rows[limit]["version"]
+        rows = [row for row in rows[:limit] if row["version"] != last_version]
+        if not rows:
+            return {"version": adventure.version, "reset": True, "has_more": False, "changes": []}
+        version = rows[-1]["version"]
+    return {
+        "version": version,
+        "reset": False,
+        "has_more": has_more,
+        "changes": [
+            {"version": row["version"], "kind": row["kind"], "id": row["object_id"], "op": row["operation"]}
+            for row in rows
+        ],
+    }
+
+
+class AdventureChangesView(AdventureTemplateMixin, APIView):
+    """What changed in a template or run since a version: `?since=<version>`.
+
+    A client that is up to date costs the access check only; otherwise one
+    indexed range read of the change log.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+    query_budget = 4
+
+    def get(self, request, *args, **kwargs):
+        query = AdventureChangesQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+        return Response(changes_since(self.get_adventure(), params["since"], params["limit"]))
@@ -0,0 +1,285 @@
+"""Per-adventure embedding index for semantic card and memory retrieval.
+
+Each adventure gets one file, `<id>.<embedder>.idx`: a JSON manifest of
+`[kind, id, digest]` rows followed by a flat float32 matrix. Manifest and
+vectors are published together by renaming a uniquely named temporary file, so a
+reader always sees a matching pair; queries memory-map the file and score the
+vectors in place.
+
+The index is refreshed on write: saving or deleting an embedded card schedules a
+background refresh after the transaction commits, and only cards whose text
+digest changed are re-embedded, whichever code path wrote them. Queries read
+whatever index is published and build it only when there is none yet.
+"""
+from __future__ import annotations
+
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import hashlib
+import json
+import logging
+import mmap
+import os
+from pathlib import Path
+import struct
+import tempfile
+import threading
+from typing import Optional
+
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.db.models.signals import post_delete, post_save
+
+from backend.embeddings import Embedder, get_embedder
+
+from ..models import Adventure, AdventureMemory, Character, Faction, Location, OtherInfo
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover - numpy is optional
+    numpy = None
+
+logger = logging.getLogger(__name__)
+
+EMBEDDED_MODELS = (
+    ("other_info", OtherInfo),
+    ("character", Character),
+    ("location", Location),
+    ("faction", Faction),
+    ("memory", AdventureMemory),
+)
+
+# Magic and manifest length; the manifest is padded so the vectors start 4-byte aligned.
+_HEADER = struct.Struct("<4sI")
+_MAGIC = b"EIX1"
+
+
+def _get_embedding_settings() -> tuple[bool, int, float]:
+    enabled = os.getenv("EMBEDDING_INDEX_ENABLED", "False") == "True"
+    top_k = int(os.getenv("EMBEDDING_TOP_K", "8"))
+    min_score = float(os.getenv("EMBEDDING_MIN_SCORE", "0.2"))
+    if top_k < 1:
+        top_k = 1
+    return enabled, top_k, min_score
+
+
+def _index_dir() -> Path:
+    default_dir = Path(settings.BASE_DIR).parent / "embeddings"
+    return Path(os.getenv("EMBEDDING_INDEX_DIR", default_dir))
+
+
+def _index_path(adventure_id: int, embedder: Embedder) -> Path:
+    return _index_dir() / f"{adventure_id}.{embedder.name}.idx"
+
+
+def _card_text(kind: str, card) -> str:
+    if kind == "memory":
+        parts = [card.title, card.content]
+    elif kind == "other_info":
+        parts = [card.title, card.category, card.description]
+    else:
+        parts = [card.title, card.description]
+    parts.append(" ".join(card.tags))
+    return ". ".join(part for part in parts if part)
+
+
+@contextmanager
+def _open_index(path: Path, embedder: Embedder):
+    """Yield `(rows, vectors)` of a published index, or None; `vectors` is a view of the mapping.
+
+    Views of the vectors must not outlive the block.
+    """
+    try:
+        handle = path.open("rb")
+    except FileNotFoundError:
+        yield None
+        return
+    with handle, mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        magic, manifest_size = _HEADER.unpack_from(mapped)
+        if magic != _MAGIC:
+            yield None
+            return
+        start = _HEADER.size
+        manifest = json.loads(mapped[start : start + manifest_size])
+        if manifest.get("embedder") != embedder.name:
+            yield None
+            return
+        offset = start + manifest_size
+        vectors = memoryview(mapped)[offset:]
+        try:
+            yield [tuple(row) for row in manifest["rows"]], vectors
+        finally:
+            vectors.release()
+
+
+def _write_index(path: Path, embedder: Embedder, rows: list, vectors: array) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    manifest = json.dumps({"embedder": embedder.name, "dim": embedder.dim, "rows": rows}).encode()
+    manifest += b" " * (-(_HEADER.size + len(manifest)) % 4)
+    descriptor, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(descriptor, "wb") as handle:
+            handle.write(_HEADER.pack(_MAGIC, len(manifest)))
+            handle.write(manifest)
+            vectors.tofile(handle)
+        os.replace(tmp_name, path)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+
+
+@contextmanager
+def _adventure_lock(adventure_id: int):
+    """Serialise index builds of one adventure across threads and processes."""
+    lock_key = f"embedding-index:{adventure_id}"
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_lock(hashtext(%s))", [lock_key])
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_unlock(hashtext(%s))", [lock_key])
+
+
+def _card_digest(text: str) -> str:
+    return hashlib.md5(text.encode()).hexdigest()
+
+
+def refresh_embedding_index(adventure_id: int) -> Path:
+    """Bring the adventure index up to date and return its path."""
+    embedder = get_embedder()
+    path = _index_path(adventure_id, embedder)
+    current = {}
+    for kind, model in EMBEDDED_MODELS:
+        for card in model.objects.filter(adventure_id=adventure_id):
+            text = _card_text(kind, card)
+            current[(kind, card.id)] = (_card_digest(text), text)
+
+    dim = embedder.dim
+    stored_count = 0
+    kept_rows = []
+    kept_vectors = array("f")
+    with _open_index(path, embedder) as stored:
+        if stored is not None:
+            stored_rows, stored_vectors = stored
+            stored_count = len(stored_rows)
+            flat = stored_vectors.cast("f")
+            try:
+                for index, (kind, card_id, digest) in enumerate(stored_rows):
+                    if current.get((kind, card_id), (None,))[0] == digest:
+                        kept_rows.append([kind, card_id, digest])
+                        kept_vectors.extend(flat[index * dim : (index + 1) * dim])
+            finally:
+                flat.release()
+    kept_keys = {(kind, card_id) for kind, card_id, _ in kept_rows}
+    if path.exists() and len(kept_rows) == stored_count and len(kept_keys) == len(current):
+        return path
+
+    changed = [(key, digest, text) for key, (digest, text) in current.items() if key not in kept_keys]
+    vectors = embedder.embed([text for _, _, text in changed]) if changed else []
+    for ((kind, card_id), digest, _), vector in zip(changed, vectors):
+        kept_rows.append([kind, card_id, digest])
+        kept_vectors.extend(vector)
+    _write_index(path, embedder, kept_rows, kept_vectors)
+    return path
+
+
+_refresh_executor: Optional[ThreadPoolExecutor] = None
+_refresh_lock = threading.Lock()
+_refresh_pending: set[int] = set()
+
+
+def _run_refresh(adventure_id: int) -> None:
+    with _refresh_lock:
+        _refresh_pending.discard(adventure_id)
+    try:
+        with _adventure_lock(adventure_id):
+            if Adventure.objects.filter(id=adventure_id).exists():
+                refresh_embedding_index(adventure_id)
+            else:
+                _index_path(adventure_id, get_embedder()).unlink(missing_ok=True)
+    except Exception:
+        logger.exception("Embedding index refresh failed for adventure %s", adventure_id)
+    finally:
+        # Runs on a pool thread: drop the connections it opened.
+        connections.close_all()
+
+
+def _submit_refresh(adventure_id: int) -> None:
+    global _refresh_executor
+    with _refresh_lock:
+        if adventure_id in _refresh_pending:
+            return
+        _refresh_pending.add(adventure_id)
+        if _refresh_executor is None:
+            _refresh_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embedding-index")
+        executor = _refresh_executor
+    executor.submit(_run_refresh, adventure_id)
+
+
+def schedule_embedding_refresh(adventure_id: int) -> None:
+    """Refresh the adventure index in the background once the current transaction commits.
+
+    Refreshes already queued for the adventure are not repeated.
+    """
+    if _get_embedding_settings()[0]:
+        transaction.on_commit(lambda: _submit_refresh(adventure_id))
+
+
+def _card_changed(sender, instance, **kwargs) -> None:
+    schedule_embedding_refresh(instance.adventure_id)
+
+
+def connect_embedding_signals() -> None:
+    """Refresh on write for the embedded models; only connected with the index enabled.
+
+    Connected receivers stop Django from fast-deleting these rows in cascades, so
+    adventures without the index do not pay for them.
+    """
+    if not _get_embedding_settings()[0]:
+        return
+    for kind, model in EMBEDDED_MODELS:
+        post_save.connect(_card_changed, sender=model, dispatch_uid=f"embedding_index.save.{kind}")
+        post_delete.connect(_card_changed, sender=model, dispatch_uid=f"embedding_index.delete.{kind}")
+
+
+def _scores(vectors: memoryview, dim: int, query: list[float]) -> list[float]:
+    if numpy is not None:
+        matrix = numpy.frombuffer(vectors, dtype=numpy.float32).reshape(-1, dim)
+        try:
+            return (matrix @ numpy.asarray(query, dtype=numpy.float32)).tolist()
+        finally:
+            del matrix
+    flat = vectors.cast("f")
+    try:
+        return [
+            sum(flat[offset + index] * query[index] for index in range(dim))
+            for offset in range(0, len(flat), dim)
+        ]
+    finally:
+        flat.release()
+
+
+def search_embedding_index(adventure: Adventure, text: str) -> list[tuple[str, int, float]]:
+    """Top-k `(kind, id, score)` rows most similar to `text`, best first."""
+    enabled, top_k, min_score = _get_embedding_settings()
+    if not enabled or not text.strip():
+        return []
+    embedder = get_embedder()
+    path = _index_path(adventure.id, embedder)
+    if not path.exists():
+        with _adventure_lock(adventure.id):
+            if not path.exists():
+                refresh_embedding_index(adventure.id)
+    with _open_index(path, embedder) as index:
+        if index is None or not index[0]:
+            return []
+        rows, vectors = index
+        scores = _scores(vectors, embedder.dim, embedder.embed([text])[0])
+    ranked = sorted(zip(rows, scores), key=lambda item: item[1], reverse=True)
+    return [
+        (kind, card_id, score)
+        for (kind, card_id, _), score in ranked[:top_k]
+        if score >= min_score
+    ]
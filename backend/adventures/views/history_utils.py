@@ -2,11 +2,77 @@
 from __future__ import annotations
 
 import json
+import logging
+import time
+from typing import Optional
 
-from backend.llm import LLMClient
+from backend.llm import PRIORITY_BACKGROUND, LLMClient, LLMResponse, Tokenizer
 
 from ..models import Adventure, AdventureEvent, AdventureHistory, Character, CharacterSystem, CharacterTechnique
-from .prompts import _build_card_update_prompt, _get_history_limits, _get_update_token_limits
+from .instrumentation import TurnTimer, _record_llm_usage
+from .prompts import (
+    CARD_UPDATE_SCHEMA,
+    _build_card_update_prompt,
+    _build_generation_context,
+    _build_generation_system_prompt,
+    _format_history_entry,
+    _get_history_limits,
+    _get_update_token_limits,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _salvage_json_object(text: str) -> dict | None:
+    """Parse the first JSON object in `text`, closing it if the output was cut off.
+
+    The scanner walks the text once and remembers the last position where every
+    value so far is complete (after an opening bracket, a closing bracket, or
+    before a comma). For truncated output, the prefix up to that point plus the
+    missing closing brackets is parsed, dropping only the unfinished tail.
+    """
+    start = text.find("{")
+    if start == -1:
+        return None
+    stack: list[str] = []
+    safe_points: list[tuple[int, str]] = []
+    in_string = False
+    escaped = False
+    for index in range(start, len(text)):
+        char = text[index]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+            continue
+        if char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append("}" if char == "{" else "]")
+            safe_points.append((index + 1, "".join(reversed(stack))))
+        elif char in "}]":
+            if not stack or stack[-1] != char:
+                break
+            stack.pop()
+            if not stack:
+                try:
+                    payload = json.loads(text[start : index + 1])
+                except json.JSONDecodeError:
+                    break
+                return payload if isinstance(payload, dict) else None
+            safe_points.append((index + 1, "".join(reversed(stack))))
+        elif char == ",":
+            safe_points.append((index, "".join(reversed(stack))))
+    for end, closing in reversed(safe_points):
+        try:
+            payload = json.loads(text[start:end] + closing)
+        except json.JSONDecodeError:
+            continue
+        return payload if isinstance(payload, dict) else None
+    return None
 
 
 def _extract_json_payload(text: str) -> dict | None:
@@ -16,19 +82,11 @@ def _extract_json_payload(text: str) -> dict | None:
     cleaned = cleaned.replace("```json", "").replace("```", "").strip()
     try:
         payload = json.loads(cleaned)
-        return payload if isinstance(payload, dict) else None
-    except json.JSONDecodeError:
-        return None
-    start = cleaned.find("{")
-    end = cleaned.rfind("}")
-    if start == -1 or end == -1 or end <= start:
-        return None
-    snippet = cleaned[start : end + 1]
-    try:
-        payload = json.loads(snippet)
+        if isinstance(payload, dict):
+            return payload
     except json.JSONDecodeError:
-        return None
-    return payload if isinstance(payload, dict) else None
+        pass
+    return _salvage_json_object(cleaned)
 
 
 def _apply_card_updates(adventure: Adventure, payload: dict) -> None:
@@ -53,7 +111,7 @@ def _apply_card_updates(adventure: Adventure, payload: dict) -> None:
                 event.state = state
                 update_fields.append("state")
             if update_fields:
-                event.save(update_fields=update_fields)
+                event.save(update_fields=[*update_fields, "updated_at"])
 
     characters_updates = payload.get("characters", [])
     if isinstance(characters_updates, list) and characters_updates:
@@ -86,7 +144,7 @@ def _apply_card_updates(adventure: Adventure, payload: dict) -> None:
                 setattr(character, field, value)
                 update_fields.append(field)
             if update_fields:
-                character.save(update_fields=update_fields)
+                character.save(update_fields=[*update_fields, "updated_at"])
 
     system_updates = payload.get("character_systems", [])
     if isinstance(system_updates, list) and system_updates:
@@ -96,9 +154,7 @@ def _apply_card_updates(adventure: Adventure, payload: dict) -> None:
             record_id = entry.get("id")
             if not record_id:
                 continue
-            record = CharacterSystem.objects.filter(
-                character__adventure=adventure, id=record_id
-            ).first()
+            record = CharacterSystem.objects.filter(adventure=adventure, id=record_id).first()
             if record is None:
                 continue
             update_fields = []
@@ -133,9 +189,7 @@ def _apply_card_updates(adventure: Adventure, payload: dict) -> None:
             record_id = entry.get("id")
             if not record_id:
                 continue
-            record = CharacterTechnique.objects.filter(
-                character__adventure=adventure, id=record_id
-            ).first()
+            record = CharacterTechnique.objects.filter(adventure=adventure, id=record_id).first()
             if record is None:
                 continue
             if "notes" in entry and isinstance(entry.get("notes"), str):
@@ -143,41 +197,161 @@ def _apply_card_updates(adventure: Adventure, payload: dict) -> None:
                 record.save(update_fields=["notes"])
 
 
-def _prepare_history_for_prompt(adventure: Adventure, client: LLMClient) -> list[AdventureHistory]:
-    history_entries = list(AdventureHistory.objects.filter(adventure=adventure).order_by("id"))
-    max_posts, tail_posts = _get_history_limits()
-    if len(history_entries) <= max_posts:
-        return history_entries
+HISTORY_BATCH_SIZE = 200
+
+
+def _entry_tokens(entry: AdventureHistory, tokenizer: Tokenizer, measured: list[AdventureHistory]) -> int:
+    """Token count of one entry, cached in metadata under the tokenizer name."""
+    tokens = dict((entry.metadata or {}).get("tokens") or {})
+    count = tokens.get(tokenizer.name)
+    if count is None:
+        count = tokenizer.count(_format_history_entry(entry))
+        tokens[tokenizer.name] = count
+        entry.metadata = {**(entry.metadata or {}), "tokens": tokens}
+        measured.append(entry)
+    return count
+
+
+def _load_history_window(
+    adventure: Adventure,
+    tokenizer: Tokenizer,
+    newest: list[AdventureHistory],
+    token_budget: int,
+    batch_size: int,
+) -> tuple[list[AdventureHistory], int]:
+    """Walk history newest-first in batches until `token_budget` is spent.
+
+    `newest` is the first batch, already loaded newest first. Returns the loaded
+    entries oldest first and the index of the oldest one that still fits; the newest
+    entry is always kept. Only entries up to the first that does not fit are measured
+    and saved, so a long run costs a batch or two per turn instead of a full scan.
+    """
+    queryset = AdventureHistory.objects.filter(adventure=adventure).order_by("-id")
+    loaded: list[AdventureHistory] = []
+    measured: list[AdventureHistory] = []
+    batch = newest
+    used = 0
+    kept = 0
+    while batch:
+        loaded.extend(batch)
+        for entry in batch:
+            used += _entry_tokens(entry, tokenizer, measured)
+            if used > token_budget and kept:
+                batch = []
+                break
+            kept += 1
+        else:
+            if len(batch) < batch_size:
+                break
+            batch = list(queryset.filter(id__lt=batch[-1].id)[:batch_size])
+    if measured:
+        AdventureHistory.objects.filter(adventure=adventure).bulk_update(
+            measured, ["metadata"], batch_size=500
+        )
+    loaded.reverse()
+    return loaded, len(loaded) - kept
+
+
+def _request_card_update(
+    adventure: Adventure,
+    client: LLMClient,
+    prompt: str,
+    timer: TurnTimer,
+    **kwargs,
+) -> LLMResponse:
+    started = time.perf_counter()
+    with timer.phase("card_update_llm"):
+        response = client.generate(
+            prompt=prompt,
+            priority=PRIORITY_BACKGROUND,
+            user_id=adventure.player_user_id,
+            use_cache=True,
+            **kwargs,
+        )
+    _record_llm_usage(client, "card_update", prompt, None, response, time.perf_counter() - started)
+    return response
+
+
+def _prepare_history_for_prompt(
+    adventure: Adventure,
+    client: LLMClient,
+    timer: Optional[TurnTimer] = None,
+) -> tuple[list[AdventureHistory], str]:
+    """Return the history window that fits the prompt budget and the generation context.
+
+    The context is built once from the newest entries: its size is reserved from the
+    budget, and the caller passes it on to `_build_generation_prompt`.
+    """
+    timer = timer or TurnTimer("background")
+    with timer.phase("history_load"):
+        token_budget, tail_posts = _get_history_limits()
+        batch_size = max(HISTORY_BATCH_SIZE, tail_posts + 1)
+        newest = list(AdventureHistory.objects.filter(adventure=adventure).order_by("-id")[:batch_size])
+        context = _build_generation_context(adventure, newest[::-1])
+        reserved_tokens = client.count_tokens(
+            _build_generation_system_prompt(adventure)
+        ) + client.count_tokens(context)
+        history_entries, start = _load_history_window(
+            adventure,
+            client.tokenizer,
+            newest,
+            max(0, token_budget - reserved_tokens),
+            batch_size,
+        )
+    if start == 0:
+        return history_entries, context
     if tail_posts == 0:
-        return history_entries[-max_posts:]
+        return history_entries[start:], context
     if adventure.rollback_min_history_id:
-        trimmed = [entry for entry in history_entries if entry.id >= adventure.rollback_min_history_id]
-        if len(trimmed) <= max_posts:
-            return trimmed
+        if history_entries[start].id <= adventure.rollback_min_history_id:
+            return [
+                entry for entry in history_entries if entry.id >= adventure.rollback_min_history_id
+            ], context
     if len(history_entries) <= tail_posts:
-        return history_entries
-    cutoff_entry = history_entries[-max_posts]
+        return history_entries[start:], context
+    cutoff_entry = history_entries[start]
 
     attempt_tail = tail_posts
     tail_entries = history_entries[-attempt_tail:]
-    update_prompt = _build_card_update_prompt(adventure, tail_entries)
+    with timer.phase("card_update_prompt"):
+        update_prompt = _build_card_update_prompt(adventure, tail_entries)
     update_max_tokens, strict_max_tokens = _get_update_token_limits()
-    response = client.generate(prompt=update_prompt, max_tokens=update_max_tokens)
+    response = _request_card_update(
+        adventure,
+        client,
+        update_prompt,
+        timer,
+        max_tokens=update_max_tokens,
+        response_format=CARD_UPDATE_SCHEMA,
+    )
     payload = _extract_json_payload(response.text)
-    if payload is None:
-        print("Invalid card update JSON (first pass):", response.text)
-        strict_prompt = _build_card_update_prompt(adventure, tail_entries, strict_json=True)
-        response = client.generate(prompt=strict_prompt, max_tokens=strict_max_tokens)
+    if payload is None and not client.supports_json_mode:
+        # Without native JSON output a stricter prompt is the only remaining lever.
+        logger.warning(
+            "Invalid card update JSON (first pass) for adventure %s: %.500s",
+            adventure.id,
+            response.text,
+        )
+        client.discard_cached(response)
+        with timer.phase("card_update_prompt"):
+            strict_prompt = _build_card_update_prompt(adventure, tail_entries, strict_json=True)
+        response = _request_card_update(
+            adventure, client, strict_prompt, timer, max_tokens=strict_max_tokens
+        )
         payload = _extract_json_payload(response.text)
     if payload is None:
-        print("Invalid card update JSON (strict pass):", response.text)
+        logger.warning(
+            "Invalid card update JSON for adventure %s: %.500s", adventure.id, response.text
+        )
+        client.discard_cached(response)
     if payload is not None:
-        _apply_card_updates(adventure, payload)
-        adventure.rollback_min_history_id = cutoff_entry.id
-        adventure.save(update_fields=["rollback_min_history_id"])
-        return history_entries[-max_posts:]
+        with timer.phase("card_update_apply"):
+            _apply_card_updates(adventure, payload)
+            adventure.rollback_min_history_id = cutoff_entry.id
+            adventure.save(update_fields=["rollback_min_history_id"])
+        return history_entries[start:], context
 
-    return history_entries[-max_posts:]
+    return history_entries[start:], context
 
 
 def _set_ai_waiting(adventure_id: int, waiting: bool) -> None:
@@ -0,0 +1,161 @@
+"""Per-turn phase timings and LLM usage metrics for AI views."""
+from __future__ import annotations
+
+from contextlib import contextmanager
+import time
+from typing import Optional
+
+from backend import metrics
+from backend.llm import (
+    LLMClient,
+    LLMResponse,
+    get_llm_cache_stats,
+    get_llm_provider_stats,
+    get_prefix_cache_stats,
+)
+
+# Every phase a turn may time, in the order they run; also the bounded label set
+# of `adventure_turn_phase_seconds`.
+TURN_PHASES = (
+    "lock",
+    "history_load",
+    "card_update_prompt",
+    "card_update_llm",
+    "card_update_apply",
+    "generation_prompt",
+    "generation_llm",
+    "persist",
+)
+
+TURN_SECONDS = metrics.histogram(
+    "adventure_turn_seconds", "Wall time of an AI turn request.", ("view", "outcome")
+)
+TURN_PHASE_SECONDS = metrics.histogram(
+    "adventure_turn_phase_seconds", "Wall time of one phase of an AI turn.", ("view", "phase")
+)
+LLM_REQUEST_SECONDS = metrics.histogram(
+    "llm_request_seconds", "Latency of LLM calls as seen by the views.", ("provider", "purpose")
+)
+LLM_QUEUE_SECONDS = metrics.histogram(
+    "llm_queue_wait_seconds", "Time spent waiting for a concurrency slot.", ("provider", "purpose")
+)
+LLM_TOKENS = metrics.counter(
+    "llm_tokens_total", "Prompt and completion tokens of LLM calls.", ("provider", "purpose", "type")
+)
+LLM_REQUESTS = metrics.counter(
+    "llm_requests_total", "LLM calls by provider, purpose and cache outcome.", ("provider", "purpose", "cache")
+)
+
+
+def _counter_name(name: str, kind: str) -> str:
+    return f"{name}_total" if kind == "counter" else name
+
+
+def _collect_llm_stats():
+    for name, value in get_llm_cache_stats().items():
+        kind = "gauge" if name in ("size", "capacity") else "counter"
+        yield (_counter_name("llm_response_cache_" + name, kind), kind, f"LLM response cache {name}.", {}, value)
+    for provider, stats in get_prefix_cache_stats().items():
+        for name, value in stats.items():
+            kind = "gauge" if name.endswith("_rate") else "counter"
+            yield (
+                _counter_name("llm_prefix_" + name, kind),
+                kind,
+                f"Prompt prefix cache {name}.",
+                {"provider": provider},
+                value,
+            )
+    for provider, stats in get_llm_provider_stats().items():
+        yield (
+            "llm_provider_breaker_open",
+            "gauge",
+            "1 if the provider circuit breaker is open.",
+            {"provider": provider},
+            1 if stats["state"] == "open" else 0,
+        )
+        for name in ("calls", "failures", "hedges"):
+            yield (
+                f"llm_provider_{name}_total",
+                "counter",
+                f"Failover provider {name}.",
+                {"provider": provider},
+                stats[name],
+            )
+
+
+metrics.register_collector(_collect_llm_stats)
+
+
+class TurnTimer:
+    """Collects phase durations of one AI turn; phases may repeat and accumulate.
+
+    Phase names must come from `TURN_PHASES`.
+    """
+
+    def __init__(self, view: str) -> None:
+        self.view = view
+        self.started = time.perf_counter()
+        self.timings: dict[str, float] = {}
+
+    @contextmanager
+    def phase(self, name: str):
+        if name not in TURN_PHASES:
+            raise LookupError(f"Unknown turn phase: {name}")
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - started
+
+    def timings_ms(self) -> dict[str, int]:
+        return {
+            name: round(self.timings[name] * 1000) for name in TURN_PHASES if name in self.timings
+        }
+
+    def finish(self, outcome: str) -> None:
+        for name, seconds in self.timings.items():
+            TURN_PHASE_SECONDS.observe(seconds, view=self.view, phase=name)
+        TURN_SECONDS.observe(time.perf_counter() - self.started, view=self.view, outcome=outcome)
+
+
+def _record_llm_usage(
+    client: LLMClient,
+    purpose: str,
+    prompt: str,
+    system: Optional[str],
+    response: LLMResponse,
+    seconds: float,
+) -> dict:
+    """Observe metrics for one call and return its usage for history metadata.
+
+    Token counts reported by the provider are preferred; otherwise they are
+    estimated with the client's tokenizer.
+    """
+    prompt_tokens = response.prompt_tokens
+    if prompt_tokens is None:
+        prompt_tokens = client.count_tokens(prompt) + (client.count_tokens(system) if system else 0)
+    completion_tokens = response.completion_tokens
+    if completion_tokens is None:
+        completion_tokens = client.count_tokens(response.text)
+    provider = response.provider or client.provider_name
+    cache = "hit" if response.cache_hit else "miss"
+    LLM_REQUESTS.inc(provider=provider, purpose=purpose, cache=cache)
+    LLM_TOKENS.inc(prompt_tokens, provider=provider, purpose=purpose, type="prompt")
+    LLM_TOKENS.inc(completion_tokens, provider=provider, purpose=purpose, type="completion")
+    if response.cached_tokens:
+        LLM_TOKENS.inc(response.cached_tokens, provider=provider, purpose=purpose, type="cached")
+    if not response.cache_hit:
+        LLM_REQUEST_SECONDS.observe(seconds, provider=provider, purpose=purpose)
+    if response.queue_wait_ms is not None:
+        LLM_QUEUE_SECONDS.observe(response.queue_wait_ms / 1000, provider=provider, purpose=purpose)
+    usage = {
+        "provider": provider,
+        "prefix": response.prefix_hash,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "cached_tokens": response.cached_tokens,
+        "cache_hit": response.cache_hit or None,
+        "queue_wait_ms": response.queue_wait_ms,
+        "latency_ms": round(seconds * 1000),
+    }
+    return {key: value for key, value in usage.items() if value not in (None, "")}
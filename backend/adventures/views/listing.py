@@ -0,0 +1,97 @@
+"""Opt-in pagination, filtering and field selection for list endpoints.
+
+Without query parameters the lists keep returning plain arrays, so existing
+clients are unaffected:
+
+- `?limit=` or `?cursor=` switch to keyset pages `{"next", "previous", "results"}`;
+- `?tags=a,b` matches any of the tags, `?tags_all=a,b` all of them (GIN indexes);
+- `?updated_since=<ISO datetime>` returns cards changed at or after the moment;
+- `?fields=id,title` trims every item to the listed fields.
+"""
+from __future__ import annotations
+
+from django.core.exceptions import FieldDoesNotExist
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+from rest_framework.pagination import CursorPagination
+
+MAX_FILTER_TAGS = 50
+
+
+def _split_param(request, name: str) -> list[str]:
+    values = []
+    for raw in request.query_params.getlist(name):
+        values.extend(value.strip() for value in raw.split(",") if value.strip())
+    return values
+
+
+def _has_field(model, name: str) -> bool:
+    try:
+        model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return False
+    return True
+
+
+class KeysetPagination(CursorPagination):
+    """Cursor pagination over the view's `keyset_ordering`, only when asked for."""
+
+    ordering = "id"
+    page_size = 100
+    page_size_query_param = "limit"
+    max_page_size = 1000
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        if self.page_size_query_param not in params and self.cursor_query_param not in params:
+            return None
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_ordering(self, request, queryset, view):
+        ordering = getattr(view, "keyset_ordering", self.ordering)
+        return (ordering,) if isinstance(ordering, str) else tuple(ordering)
+
+
+class CardFilterBackend(BaseFilterBackend):
+    """`tags`, `tags_all` and `updated_since` filters for models that have the fields."""
+
+    def filter_queryset(self, request, queryset, view):
+        model = queryset.model
+        if _has_field(model, "tags"):
+            tags = _split_param(request, "tags")[:MAX_FILTER_TAGS]
+            if tags:
+                queryset = queryset.filter(tags__overlap=tags)
+            tags_all = _split_param(request, "tags_all")[:MAX_FILTER_TAGS]
+            if tags_all:
+                queryset = queryset.filter(tags__contains=tags_all)
+        updated_since = request.query_params.get("updated_since")
+        if updated_since and _has_field(model, "updated_at"):
+            try:
+                moment = parse_datetime(updated_since)
+            except ValueError:
+                moment = None
+            if moment is None:
+                raise ValidationError({"updated_since": "Expected an ISO 8601 datetime."})
+            if timezone.is_naive(moment):
+                moment = timezone.make_aware(moment)
+            queryset = queryset.filter(updated_at__gte=moment)
+        return queryset
+
+
+class ListQueryMixin:
+    """Pagination, filters and `?fields=` for a generic list view."""
+
+    pagination_class = KeysetPagination
+    filter_backends = [CardFilterBackend]
+    keyset_ordering = "id"
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        fields = _split_param(self.request, "fields") if self.request.method == "GET" else []
+        if fields:
+            target = getattr(serializer, "child", serializer)
+            for name in set(target.fields) - set(fields):
+                target.fields.pop(name)
+        return serializer
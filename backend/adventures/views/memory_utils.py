@@ -0,0 +1,179 @@
+"""Rolling history summaries stored as adventure memories.
+
+Summaries are written off the request thread: a turn only schedules
+`_summarize_evicted_history` after it commits, and prompts use whatever summaries
+already exist until the background call finishes.
+"""
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import os
+import threading
+import time
+from typing import Optional
+
+from django.db import connection, connections, transaction
+from django.db.models import Max
+
+from backend.llm import PRIORITY_BACKGROUND, LLMClient, get_llm_client
+
+from ..models import Adventure, AdventureHistory, AdventureMemory
+from .instrumentation import _record_llm_usage
+from .prompts import _build_summary_prompt, _format_history_entry, _get_memory_limits
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_IMPORTANCE = {
+    AdventureMemory.Level.CHUNK: 10,
+    AdventureMemory.Level.CHAPTER: 20,
+    AdventureMemory.Level.SAGA: 30,
+}
+
+
+def _summarize(
+    adventure: Adventure, client: LLMClient, parts: list[str], level: int, max_tokens: int
+) -> str:
+    prompt = _build_summary_prompt(parts, level)
+    started = time.perf_counter()
+    response = client.generate(
+        prompt=prompt,
+        max_tokens=max_tokens,
+        priority=PRIORITY_BACKGROUND,
+        user_id=adventure.player_user_id,
+        use_cache=True,
+    )
+    _record_llm_usage(client, "summary", prompt, None, response, time.perf_counter() - started)
+    return response.text.strip()
+
+
+def _merge_summaries(adventure: Adventure, client: LLMClient, level: int, fanout: int) -> None:
+    children = list(
+        AdventureMemory.objects.filter(
+            adventure=adventure, kind=AdventureMemory.Kind.SUMMARY, level=level
+        ).order_by("history_start_id", "id")
+    )
+    if len(children) < fanout:
+        return
+    parent_level = level + 1
+    if parent_level == AdventureMemory.Level.SAGA:
+        # The saga is a single running summary: fold the existing one in first.
+        children = (
+            list(
+                AdventureMemory.objects.filter(
+                    adventure=adventure,
+                    kind=AdventureMemory.Kind.SUMMARY,
+                    level=AdventureMemory.Level.SAGA,
+                )
+            )
+            + children
+        )
+    _, _, _, max_tokens = _get_memory_limits()
+    content = _summarize(
+        adventure, client, [child.content for child in children], parent_level, max_tokens
+    )
+    if not content:
+        return
+    with transaction.atomic():
+        AdventureMemory.objects.create(
+            adventure=adventure,
+            kind=AdventureMemory.Kind.SUMMARY,
+            level=parent_level,
+            title=AdventureMemory.Level(parent_level).label,
+            content=content,
+            importance=SUMMARY_IMPORTANCE[parent_level],
+            history_start_id=min(child.history_start_id or 0 for child in children),
+            history_end_id=max(child.history_end_id or 0 for child in children),
+        )
+        AdventureMemory.objects.filter(id__in=[child.id for child in children]).delete()
+
+
+def _summarize_evicted_history(adventure: Adventure, client: LLMClient) -> bool:
+    """Condense one chunk of history that can no longer be rolled back, then merge upwards.
+
+    Only entries below `rollback_min_history_id` are summarised, so a summary never
+    describes posts that a rollback could still delete. Returns whether a chunk was
+    summarised.
+    """
+    boundary = adventure.rollback_min_history_id
+    if not boundary:
+        return False
+    chunk_posts, fanout, _, max_tokens = _get_memory_limits()
+    summarized_until = (
+        AdventureMemory.objects.filter(
+            adventure=adventure, kind=AdventureMemory.Kind.SUMMARY
+        ).aggregate(end=Max("history_end_id"))["end"]
+        or 0
+    )
+    chunk = list(
+        AdventureHistory.objects.filter(
+            adventure=adventure, id__gt=summarized_until, id__lt=boundary
+        ).order_by("id")[:chunk_posts]
+    )
+    if len(chunk) < chunk_posts:
+        return False
+    content = _summarize(
+        adventure,
+        client,
+        [_format_history_entry(entry) for entry in chunk],
+        AdventureMemory.Level.CHUNK,
+        max_tokens,
+    )
+    if not content:
+        return False
+    AdventureMemory.objects.create(
+        adventure=adventure,
+        kind=AdventureMemory.Kind.SUMMARY,
+        level=AdventureMemory.Level.CHUNK,
+        title=AdventureMemory.Level.CHUNK.label,
+        content=content,
+        importance=SUMMARY_IMPORTANCE[AdventureMemory.Level.CHUNK],
+        history_start_id=chunk[0].id,
+        history_end_id=chunk[-1].id,
+    )
+    _merge_summaries(adventure, client, AdventureMemory.Level.CHUNK, fanout)
+    _merge_summaries(adventure, client, AdventureMemory.Level.CHAPTER, fanout)
+    return True
+
+
+_summary_executor: Optional[ThreadPoolExecutor] = None
+_summary_executor_lock = threading.Lock()
+
+
+def _get_summary_executor() -> ThreadPoolExecutor:
+    global _summary_executor
+    with _summary_executor_lock:
+        if _summary_executor is None:
+            workers = max(1, int(os.getenv("MEMORY_SUMMARY_WORKERS", "1")))
+            _summary_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="memory-summary")
+        return _summary_executor
+
+
+def _run_history_summaries(adventure_id: int) -> None:
+    """Summarise every chunk that is ready; one worker per adventure across processes."""
+    lock_key = f"memory-summary:{adventure_id}"
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_try_advisory_lock(hashtext(%s))", [lock_key])
+            locked = cursor.fetchone()[0]
+        if not locked:
+            return
+        try:
+            adventure = Adventure.objects.filter(id=adventure_id).first()
+            if adventure is not None:
+                client = get_llm_client()
+                while _summarize_evicted_history(adventure, client):
+                    pass
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_unlock(hashtext(%s))", [lock_key])
+    except Exception:
+        logger.exception("History summary failed for adventure %s", adventure_id)
+    finally:
+        # Runs on a pool thread: drop the connections it opened.
+        connections.close_all()
+
+
+def schedule_history_summaries(adventure_id: int) -> None:
+    """Summarise evicted history in the background once the current transaction commits."""
+    transaction.on_commit(lambda: _get_summary_executor().submit(_run_history_summaries, adventure_id))
@@ -1,18 +1,39 @@
 """Views for adventure moderation workflow."""
 from __future__ import annotations
 
+import hashlib
+import os
+
+from django.db.models import Count, Max
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags, quote_etag
 from rest_framework import generics, permissions, status
 from rest_framework.exceptions import PermissionDenied, ValidationError
 from rest_framework.response import Response
 
-from ..models import Adventure, ModerationEntry, PublishedAdventure
-from ..serializers import ModerationEntrySerializer, PublishedAdventureSerializer
+from .listing import ListQueryMixin
+from ..catalog import refresh_catalog
+from ..models import Adventure, ModerationEntry, PublishedAdventure, PublishedCatalogEntry
+from ..serializers import ModerationEntrySerializer, PublishedCatalogEntrySerializer
 from ..utils import is_moderator
 
+# `?sort=` of the catalog -> keyset ordering; all but `title` follow an index.
+CATALOG_SORTS = {
+    "published": ("-published_at", "-adventure_id"),
+    "popular": ("-runs_count", "-published_at", "-adventure_id"),
+    "activity": ("-last_activity_at", "-adventure_id"),
+    "title": ("title", "adventure_id"),
+}
+
+
+def _get_catalog_cache_seconds() -> int:
+    return max(0, int(os.getenv("CATALOG_CACHE_SECONDS", "0")))
+
 
 class ModerationQueueListView(generics.ListAPIView):
     serializer_class = ModerationEntrySerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = 3
 
     def get_queryset(self):
         if not is_moderator(self.request.user):
@@ -23,15 +44,44 @@ class ModerationQueueListView(generics.ListAPIView):
         )
 
 
-class PublishedAdventureListView(generics.ListAPIView):
-    serializer_class = PublishedAdventureSerializer
+class PublishedAdventureListView(ListQueryMixin, generics.ListAPIView):
+    """Public catalog served from `PublishedCatalogEntry` without joins or counting.
+
+    Responses carry an ETag of the catalog state, so a client revalidating an
+    unchanged page gets `304 Not Modified` after one aggregate query.
+    """
+
+    serializer_class = PublishedCatalogEntrySerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = 3
+
+    def _sort(self) -> str:
+        sort = self.request.query_params.get("sort", "published")
+        if sort not in CATALOG_SORTS:
+            raise ValidationError({"sort": f"Expected one of: {', '.join(CATALOG_SORTS)}."})
+        return sort
+
+    @property
+    def keyset_ordering(self):
+        return CATALOG_SORTS[self._sort()]
 
     def get_queryset(self):
-        return (
-            PublishedAdventure.objects.select_related("adventure", "adventure__author_user")
-            .order_by("-published_at")
-        )
+        return PublishedCatalogEntry.objects.order_by(*CATALOG_SORTS[self._sort()])
+
+    def _cache(self, response, etag: str):
+        response["ETag"] = etag
+        patch_cache_control(response, private=True, max_age=_get_catalog_cache_seconds())
+        patch_vary_headers(response, ["Authorization"])
+        return response
+
+    def list(self, request, *args, **kwargs):
+        self._sort()
+        state = PublishedCatalogEntry.objects.aggregate(changed=Max("updated_at"), total=Count("*"))
+        version = f"{state['changed']}:{state['total']}:{request.get_full_path()}"
+        etag = quote_etag(hashlib.md5(version.encode()).hexdigest())
+        if etag in parse_etags(request.headers.get("If-None-Match", "")):
+            return self._cache(Response(status=status.HTTP_304_NOT_MODIFIED), etag)
+        return self._cache(super().list(request, *args, **kwargs), etag)
 
 
 class AdventureSubmitForModerationView(generics.CreateAPIView):
@@ -74,6 +124,7 @@ class ModerationDecisionView(generics.GenericAPIView):
             if PublishedAdventure.objects.filter(adventure=entry.adventure).exists():
                 raise ValidationError("Приключение уже опубликовано.")
             PublishedAdventure.objects.create(adventure=entry.adventure)
+            refresh_catalog([entry.adventure_id])
         elif decision != "reject":
             raise ValidationError("Неизвестное действие модерации.")
         entry.delete()
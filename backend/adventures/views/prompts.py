@@ -3,29 +3,30 @@ from __future__ import annotations
 
 import json
 import os
+from typing import Optional
 
 from ..models import (
     Adventure,
     AdventureEvent,
     AdventureHistory,
+    AdventureMemory,
     Character,
     CharacterSystem,
     CharacterTechnique,
     SkillSystem,
     Technique,
 )
+from .retrieval import _retrieve_related_cards
 
 
 def _get_history_limits() -> tuple[int, int]:
-    max_posts = int(os.getenv("HISTORY_MAX_PROMPT_POSTS", "40"))
+    token_budget = int(os.getenv("PROMPT_TOKEN_BUDGET", "4000"))
     tail_posts = int(os.getenv("HISTORY_TAIL_UPDATE_POSTS", "10"))
     if tail_posts < 0:
         tail_posts = 0
-    if max_posts < 1:
-        max_posts = 1
-    if tail_posts > max_posts:
-        tail_posts = max_posts
-    return max_posts, tail_posts
+    if token_budget < 500:
+        token_budget = 500
+    return token_budget, tail_posts
 
 
 def _get_update_token_limits() -> tuple[int, int]:
@@ -38,14 +39,89 @@ def _get_update_token_limits() -> tuple[int, int]:
     return max_tokens, strict_tokens
 
 
+def _get_memory_limits() -> tuple[int, int, int, int]:
+    chunk_posts = int(os.getenv("MEMORY_CHUNK_POSTS", "20"))
+    merge_fanout = int(os.getenv("MEMORY_MERGE_FANOUT", "4"))
+    prompt_limit = int(os.getenv("MEMORY_PROMPT_LIMIT", "8"))
+    max_tokens = int(os.getenv("MEMORY_SUMMARY_MAX_TOKENS", "400"))
+    if chunk_posts < 1:
+        chunk_posts = 1
+    if merge_fanout < 2:
+        merge_fanout = 2
+    if prompt_limit < 0:
+        prompt_limit = 0
+    if max_tokens < 100:
+        max_tokens = 100
+    return chunk_posts, merge_fanout, prompt_limit, max_tokens
+
+
+def _truncate(text: str, limit: int = 300) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[: limit - 1].rstrip() + "…"
+
+
+def _format_history_entry(entry: AdventureHistory) -> str:
+    return f"{entry.role}: {entry.content}"
+
+
+def _build_generation_instructions(word_limit: str = "40-50") -> str:
+    return (
+        "Сгенерируй следующий абзац истории, логично продолжая сюжет. "
+        "Не повторяй и не пересказывай события, уже записанные в истории промтов. "
+        f"Ответ должен быть примерно на {word_limit} слов."
+    )
+
+
+def _build_generation_system_prompt(adventure: Adventure, word_limit: str = "40-50") -> str:
+    """Stable part of the generation prompt, identical from turn to turn.
+
+    It holds only the fixed rules and the adventure description, so providers can
+    serve it from their prefix (KV) cache. World content, the hero included, goes to
+    the relevance-scaled context in the user prompt.
+    """
+    parts = [f"Ты ведешь текстовое приключение «{adventure.title}»."]
+    if adventure.description:
+        parts.append(adventure.description)
+    if adventure.spec_instructions:
+        parts.append(f"Особые указания: {adventure.spec_instructions}")
+    parts.extend(
+        [
+            "Важно: уровень владения системой повышает эффективность по геометрической прогрессии. "
+            "То же относится к рангам/кругам приемов.",
+            _build_generation_instructions(word_limit),
+        ]
+    )
+    return "\n".join(parts)
+
+
 def _build_generation_prompt(
     adventure: Adventure,
     history_entries: list[AdventureHistory],
     word_limit: str = "40-50",
-) -> str:
-    history_text = "\n".join(f"{entry.role}: {entry.content}" for entry in history_entries)
+    context: Optional[str] = None,
+) -> tuple[str, str]:
+    """Return `(system, prompt)`: the cacheable prefix and the per-turn suffix.
+
+    History goes before the current state because it only grows at the end between
+    evictions, which keeps the longest possible prefix byte-identical across turns.
+    `context` is the already built current state, if the caller has it.
+    """
+    if context is None:
+        context = _build_generation_context(adventure, history_entries)
+    history_text = "\n".join(_format_history_entry(entry) for entry in history_entries)
     if not history_text:
         history_text = "История пока пуста."
+    prompt = (
+        f"История:\n{history_text}\n\n"
+        f"Текущее состояние:\n{context}"
+    )
+    return _build_generation_system_prompt(adventure, word_limit), prompt
+
+
+def _build_generation_context(
+    adventure: Adventure,
+    history_entries: list[AdventureHistory],
+) -> str:
     primary_hero = adventure.primary_hero
     hero_text = f"Главный герой: {primary_hero.title}." if primary_hero else "Главный герой не задан."
     current_location = primary_hero.location if primary_hero else None
@@ -55,23 +131,37 @@ def _build_generation_prompt(
         if current_location.description:
             location_text += f" {current_location.description}"
 
-    party_characters = Character.objects.filter(adventure=adventure, in_party=True).order_by(
-        "title"
+    party_characters = list(
+        Character.objects.filter(adventure=adventure, in_party=True)
+        .select_related("race")
+        .order_by("title")
     )
-    systems = SkillSystem.objects.filter(adventure=adventure).order_by("title")
-    system_map = {system.id: system for system in systems}
-    techniques = Technique.objects.filter(system__adventure=adventure).order_by("title")
-    technique_map = {technique.id: technique for technique in techniques}
+    location_characters = []
+    if current_location:
+        location_characters = list(
+            Character.objects.filter(adventure=adventure, location=current_location)
+            .select_related("race")
+            .order_by("title")
+        )
+    related = _retrieve_related_cards(adventure, history_entries)
+    character_ids = {character.id for character in party_characters + location_characters}
     character_systems = {}
-    for entry in CharacterSystem.objects.filter(character__adventure=adventure):
+    for entry in CharacterSystem.objects.filter(adventure=adventure, character_id__in=character_ids):
         character_systems.setdefault(entry.character_id, []).append(entry)
     character_techniques = {}
-    for entry in CharacterTechnique.objects.filter(character__adventure=adventure):
+    for entry in CharacterTechnique.objects.filter(adventure=adventure, character_id__in=character_ids):
         character_techniques.setdefault(entry.character_id, []).append(entry)
 
-    available_systems_text = "Доступные системы: " + (
-        ", ".join(system.title for system in systems) if systems else "—"
-    )
+    system_ids = {system.id for system in related["system"]}
+    for entries in character_systems.values():
+        system_ids.update(entry.system_id for entry in entries)
+    systems = SkillSystem.objects.filter(adventure=adventure, id__in=system_ids).order_by("title")
+    system_map = {system.id: system for system in systems}
+    technique_ids = {technique.id for technique in related["technique"]}
+    for entries in character_techniques.values():
+        technique_ids.update(entry.technique_id for entry in entries)
+    techniques = Technique.objects.filter(adventure=adventure, id__in=technique_ids).order_by("title")
+    technique_map = {technique.id: technique for technique in techniques}
 
     party_techniques = []
     for character in party_characters:
@@ -119,13 +209,6 @@ def _build_generation_prompt(
         else "Герои партии отсутствуют."
     )
 
-    location_characters = []
-    if current_location:
-        location_characters = list(
-            Character.objects.filter(adventure=adventure, location=current_location).order_by(
-                "title"
-            )
-        )
     location_lines = []
     for character in location_characters:
         parts = [
@@ -178,27 +261,135 @@ def _build_generation_prompt(
     else:
         events_text = "Активные события отсутствуют."
 
-    rules_text = (
-        "Важно: уровень владения системой повышает эффективность по геометрической прогрессии. "
-        "То же относится к рангам/кругам приемов."
+    _, _, memory_limit, _ = _get_memory_limits()
+    memories = sorted(
+        AdventureMemory.objects.filter(adventure=adventure).order_by("-importance", "-id")[
+            :memory_limit
+        ],
+        key=lambda memory: (memory.history_start_id or 0, memory.id),
+    )
+    memory_labels = {
+        AdventureMemory.Kind.SUMMARY: "Ранее",
+        AdventureMemory.Kind.FACT: "Факт",
+        AdventureMemory.Kind.RULE: "Правило",
+        AdventureMemory.Kind.GOAL: "Цель",
+    }
+    memories_text = (
+        "Память о прошлом:\n"
+        + "\n".join(
+            f"{memory_labels.get(memory.kind, memory.kind)}: {memory.content}" for memory in memories
+        )
+        if memories
+        else "Память о прошлом пуста."
+    )
+
+    card_labels = {
+        "location": "Локация",
+        "race": "Раса",
+        "character": "Персонаж",
+        "faction": "Фракция",
+        "other_info": "Справка",
+        "system": "Система",
+        "technique": "Прием",
+        "memory": "Память",
+    }
+    shown = {("character", character_id) for character_id in character_ids}
+    shown.update(("memory", memory.id) for memory in memories)
+    if current_location:
+        shown.add(("location", current_location.id))
+    related_lines = []
+    for kind, cards in related.items():
+        for card in cards:
+            if (kind, card.id) in shown:
+                continue
+            text = card.content if kind == "memory" else card.description
+            line = f"{card_labels[kind]} «{card.title}»" if card.title else card_labels[kind]
+            if text:
+                line += f": {_truncate(text)}"
+            related_lines.append(line)
+    related_text = (
+        "Связанные карточки:\n" + "\n".join(related_lines)
+        if related_lines
+        else "Связанные карточки отсутствуют."
     )
 
     return (
-        f"{hero_text}\n{rules_text}\n{location_text}\n{available_systems_text}\n"
-        f"{party_techniques_text}\n{heroes_text}\n{location_characters_text}\n{events_text}\n\n"
-        f"{history_text}\n\n"
-        "Сгенерируй следующий абзац истории, логично продолжая сюжет. "
-        "Не повторяй и не пересказывай события, уже записанные в истории промтов. "
-        f"Ответ должен быть примерно на {word_limit} слов."
+        f"{memories_text}\n{hero_text}\n{location_text}\n{party_techniques_text}\n{heroes_text}\n"
+        f"{location_characters_text}\n{events_text}\n{related_text}"
+    )
+
+
+def _build_summary_prompt(
+    parts: list[str],
+    level: int,
+) -> str:
+    source_text = "\n".join(parts) or "—"
+    if level == AdventureMemory.Level.CHUNK:
+        task = "Сожми фрагмент истории приключения в краткий пересказ (3-5 предложений)."
+    elif level == AdventureMemory.Level.CHAPTER:
+        task = "Объедини пересказы последовательных фрагментов в краткое содержание главы (4-6 предложений)."
+    else:
+        task = "Объедини краткие содержания глав в общий сюжет приключения (5-8 предложений)."
+    return (
+        f"{task}\n"
+        "Сохрани имена, места, полученные предметы и навыки, незакрытые цели и обещания. "
+        "Пиши в прошедшем времени, без оценок и без markdown. Верни только текст пересказа.\n\n"
+        f"{source_text}"
     )
 
 
+def _schema_array(properties: dict) -> dict:
+    return {
+        "type": "array",
+        "items": {"type": "object", "properties": properties, "required": ["id"]},
+    }
+
+
+# Native structured-output schema for the card update response (see `_build_card_update_prompt`).
+CARD_UPDATE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "events": _schema_array(
+            {
+                "id": {"type": "integer"},
+                "status": {"type": "string", "enum": ["active", "resolved", "inactive"]},
+                "state": {"type": "string"},
+            }
+        ),
+        "characters": _schema_array(
+            {
+                "id": {"type": "integer"},
+                "description": {"type": "string"},
+                "body_power": {"type": "integer"},
+                "body_power_progress": {"type": "integer"},
+                "mind_power": {"type": "integer"},
+                "mind_power_progress": {"type": "integer"},
+                "will_power": {"type": "integer"},
+                "will_power_progress": {"type": "integer"},
+            }
+        ),
+        "character_systems": _schema_array(
+            {
+                "id": {"type": "integer"},
+                "level": {"type": "integer"},
+                "progress_percent": {"type": "integer"},
+                "notes": {"type": "string"},
+            }
+        ),
+        "character_techniques": _schema_array(
+            {"id": {"type": "integer"}, "notes": {"type": "string"}}
+        ),
+    },
+    "required": ["events", "characters", "character_systems", "character_techniques"],
+}
+
+
 def _build_card_update_prompt(
     adventure: Adventure,
     tail_entries: list[AdventureHistory],
     strict_json: bool = False,
 ) -> str:
-    tail_text = "\n".join(f"{entry.role}: {entry.content}" for entry in tail_entries)
+    tail_text = "\n".join(_format_history_entry(entry) for entry in tail_entries)
     if not tail_text:
         tail_text = "История пока пуста."
 
@@ -207,59 +398,63 @@ def _build_card_update_prompt(
         .order_by("title")
         .values("id", "title", "state", "status")
     )
-    party_characters = Character.objects.filter(adventure=adventure, in_party=True).order_by(
-        "title"
+    related = _retrieve_related_cards(adventure, tail_entries)
+    character_fields = (
+        "id",
+        "title",
+        "description",
+        "body_power",
+        "body_power_progress",
+        "mind_power",
+        "mind_power_progress",
+        "will_power",
+        "will_power_progress",
     )
-    party_character_ids = [character.id for character in party_characters]
-    systems = list(
-        SkillSystem.objects.filter(adventure=adventure)
+    party_characters = list(
+        Character.objects.filter(adventure=adventure, in_party=True)
         .order_by("title")
-        .values("id", "title", "description", "tags", "w_body", "w_mind", "w_will", "formula_hint")
-    )
-    techniques = list(
-        Technique.objects.filter(system__adventure=adventure)
-        .order_by("title")
-        .values(
-            "id",
-            "title",
-            "description",
-            "tags",
-            "difficulty",
-            "tier",
-            "required_system_level",
-            "system_id",
-        )
+        .values(*character_fields)
     )
+    party_character_ids = [character["id"] for character in party_characters]
+    related_characters = [
+        {field: getattr(character, field) for field in character_fields}
+        for character in related["character"]
+        if character.id not in party_character_ids
+    ]
     character_systems = list(
-        CharacterSystem.objects.filter(
-            character__adventure=adventure, character_id__in=party_character_ids
-        )
+        CharacterSystem.objects.filter(adventure=adventure, character_id__in=party_character_ids)
         .order_by("id")
         .values("id", "character_id", "system_id", "level", "progress_percent", "notes")
     )
     character_techniques = list(
-        CharacterTechnique.objects.filter(character__adventure=adventure, character_id__in=party_character_ids)
+        CharacterTechnique.objects.filter(adventure=adventure, character_id__in=party_character_ids)
         .order_by("id")
         .values("id", "character_id", "technique_id", "notes")
     )
-
-    party_characters = list(
-        Character.objects.filter(adventure=adventure, in_party=True)
+    system_ids = {entry["system_id"] for entry in character_systems}
+    system_ids.update(system.id for system in related["system"])
+    technique_ids = {entry["technique_id"] for entry in character_techniques}
+    technique_ids.update(technique.id for technique in related["technique"])
+    systems = list(
+        SkillSystem.objects.filter(adventure=adventure, id__in=system_ids)
+        .order_by("title")
+        .values("id", "title", "description", "tags", "w_body", "w_mind", "w_will", "formula_hint")
+    )
+    techniques = list(
+        Technique.objects.filter(adventure=adventure, id__in=technique_ids)
         .order_by("title")
         .values(
             "id",
             "title",
             "description",
-            "body_power",
-            "body_power_progress",
-            "mind_power",
-            "mind_power_progress",
-            "will_power",
-            "will_power_progress",
+            "tags",
+            "difficulty",
+            "tier",
+            "required_system_level",
+            "system_id",
         )
     )
 
-    # TODO: также обновить карточки, которые затронуты тэгами, когда связывание по тэгам будет реализовано
     rules_prefix = (
         "Верни только JSON, без пояснений и без markdown. "
         if strict_json
@@ -288,6 +483,7 @@ def _build_card_update_prompt(
         f"Доступные системы: {json.dumps(systems, ensure_ascii=False)}\n"
         f"Доступные приемы: {json.dumps(techniques, ensure_ascii=False)}\n"
         f"Карточки партии: {json.dumps(party_characters, ensure_ascii=False)}\n"
+        f"Упомянутые персонажи: {json.dumps(related_characters, ensure_ascii=False)}\n"
         f"Знания систем партии: {json.dumps(character_systems, ensure_ascii=False)}\n"
         f"Выученные приемы партии: {json.dumps(character_techniques, ensure_ascii=False)}\n"
     )
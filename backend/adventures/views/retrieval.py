@@ -0,0 +1,105 @@
+"""Retrieval of world cards mentioned in recent history."""
+from __future__ import annotations
+
+import os
+import re
+
+from django.db.models import Q
+
+from ..models import (
+    Adventure,
+    AdventureHistory,
+    AdventureMemory,
+    Character,
+    Faction,
+    Location,
+    OtherInfo,
+    Race,
+    SkillSystem,
+    Technique,
+)
+from .embedding_index import search_embedding_index
+
+RETRIEVAL_MODELS = (
+    ("location", Location),
+    ("race", Race),
+    ("character", Character),
+    ("faction", Faction),
+    ("other_info", OtherInfo),
+    ("system", SkillSystem),
+    ("technique", Technique),
+    ("memory", AdventureMemory),
+)
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def _get_retrieval_limits() -> tuple[int, int]:
+    history_posts = int(os.getenv("RETRIEVAL_HISTORY_POSTS", "6"))
+    per_kind = int(os.getenv("RETRIEVAL_CARDS_PER_KIND", "5"))
+    if history_posts < 1:
+        history_posts = 1
+    if per_kind < 0:
+        per_kind = 0
+    return history_posts, per_kind
+
+
+def _extract_history_terms(history_entries: list[AdventureHistory], max_ngram: int = 3) -> list[str]:
+    """Words and short phrases of the entries, as written and lowercased, for tag/title lookup."""
+    terms = set()
+    for entry in history_entries:
+        words = [word for word in _WORD_RE.findall(entry.content or "") if not word.isdigit()]
+        for size in range(1, max_ngram + 1):
+            for index in range(len(words) - size + 1):
+                phrase = " ".join(words[index : index + size])
+                if size == 1 and len(phrase) < 3:
+                    continue
+                terms.add(phrase)
+                terms.add(phrase.lower())
+    return sorted(terms)
+
+
+def _retrieve_related_cards(
+    adventure: Adventure,
+    history_entries: list[AdventureHistory],
+) -> dict[str, list]:
+    """Cards whose tags overlap (`tags && ARRAY[...]`) or whose title is mentioned in recent posts.
+
+    With the embedding index enabled, semantically close cards are added on top of
+    the exact matches, within the same per-kind cap.
+    """
+    history_posts, per_kind = _get_retrieval_limits()
+    recent_entries = history_entries[-history_posts:]
+    terms = _extract_history_terms(recent_entries)
+    related = {kind: [] for kind, _ in RETRIEVAL_MODELS}
+    if per_kind == 0:
+        return related
+    _add_semantic_matches(adventure, recent_entries, related, per_kind)
+    if not terms:
+        return related
+    for kind, model in RETRIEVAL_MODELS:
+        queryset = model.objects.filter(adventure=adventure)
+        match = Q(tags__overlap=terms)
+        if model is not AdventureMemory:
+            match |= Q(title__in=terms)
+        semantic = related[kind]
+        exact = list(queryset.filter(match).order_by("-updated_at", "id")[:per_kind])
+        exact_ids = {card.id for card in exact}
+        related[kind] = (exact + [card for card in semantic if card.id not in exact_ids])[:per_kind]
+    return related
+
+
+def _add_semantic_matches(
+    adventure: Adventure,
+    history_entries: list[AdventureHistory],
+    related: dict[str, list],
+    per_kind: int,
+) -> None:
+    hits = search_embedding_index(
+        adventure, "\n".join(entry.content or "" for entry in history_entries)
+    )
+    models = dict(RETRIEVAL_MODELS)
+    for kind in dict.fromkeys(kind for kind, _, _ in hits):
+        ids = [card_id for hit_kind, card_id, _ in hits if hit_kind == kind][:per_kind]
+        cards = models[kind].objects.in_bulk(ids)
+        related[kind] = [cards[card_id] for card_id in ids if card_id in cards]
@@ -16,6 +16,9 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from .base import AdventureRunMixin, AdventureTemplateMixin
+from .caching import AdventureETagMixin
+from .listing import ListQueryMixin
+from ..catalog import note_run_started
 from ..models import (
     Adventure,
     AdventureEvent,
@@ -46,9 +49,19 @@ from ..serializers import (
 )
 
 
-class AdventureRunListView(generics.ListAPIView):
+CLONE_BATCH_SIZE = 1000
+
+
+def _clone_map(sources: list, clones: list) -> dict:
+    """Map source ids to the clones created from them in the same order."""
+    return {source.id: clone for source, clone in zip(sources, clones)}
+
+
+class AdventureRunListView(ListQueryMixin, generics.ListAPIView):
     serializer_class = AdventureRunSerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = 3
+    keyset_ordering = "-created_at"
 
     def get_queryset(self):
         return Adventure.objects.filter(player_user=self.request.user, is_template=False).order_by(
@@ -56,13 +69,23 @@ class AdventureRunListView(generics.ListAPIView):
         )
 
 
-class AdventureRunDetailView(generics.RetrieveUpdateDestroyAPIView):
+class AdventureRunDetailView(AdventureETagMixin, generics.RetrieveUpdateDestroyAPIView):
     serializer_class = AdventureRunDetailSerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = {"GET": 4, "PUT": 8, "PATCH": 8, "DELETE": 60}
+    etag_fields = ("rollback_min_history_id",)
 
     def get_queryset(self):
         return Adventure.objects.filter(player_user=self.request.user, is_template=False)
 
+    def get_adventure(self) -> Adventure:
+        if not hasattr(self, "_adventure"):
+            self._adventure = super().get_object()
+        return self._adventure
+
+    def get_object(self):
+        return self.get_adventure()
+
     def perform_update(self, serializer):
         adventure = serializer.save()
         if adventure.primary_hero_id:
@@ -75,8 +98,10 @@ class AdventureRunDetailView(generics.RetrieveUpdateDestroyAPIView):
                 character.save(update_fields=["is_player", "in_party"])
 
 
-class AdventureRunBootstrapView(AdventureRunMixin, APIView):
+class AdventureRunBootstrapView(AdventureETagMixin, AdventureRunMixin, APIView):
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = 8
+    etag_fields = ("rollback_min_history_id",)
 
     def get(self, request, run_id):
         adventure = self.get_adventure()
@@ -88,7 +113,7 @@ class AdventureRunBootstrapView(AdventureRunMixin, APIView):
             SkillSystem.objects.filter(adventure=adventure).order_by("title"), many=True
         ).data
         techniques = TechniqueSerializer(
-            Technique.objects.filter(system__adventure=adventure).order_by("title"), many=True
+            Technique.objects.filter(adventure=adventure).order_by("title"), many=True
         ).data
         setup, _ = AdventureHeroSetup.objects.get_or_create(adventure=adventure)
         return Response(
@@ -105,6 +130,7 @@ class AdventureRunBootstrapView(AdventureRunMixin, APIView):
 
 class AdventureRunStartView(AdventureTemplateMixin, APIView):
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = 40
 
     def post(self, request, template_id):
         template = Adventure.objects.filter(id=template_id, is_template=True).first()
@@ -128,28 +154,44 @@ class AdventureRunStartView(AdventureTemplateMixin, APIView):
                 spec_instructions=template.spec_instructions,
             )
 
-            location_map = {}
-            for location in Location.objects.filter(adventure=template).order_by("title"):
-                location_map[location.id] = Location.objects.create(
-                    adventure=run,
-                    title=location.title,
-                    description=location.description,
-                    x=location.x,
-                    y=location.y,
-                    width=location.width,
-                    height=location.height,
-                    tags=list(location.tags),
-                )
+            locations = list(Location.objects.filter(adventure=template).order_by("title"))
+            location_map = _clone_map(
+                locations,
+                Location.objects.bulk_create(
+                    [
+                        Location(
+                            adventure=run,
+                            title=location.title,
+                            description=location.description,
+                            x=location.x,
+                            y=location.y,
+                            width=location.width,
+                            height=location.height,
+                            tags=list(location.tags),
+                        )
+                        for location in locations
+                    ],
+                    batch_size=CLONE_BATCH_SIZE,
+                ),
+            )
 
-            race_map = {}
-            for race in Race.objects.filter(adventure=template).order_by("title"):
-                race_map[race.id] = Race.objects.create(
-                    adventure=run,
-                    title=race.title,
-                    description=race.description,
-                    life_span=race.life_span,
-                    tags=list(race.tags),
-                )
+            races = list(Race.objects.filter(adventure=template).order_by("title"))
+            race_map = _clone_map(
+                races,
+                Race.objects.bulk_create(
+                    [
+                        Race(
+                            adventure=run,
+                            title=race.title,
+                            description=race.description,
+                            life_span=race.life_span,
+                            tags=list(race.tags),
+                        )
+                        for race in races
+                    ],
+                    batch_size=CLONE_BATCH_SIZE,
+                ),
+            )
 
             AdventureHeroSetup.objects.update_or_create(
                 adventure=run,
@@ -170,108 +212,151 @@ class AdventureRunStartView(AdventureTemplateMixin, APIView):
                 },
             )
 
-            system_map = {}
-            for system in SkillSystem.objects.filter(adventure=template).order_by("title"):
-                system_map[system.id] = SkillSystem.objects.create(
-                    adventure=run,
-                    title=system.title,
-                    description=system.description,
-                    tags=list(system.tags),
-                    w_body=system.w_body,
-                    w_mind=system.w_mind,
-                    w_will=system.w_will,
-                    formula_hint=system.formula_hint,
-                )
+            systems = list(SkillSystem.objects.filter(adventure=template).order_by("title"))
+            system_map = _clone_map(
+                systems,
+                SkillSystem.objects.bulk_create(
+                    [
+                        SkillSystem(
+                            adventure=run,
+                            title=system.title,
+                            description=system.description,
+                            tags=list(system.tags),
+                            w_body=system.w_body,
+                            w_mind=system.w_mind,
+                            w_will=system.w_will,
+                            formula_hint=system.formula_hint,
+                        )
+                        for system in systems
+                    ],
+                    batch_size=CLONE_BATCH_SIZE,
+                ),
+            )
 
-            technique_map = {}
-            for technique in Technique.objects.filter(system__adventure=template).order_by("title"):
-                system = system_map.get(technique.system_id)
-                if system is None:
-                    continue
-                technique_map[technique.id] = Technique.objects.create(
-                    system=system,
-                    title=technique.title,
-                    description=technique.description,
-                    tags=list(technique.tags),
-                    difficulty=technique.difficulty,
-                    tier=technique.tier,
-                    required_system_level=technique.required_system_level,
-                )
+            techniques = [
+                technique
+                for technique in Technique.objects.filter(adventure=template).order_by("title")
+                if technique.system_id in system_map
+            ]
+            technique_map = _clone_map(
+                techniques,
+                Technique.objects.bulk_create(
+                    [
+                        Technique(
+                            adventure=run,
+                            system=system_map[technique.system_id],
+                            title=technique.title,
+                            description=technique.description,
+                            tags=list(technique.tags),
+                            difficulty=technique.difficulty,
+                            tier=technique.tier,
+                            required_system_level=technique.required_system_level,
+                        )
+                        for technique in techniques
+                    ],
+                    batch_size=CLONE_BATCH_SIZE,
+                ),
+            )
 
-            for faction in Faction.objects.filter(adventure=template).order_by("title"):
-                Faction.objects.create(
-                    adventure=run,
-                    title=faction.title,
-                    description=faction.description,
-                    tags=list(faction.tags),
-                )
+            Faction.objects.bulk_create(
+                [
+                    Faction(
+                        adventure=run,
+                        title=faction.title,
+                        description=faction.description,
+                        tags=list(faction.tags),
+                    )
+                    for faction in Faction.objects.filter(adventure=template).order_by("title")
+                ],
+                batch_size=CLONE_BATCH_SIZE,
+            )
 
-            for info in OtherInfo.objects.filter(adventure=template).order_by("title"):
-                OtherInfo.objects.create(
-                    adventure=run,
-                    category=info.category,
-                    title=info.title,
-                    description=info.description,
-                    tags=list(info.tags),
-                )
+            OtherInfo.objects.bulk_create(
+                [
+                    OtherInfo(
+                        adventure=run,
+                        category=info.category,
+                        title=info.title,
+                        description=info.description,
+                        tags=list(info.tags),
+                    )
+                    for info in OtherInfo.objects.filter(adventure=template).order_by("title")
+                ],
+                batch_size=CLONE_BATCH_SIZE,
+            )
 
-            for event in AdventureEvent.objects.filter(adventure=template).order_by("title"):
-                AdventureEvent.objects.create(
-                    adventure=run,
-                    title=event.title,
-                    status=event.status,
-                    trigger_hint=event.trigger_hint,
-                    state=event.state,
-                    location=location_map.get(event.location_id),
-                )
+            AdventureEvent.objects.bulk_create(
+                [
+                    AdventureEvent(
+                        adventure=run,
+                        title=event.title,
+                        status=event.status,
+                        trigger_hint=event.trigger_hint,
+                        state=event.state,
+                        location=location_map.get(event.location_id),
+                    )
+                    for event in AdventureEvent.objects.filter(adventure=template).order_by("title")
+                ],
+                batch_size=CLONE_BATCH_SIZE,
+            )
 
-            character_map = {}
-            for character in Character.objects.filter(adventure=template).order_by("title"):
-                character_map[character.id] = Character.objects.create(
-                    adventure=run,
-                    title=character.title,
-                    description=character.description,
-                    is_player=character.is_player,
-                    in_party=character.in_party,
-                    age=character.age,
-                    body_power=character.body_power,
-                    body_power_progress=character.body_power_progress,
-                    mind_power=character.mind_power,
-                    mind_power_progress=character.mind_power_progress,
-                    will_power=character.will_power,
-                    will_power_progress=character.will_power_progress,
-                    tags=list(character.tags),
-                    race=race_map.get(character.race_id),
-                    location=location_map.get(character.location_id),
-                )
+            characters = list(Character.objects.filter(adventure=template).order_by("title"))
+            character_map = _clone_map(
+                characters,
+                Character.objects.bulk_create(
+                    [
+                        Character(
+                            adventure=run,
+                            title=character.title,
+                            description=character.description,
+                            is_player=character.is_player,
+                            in_party=character.in_party,
+                            age=character.age,
+                            body_power=character.body_power,
+                            body_power_progress=character.body_power_progress,
+                            mind_power=character.mind_power,
+                            mind_power_progress=character.mind_power_progress,
+                            will_power=character.will_power,
+                            will_power_progress=character.will_power_progress,
+                            tags=list(character.tags),
+                            race=race_map.get(character.race_id),
+                            location=location_map.get(character.location_id),
+                        )
+                        for character in characters
+                    ],
+                    batch_size=CLONE_BATCH_SIZE,
+                ),
+            )
 
-            for entry in CharacterSystem.objects.filter(
-                character__adventure=template
-            ).order_by("id"):
-                character = character_map.get(entry.character_id)
-                system = system_map.get(entry.system_id)
-                if character is None or system is None:
-                    continue
-                CharacterSystem.objects.create(
-                    character=character,
-                    system=system,
-                    level=entry.level,
-                    progress_percent=entry.progress_percent,
-                    notes=entry.notes,
-                )
+            CharacterSystem.objects.bulk_create(
+                [
+                    CharacterSystem(
+                        adventure=run,
+                        character=character_map[entry.character_id],
+                        system=system_map[entry.system_id],
+                        level=entry.level,
+                        progress_percent=entry.progress_percent,
+                        notes=entry.notes,
+                    )
+                    for entry in CharacterSystem.objects.filter(adventure=template).order_by("id")
+                    if entry.character_id in character_map and entry.system_id in system_map
+                ],
+                batch_size=CLONE_BATCH_SIZE,
+            )
 
-            for entry in CharacterTechnique.objects.filter(
-                character__adventure=template
-            ).order_by("id"):
-                character = character_map.get(entry.character_id)
-                technique = technique_map.get(entry.technique_id)
-                if character is None or technique is None:
-                    continue
-                CharacterTechnique.objects.create(
-                    character=character,
-                    technique=technique,
-                    notes=entry.notes,
-                )
+            CharacterTechnique.objects.bulk_create(
+                [
+                    CharacterTechnique(
+                        adventure=run,
+                        character=character_map[entry.character_id],
+                        technique=technique_map[entry.technique_id],
+                        notes=entry.notes,
+                    )
+                    for entry in CharacterTechnique.objects.filter(adventure=template).order_by("id")
+                    if entry.character_id in character_map and entry.technique_id in technique_map
+                ],
+                batch_size=CLONE_BATCH_SIZE,
+            )
 
             run.primary_hero = character_map.get(template.primary_hero_id)
             run.save(update_fields=["primary_hero"])
@@ -286,6 +371,7 @@ class AdventureRunStartView(AdventureTemplateMixin, APIView):
                     content=intro_text,
                     metadata={},
                 )
+            note_run_started(template, run.created_at)
 
         return Response(AdventureRunSerializer(run).data, status=status.HTTP_201_CREATED)
 
@@ -347,7 +433,7 @@ class AdventureRunHeroSetupView(AdventureRunMixin, APIView):
         if technique_entries:
             for entry in technique_entries:
                 technique = Technique.objects.filter(
-                    system__adventure=adventure, id=entry.get("technique")
+                    adventure=adventure, id=entry.get("technique")
                 ).first()
                 if technique is None:
                     return Response(
@@ -416,6 +502,7 @@ class AdventureRunHeroSetupView(AdventureRunMixin, APIView):
             if validated_systems:
                 for system, entry in validated_systems:
                     CharacterSystem.objects.create(
+                        adventure=adventure,
                         character=hero,
                         system=system,
                         level=entry.get("level", 0),
@@ -426,6 +513,7 @@ class AdventureRunHeroSetupView(AdventureRunMixin, APIView):
             if validated_techniques:
                 for technique, entry in validated_techniques:
                     CharacterTechnique.objects.create(
+                        adventure=adventure,
                         character=hero,
                         technique=technique,
                         notes=entry.get("notes", ""),
@@ -449,6 +537,7 @@ class AdventureRunHeroSetupView(AdventureRunMixin, APIView):
 class AdventureRunHistoryView(AdventureRunMixin, generics.ListCreateAPIView):
     serializer_class = AdventureHistorySerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = {"GET": 4, "POST": 5}
 
     def get_queryset(self):
         return AdventureHistory.objects.filter(adventure=self.get_adventure()).order_by("id")
@@ -459,6 +548,7 @@ class AdventureRunHistoryView(AdventureRunMixin, generics.ListCreateAPIView):
 
 class AdventureRunHistoryPdfView(AdventureRunMixin, APIView):
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = 5
 
     def get(self, request, run_id):
         adventure = self.get_adventure()
@@ -547,9 +637,10 @@ class AdventureRunHistoryPdfView(AdventureRunMixin, APIView):
         return response
 
 
-class AdventureRunCharactersView(AdventureRunMixin, generics.ListAPIView):
+class AdventureRunCharactersView(AdventureETagMixin, AdventureRunMixin, generics.ListAPIView):
     serializer_class = CharacterSerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = 3
 
     def get_queryset(self):
         return Character.objects.filter(adventure=self.get_adventure(), in_party=True).order_by(
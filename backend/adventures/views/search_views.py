@@ -0,0 +1,217 @@
+"""Full-text search over the world cards and the history of an adventure."""
+from __future__ import annotations
+
+import html
+import re
+
+from django.db import connection
+from rest_framework import permissions
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .base import AdventureRunMixin, AdventureTemplateMixin
+from .caching import AdventureETagMixin
+from ..models import (
+    Adventure,
+    AdventureEvent,
+    AdventureHistory,
+    Character,
+    Faction,
+    Location,
+    OtherInfo,
+    Race,
+    SkillSystem,
+    Technique,
+)
+from ..serializers import HistorySearchQuerySerializer, WorldSearchQuerySerializer
+
+# Kinds of WORLD_SEARCH_KINDS; every table has the generated `search_vector`
+# column of migration 0027.
+SEARCH_MODELS = {
+    "location": Location,
+    "race": Race,
+    "character": Character,
+    "faction": Faction,
+    "other_info": OtherInfo,
+    "system": SkillSystem,
+    "technique": Technique,
+    "event": AdventureEvent,
+}
+SEARCH_CONFIGS = ("russian", "english")
+MAX_QUERY_WORDS = 8
+# Shorter prefixes match too much of the index to be useful for autocomplete.
+PREFIX_MIN_LENGTH = 2
+
+# ts_headline wraps matches in these control characters; the snippet is escaped
+# and only then they become <mark> tags, so history text can not inject markup.
+_HIGHLIGHT_START = "\x02"
+_HIGHLIGHT_STOP = "\x03"
+HEADLINE_OPTIONS = (
+    f"StartSel={_HIGHLIGHT_START}, StopSel={_HIGHLIGHT_STOP}, "
+    "MaxWords=35, MinWords=15, MaxFragments=2, FragmentDelimiter=\" … \""
+)
+
+_WORD_RE = re.compile(r"[^\W_]+")
+
+
+def build_tsquery(text: str, prefix: bool = True) -> tuple[str, list[str]]:
+    """SQL and params of a tsquery matching all words of `text`.
+
+    Each word matches its Russian or English stem; with `prefix` the last word
+    also matches as a prefix (`word:*`), for search-as-you-type. Words are
+    reduced to letters and digits, so the `:*` suffix can not be injected.
+    """
+    words = _WORD_RE.findall(text.lower())[:MAX_QUERY_WORDS]
+    parts = []
+    params = []
+    for index, word in enumerate(words):
+        alternatives = []
+        for config in SEARCH_CONFIGS:
+            alternatives.append(f"plainto_tsquery('{config}'::regconfig, %s)")
+            params.append(word)
+        if prefix and index == len(words) - 1 and len(word) >= PREFIX_MIN_LENGTH:
+            alternatives.append("to_tsquery('simple'::regconfig, %s)")
+            params.append(f"{word}:*")
+        parts.append("(" + " || ".join(alternatives) + ")")
+    return " && ".join(parts), params
+
+
+def search_world(
+    adventure: Adventure,
+    text: str,
+    kinds: list[str] | None = None,
+    limit: int = 20,
+    prefix: bool = True,
+) -> list[dict]:
+    """Cards of `adventure` matching `text`, best `ts_rank` first across all kinds.
+
+    Every kind contributes at most `limit` rows through its GIN index, so the
+    final ordering only sorts `limit * len(kinds)` candidates.
+    """
+    tsquery_sql, tsquery_params = build_tsquery(text, prefix=prefix)
+    if not tsquery_sql:
+        return []
+    branches = []
+    params = list(tsquery_params)
+    for kind in kinds or SEARCH_MODELS:
+        table = SEARCH_MODELS[kind]._meta.db_table
+        branches.append(
+            f"(SELECT %s AS kind, t.id, t.title, ts_rank(t.search_vector, q.query) AS rank "
+            f"FROM {table} t, q WHERE t.adventure_id = %s AND t.search_vector @@ q.query "
+            f"ORDER BY rank DESC, t.id LIMIT %s)"
+        )
+        params.extend([kind, adventure.id, limit])
+    params.append(limit)
+    sql = (
+        f"WITH q AS (SELECT {tsquery_sql} AS query) SELECT * FROM ("
+        + " UNION ALL ".join(branches)
+        + ") ranked ORDER BY rank DESC, kind, id LIMIT %s"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [
+            {"kind": kind, "id": card_id, "title": title, "rank": round(rank, 6)}
+            for kind, card_id, title, rank in cursor.fetchall()
+        ]
+
+
+class AdventureSearchView(AdventureETagMixin, AdventureTemplateMixin, APIView):
+    """Ranked search over locations, characters and the other cards of a template or run."""
+
+    permission_classes = [permissions.IsAuthenticated]
+    query_budget = 5
+
+    def get(self, request, *args, **kwargs):
+        query = WorldSearchQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+        kinds = [kind for kind in SEARCH_MODELS if kind in params.get("kind", ())]
+        results = search_world(
+            self.get_adventure(),
+            params["q"],
+            kinds=kinds or None,
+            limit=params["limit"],
+            prefix=params["prefix"],
+        )
+        return Response({"q": params["q"], "results": results})
+
+
+def _render_snippet(headline: str) -> str:
+    escaped = html.escape(headline, quote=False)
+    return escaped.replace(_HIGHLIGHT_START, "<mark>").replace(_HIGHLIGHT_STOP, "</mark>")
+
+
+def search_history(
+    adventure: Adventure,
+    text: str,
+    role: str | None = None,
+    order: str = "desc",
+    cursor: int | None = None,
+    limit: int = 20,
+    prefix: bool = True,
+) -> tuple[list[dict], int | None]:
+    """History entries matching `text` in story order, and the cursor of the next page.
+
+    Pages are keyed by entry id (`id < cursor` newest first, `id > cursor` oldest
+    first), so deep pages cost as much as the first one. Snippets are computed
+    for the page rows only.
+
+    Matching ids are materialized from the GIN index before ordering: otherwise
+    the planner walks the primary key in order and filters, which is quick for
+    common words but reads the whole table for a rare name.
+    """
+    tsquery_sql, params = build_tsquery(text, prefix=prefix)
+    if not tsquery_sql:
+        return [], None
+    table = AdventureHistory._meta.db_table
+    conditions = ["h.adventure_id = %s", "h.search_vector @@ q.query"]
+    params.append(adventure.id)
+    if role:
+        conditions.append("h.role = %s")
+        params.append(role)
+    if cursor is not None:
+        conditions.append("h.id < %s" if order == "desc" else "h.id > %s")
+        params.append(cursor)
+    direction = "DESC" if order == "desc" else "ASC"
+    params.extend([adventure.id, limit + 1, HEADLINE_OPTIONS])
+    sql = (
+        f"WITH q AS (SELECT {tsquery_sql} AS query), "
+        f"matches AS MATERIALIZED (SELECT h.id FROM {table} h, q WHERE {' AND '.join(conditions)}), "
+        f"page AS (SELECT h.id, h.role, h.content, h.created_at FROM {table} h "
+        f"WHERE h.adventure_id = %s "
+        f"AND h.id IN (SELECT id FROM matches ORDER BY id {direction} LIMIT %s)) "
+        f"SELECT page.id, page.role, page.created_at, "
+        f"ts_headline('russian'::regconfig, page.content, q.query, %s) "
+        f"FROM page, q ORDER BY page.id {direction}"
+    )
+    with connection.cursor() as db_cursor:
+        db_cursor.execute(sql, params)
+        rows = db_cursor.fetchall()
+    results = [
+        {"id": entry_id, "role": entry_role, "created_at": created_at, "snippet": _render_snippet(headline)}
+        for entry_id, entry_role, created_at, headline in rows[:limit]
+    ]
+    next_cursor = results[-1]["id"] if len(rows) > limit else None
+    return results, next_cursor
+
+
+class AdventureRunHistorySearchView(AdventureRunMixin, APIView):
+    """Search of a run's history with highlighted snippets and keyset pagination."""
+
+    permission_classes = [permissions.IsAuthenticated]
+    query_budget = 4
+
+    def get(self, request, *args, **kwargs):
+        query = HistorySearchQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+        results, next_cursor = search_history(
+            self.get_adventure(),
+            params["q"],
+            role=params.get("role"),
+            order=params["order"],
+            cursor=params.get("cursor"),
+            limit=params["limit"],
+            prefix=params["prefix"],
+        )
+        return Response({"q": params["q"], "results": results, "next_cursor": next_cursor})
@@ -1,12 +1,23 @@
 """Views for managing adventure templates and related resources."""
 from __future__ import annotations
 
-from django.db.models import Q
+from django.db.models import F, Q
 from django.http import Http404
+from django.shortcuts import get_object_or_404
 from rest_framework import generics, permissions
 from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
 
-from .base import AdventureTemplateMixin
+from .base import (
+    DETAIL_QUERY_BUDGET,
+    LIST_QUERY_BUDGET,
+    AdventureTemplateMixin,
+    CatalogCountsMixin,
+)
+from .caching import AdventureETagMixin
+from .listing import ListQueryMixin
+from ..catalog import note_template_edited
+from ..geometry import Distance, LocationBox, rectangle
 from ..models import (
     Adventure,
     AdventureEvent,
@@ -29,7 +40,10 @@ from ..serializers import (
     CharacterSystemSerializer,
     CharacterTechniqueSerializer,
     FactionSerializer,
+    LocationNearestQuerySerializer,
     LocationSerializer,
+    LocationTileQuerySerializer,
+    LocationViewportQuerySerializer,
     OtherInfoSerializer,
     RaceSerializer,
     SkillSystemSerializer,
@@ -38,22 +52,29 @@ from ..serializers import (
 from ..utils import is_moderator
 
 
-class AdventureTemplateListCreateView(generics.ListCreateAPIView):
+class AdventureTemplateListCreateView(ListQueryMixin, generics.ListCreateAPIView):
     serializer_class = AdventureTemplateSerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = LIST_QUERY_BUDGET
+    keyset_ordering = "-created_at"
 
     def get_queryset(self):
-        return Adventure.objects.filter(author_user=self.request.user, is_template=True).order_by(
-            "-created_at"
+        return (
+            Adventure.objects.filter(author_user=self.request.user, is_template=True)
+            .select_related("author_user", "moderation_entry", "publication_entry")
+            .order_by("-created_at")
         )
 
 
-class AdventureTemplateDetailView(generics.RetrieveUpdateDestroyAPIView):
+class AdventureTemplateDetailView(AdventureETagMixin, generics.RetrieveUpdateDestroyAPIView):
     serializer_class = AdventureTemplateSerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = {"GET": 4, "PUT": 8, "PATCH": 8, "DELETE": 60}
 
     def get_queryset(self):
-        base_queryset = Adventure.objects.filter(is_template=True)
+        base_queryset = Adventure.objects.filter(is_template=True).select_related(
+            "author_user", "moderation_entry", "publication_entry"
+        )
         if self.request.method in SAFE_METHODS and is_moderator(self.request.user):
             return base_queryset.filter(
                 Q(author_user=self.request.user)
@@ -62,8 +83,18 @@ class AdventureTemplateDetailView(generics.RetrieveUpdateDestroyAPIView):
             )
         return base_queryset.filter(author_user=self.request.user)
 
+    def get_adventure(self) -> Adventure:
+        if not hasattr(self, "_adventure"):
+            self._adventure = super().get_object()
+            self._adventure_published = hasattr(self._adventure, "publication_entry")
+        return self._adventure
+
+    def get_object(self):
+        return self.get_adventure()
+
     def perform_update(self, serializer):
         adventure = serializer.save()
+        note_template_edited(adventure)
         if adventure.primary_hero_id:
             character = Character.objects.filter(
                 adventure=adventure, id=adventure.primary_hero_id
@@ -74,9 +105,12 @@ class AdventureTemplateDetailView(generics.RetrieveUpdateDestroyAPIView):
                 character.save(update_fields=["is_player", "in_party"])
 
 
-class AdventureHeroSetupDetailView(AdventureTemplateMixin, generics.RetrieveUpdateAPIView):
+class AdventureHeroSetupDetailView(
+    AdventureETagMixin, AdventureTemplateMixin, generics.RetrieveUpdateAPIView
+):
     serializer_class = AdventureHeroSetupSerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = DETAIL_QUERY_BUDGET
 
     def get_object(self):
         adventure = self.get_adventure()
@@ -89,9 +123,16 @@ class AdventureHeroSetupDetailView(AdventureTemplateMixin, generics.RetrieveUpda
         return setup
 
 
-class LocationListCreateView(AdventureTemplateMixin, generics.ListCreateAPIView):
+class LocationListCreateView(
+    AdventureETagMixin,
+    CatalogCountsMixin,
+    ListQueryMixin,
+    AdventureTemplateMixin,
+    generics.ListCreateAPIView,
+):
     serializer_class = LocationSerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = LIST_QUERY_BUDGET
 
     def get_queryset(self):
         return Location.objects.filter(adventure=self.get_adventure()).order_by("title")
@@ -105,17 +146,144 @@ class LocationListCreateView(AdventureTemplateMixin, generics.ListCreateAPIView)
         serializer.save(adventure=self.get_adventure())
 
 
-class LocationDetailView(AdventureTemplateMixin, generics.RetrieveUpdateDestroyAPIView):
+class LocationDetailView(
+    AdventureETagMixin,
+    CatalogCountsMixin,
+    AdventureTemplateMixin,
+    generics.RetrieveUpdateDestroyAPIView,
+):
     serializer_class = LocationSerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = DETAIL_QUERY_BUDGET
 
     def get_queryset(self):
         return Location.objects.filter(adventure=self.get_adventure())
 
 
-class RaceListCreateView(AdventureTemplateMixin, generics.ListCreateAPIView):
+def _locations_in_area(adventure: Adventure, x: int, y: int, width: int, height: int, limit: int):
+    """Locations overlapping `[x, x + width) x [y, y + height)`, top-left first.
+
+    `&&` on boxes also matches rectangles that only touch the area's edge, so the
+    half-open bounds are re-checked on the columns.
+    """
+    queryset = (
+        Location.objects.filter(adventure=adventure)
+        .alias(box=LocationBox(), right=F("x") + F("width"), bottom=F("y") + F("height"))
+        .filter(
+            box__overlaps=rectangle(x, y, width, height),
+            x__lt=x + width,
+            y__lt=y + height,
+            right__gt=x,
+            bottom__gt=y,
+        )
+        .order_by("y", "x", "id")
+    )
+    locations = list(queryset[: limit + 1])
+    return locations[:limit], len(locations) > limit
+
+
+class LocationViewportView(AdventureETagMixin, AdventureTemplateMixin, generics.GenericAPIView):
+    """Locations visible in a map viewport, for maps too large to load whole."""
+
+    serializer_class = LocationSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    query_budget = 4
+
+    def get(self, request, *args, **kwargs):
+        query = LocationViewportQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        area = query.validated_data
+        locations, truncated = _locations_in_area(
+            self.get_adventure(), area["x"], area["y"], area["width"], area["height"], area["limit"]
+        )
+        return Response(
+            {
+                "x": area["x"],
+                "y": area["y"],
+                "width": area["width"],
+                "height": area["height"],
+                "results": self.get_serializer(locations, many=True).data,
+                "truncated": truncated,
+            }
+        )
+
+
+class LocationTileView(AdventureETagMixin, AdventureTemplateMixin, generics.GenericAPIView):
+    """Locations overlapping one square tile; a location spanning tiles is in each of them."""
+
+    serializer_class = LocationSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    query_budget = 4
+
+    def get(self, request, *args, **kwargs):
+        query = LocationTileQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        tile = query.validated_data
+        size = tile["size"]
+        x, y = tile["tx"] * size, tile["ty"] * size
+        locations, truncated = _locations_in_area(self.get_adventure(), x, y, size, size, tile["limit"])
+        return Response(
+            {
+                "tx": tile["tx"],
+                "ty": tile["ty"],
+                "size": size,
+                "x": x,
+                "y": y,
+                "results": self.get_serializer(locations, many=True).data,
+                "truncated": truncated,
+            }
+        )
+
+
+class LocationNearestView(AdventureETagMixin, AdventureTemplateMixin, generics.GenericAPIView):
+    """Locations ordered by distance to a point or to the center of a location.
+
+    The distance is measured to the nearest edge of each location, so locations
+    containing the point come first with distance 0.
+    """
+
+    serializer_class = LocationSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    query_budget = 5
+
+    def get(self, request, *args, **kwargs):
+        query = LocationNearestQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+        adventure = self.get_adventure()
+        queryset = Location.objects.filter(adventure=adventure)
+        if "location" in params:
+            origin = get_object_or_404(queryset, id=params["location"])
+            x = origin.x + origin.width / 2
+            y = origin.y + origin.height / 2
+            queryset = queryset.exclude(id=origin.id)
+        else:
+            x, y = params["x"], params["y"]
+
+        queryset = queryset.annotate(distance=Distance(LocationBox(), x, y))
+        if "max_distance" in params:
+            radius = params["max_distance"]
+            queryset = queryset.alias(box=LocationBox()).filter(
+                box__overlaps=rectangle(x - radius, y - radius, 2 * radius, 2 * radius),
+                distance__lte=radius,
+            )
+        locations = list(queryset.order_by("distance", "id")[: params["limit"]])
+        results = self.get_serializer(locations, many=True).data
+        for location, item in zip(locations, results):
+            item["distance"] = location.distance
+        return Response({"x": x, "y": y, "results": results})
+
+
+class RaceListCreateView(
+    AdventureETagMixin,
+    CatalogCountsMixin,
+    ListQueryMixin,
+    AdventureTemplateMixin,
+    generics.ListCreateAPIView,
+):
     serializer_class = RaceSerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = LIST_QUERY_BUDGET
 
     def get_queryset(self):
         return Race.objects.filter(adventure=self.get_adventure()).order_by("title")
@@ -124,17 +292,30 @@ class RaceListCreateView(AdventureTemplateMixin, generics.ListCreateAPIView):
         serializer.save(adventure=self.get_adventure())
 
 
-class RaceDetailView(AdventureTemplateMixin, generics.RetrieveUpdateDestroyAPIView):
+class RaceDetailView(
+    AdventureETagMixin,
+    CatalogCountsMixin,
+    AdventureTemplateMixin,
+    generics.RetrieveUpdateDestroyAPIView,
+):
     serializer_class = RaceSerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = DETAIL_QUERY_BUDGET
 
     def get_queryset(self):
         return Race.objects.filter(adventure=self.get_adventure())
 
 
-class SkillSystemListCreateView(AdventureTemplateMixin, generics.ListCreateAPIView):
+class SkillSystemListCreateView(
+    AdventureETagMixin,
+    CatalogCountsMixin,
+    ListQueryMixin,
+    AdventureTemplateMixin,
+    generics.ListCreateAPIView,
+):
     serializer_class = SkillSystemSerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = LIST_QUERY_BUDGET
 
     def get_queryset(self):
         return SkillSystem.objects.filter(adventure=self.get_adventure()).order_by("title")
@@ -143,33 +324,48 @@ class SkillSystemListCreateView(AdventureTemplateMixin, generics.ListCreateAPIVi
         serializer.save(adventure=self.get_adventure())
 
 
-class SkillSystemDetailView(AdventureTemplateMixin, generics.RetrieveUpdateDestroyAPIView):
+class SkillSystemDetailView(
+    AdventureETagMixin,
+    CatalogCountsMixin,
+    AdventureTemplateMixin,
+    generics.RetrieveUpdateDestroyAPIView,
+):
     serializer_class = SkillSystemSerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = DETAIL_QUERY_BUDGET
 
     def get_queryset(self):
         return SkillSystem.objects.filter(adventure=self.get_adventure())
 
 
-class TechniqueListCreateView(AdventureTemplateMixin, generics.ListCreateAPIView):
+class TechniqueListCreateView(
+    AdventureETagMixin, ListQueryMixin, AdventureTemplateMixin, generics.ListCreateAPIView
+):
     serializer_class = TechniqueSerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = LIST_QUERY_BUDGET
 
     def get_queryset(self):
-        return Technique.objects.filter(system__adventure=self.get_adventure()).order_by("title")
+        return Technique.objects.filter(adventure=self.get_adventure()).order_by("title")
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
         context["adventure"] = self.get_adventure()
         return context
 
+    def perform_create(self, serializer):
+        serializer.save(adventure=self.get_adventure())
+
 
-class TechniqueDetailView(AdventureTemplateMixin, generics.RetrieveUpdateDestroyAPIView):
+class TechniqueDetailView(
+    AdventureETagMixin, AdventureTemplateMixin, generics.RetrieveUpdateDestroyAPIView
+):
     serializer_class = TechniqueSerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = DETAIL_QUERY_BUDGET
 
     def get_queryset(self):
-        return Technique.objects.filter(system__adventure=self.get_adventure())
+        return Technique.objects.filter(adventure=self.get_adventure())
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
@@ -177,9 +373,16 @@ class TechniqueDetailView(AdventureTemplateMixin, generics.RetrieveUpdateDestroy
         return context
 
 
-class FactionListCreateView(AdventureTemplateMixin, generics.ListCreateAPIView):
+class FactionListCreateView(
+    AdventureETagMixin,
+    CatalogCountsMixin,
+    ListQueryMixin,
+    AdventureTemplateMixin,
+    generics.ListCreateAPIView,
+):
     serializer_class = FactionSerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = LIST_QUERY_BUDGET
 
     def get_queryset(self):
         return Faction.objects.filter(adventure=self.get_adventure()).order_by("title")
@@ -188,17 +391,26 @@ class FactionListCreateView(AdventureTemplateMixin, generics.ListCreateAPIView):
         serializer.save(adventure=self.get_adventure())
 
 
-class FactionDetailView(AdventureTemplateMixin, generics.RetrieveUpdateDestroyAPIView):
+class FactionDetailView(
+    AdventureETagMixin,
+    CatalogCountsMixin,
+    AdventureTemplateMixin,
+    generics.RetrieveUpdateDestroyAPIView,
+):
     serializer_class = FactionSerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = DETAIL_QUERY_BUDGET
 
     def get_queryset(self):
         return Faction.objects.filter(adventure=self.get_adventure())
 
 
-class OtherInfoListCreateView(AdventureTemplateMixin, generics.ListCreateAPIView):
+class OtherInfoListCreateView(
+    AdventureETagMixin, ListQueryMixin, AdventureTemplateMixin, generics.ListCreateAPIView
+):
     serializer_class = OtherInfoSerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = LIST_QUERY_BUDGET
 
     def get_queryset(self):
         return OtherInfo.objects.filter(adventure=self.get_adventure()).order_by("title")
@@ -207,17 +419,27 @@ class OtherInfoListCreateView(AdventureTemplateMixin, generics.ListCreateAPIView
         serializer.save(adventure=self.get_adventure())
 
 
-class OtherInfoDetailView(AdventureTemplateMixin, generics.RetrieveUpdateDestroyAPIView):
+class OtherInfoDetailView(
+    AdventureETagMixin, AdventureTemplateMixin, generics.RetrieveUpdateDestroyAPIView
+):
     serializer_class = OtherInfoSerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = DETAIL_QUERY_BUDGET
 
     def get_queryset(self):
         return OtherInfo.objects.filter(adventure=self.get_adventure())
 
 
-class CharacterListCreateView(AdventureTemplateMixin, generics.ListCreateAPIView):
+class CharacterListCreateView(
+    AdventureETagMixin,
+    CatalogCountsMixin,
+    ListQueryMixin,
+    AdventureTemplateMixin,
+    generics.ListCreateAPIView,
+):
     serializer_class = CharacterSerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = LIST_QUERY_BUDGET
 
     def get_queryset(self):
         return Character.objects.filter(adventure=self.get_adventure()).order_by("title")
@@ -238,9 +460,15 @@ class CharacterListCreateView(AdventureTemplateMixin, generics.ListCreateAPIView
             adventure.save(update_fields=["primary_hero"])
 
 
-class CharacterDetailView(AdventureTemplateMixin, generics.RetrieveUpdateDestroyAPIView):
+class CharacterDetailView(
+    AdventureETagMixin,
+    CatalogCountsMixin,
+    AdventureTemplateMixin,
+    generics.RetrieveUpdateDestroyAPIView,
+):
     serializer_class = CharacterSerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = DETAIL_QUERY_BUDGET
 
     def get_queryset(self):
         return Character.objects.filter(adventure=self.get_adventure())
@@ -264,14 +492,15 @@ class CharacterDetailView(AdventureTemplateMixin, generics.RetrieveUpdateDestroy
             adventure.save(update_fields=["primary_hero"])
 
 
-class CharacterSystemListCreateView(AdventureTemplateMixin, generics.ListCreateAPIView):
+class CharacterSystemListCreateView(
+    AdventureETagMixin, ListQueryMixin, AdventureTemplateMixin, generics.ListCreateAPIView
+):
     serializer_class = CharacterSystemSerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = LIST_QUERY_BUDGET
 
     def get_queryset(self):
-        return CharacterSystem.objects.filter(
-            character__adventure=self.get_adventure()
-        ).order_by("id")
+        return CharacterSystem.objects.filter(adventure=self.get_adventure()).order_by("id")
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
@@ -279,15 +508,18 @@ class CharacterSystemListCreateView(AdventureTemplateMixin, generics.ListCreateA
         return context
 
     def perform_create(self, serializer):
-        serializer.save()
+        serializer.save(adventure=self.get_adventure())
 
 
-class CharacterSystemDetailView(AdventureTemplateMixin, generics.RetrieveUpdateDestroyAPIView):
+class CharacterSystemDetailView(
+    AdventureETagMixin, AdventureTemplateMixin, generics.RetrieveUpdateDestroyAPIView
+):
     serializer_class = CharacterSystemSerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = DETAIL_QUERY_BUDGET
 
     def get_queryset(self):
-        return CharacterSystem.objects.filter(character__adventure=self.get_adventure())
+        return CharacterSystem.objects.filter(adventure=self.get_adventure())
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
@@ -295,14 +527,15 @@ class CharacterSystemDetailView(AdventureTemplateMixin, generics.RetrieveUpdateD
         return context
 
 
-class CharacterTechniqueListCreateView(AdventureTemplateMixin, generics.ListCreateAPIView):
+class CharacterTechniqueListCreateView(
+    AdventureETagMixin, ListQueryMixin, AdventureTemplateMixin, generics.ListCreateAPIView
+):
     serializer_class = CharacterTechniqueSerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = LIST_QUERY_BUDGET
 
     def get_queryset(self):
-        return CharacterTechnique.objects.filter(
-            character__adventure=self.get_adventure()
-        ).order_by("id")
+        return CharacterTechnique.objects.filter(adventure=self.get_adventure()).order_by("id")
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
@@ -310,15 +543,18 @@ class CharacterTechniqueListCreateView(AdventureTemplateMixin, generics.ListCrea
         return context
 
     def perform_create(self, serializer):
-        serializer.save()
+        serializer.save(adventure=self.get_adventure())
 
 
-class CharacterTechniqueDetailView(AdventureTemplateMixin, generics.RetrieveUpdateDestroyAPIView):
+class CharacterTechniqueDetailView(
+    AdventureETagMixin, AdventureTemplateMixin, generics.RetrieveUpdateDestroyAPIView
+):
     serializer_class = CharacterTechniqueSerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = DETAIL_QUERY_BUDGET
 
     def get_queryset(self):
-        return CharacterTechnique.objects.filter(character__adventure=self.get_adventure())
+        return CharacterTechnique.objects.filter(adventure=self.get_adventure())
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
@@ -326,9 +562,16 @@ class CharacterTechniqueDetailView(AdventureTemplateMixin, generics.RetrieveUpda
         return context
 
 
-class AdventureEventListCreateView(AdventureTemplateMixin, generics.ListCreateAPIView):
+class AdventureEventListCreateView(
+    AdventureETagMixin,
+    CatalogCountsMixin,
+    ListQueryMixin,
+    AdventureTemplateMixin,
+    generics.ListCreateAPIView,
+):
     serializer_class = AdventureEventSerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = LIST_QUERY_BUDGET
 
     def get_queryset(self):
         return AdventureEvent.objects.filter(adventure=self.get_adventure()).order_by("title")
@@ -342,9 +585,15 @@ class AdventureEventListCreateView(AdventureTemplateMixin, generics.ListCreateAP
         serializer.save(adventure=self.get_adventure())
 
 
-class AdventureEventDetailView(AdventureTemplateMixin, generics.RetrieveUpdateDestroyAPIView):
+class AdventureEventDetailView(
+    AdventureETagMixin,
+    CatalogCountsMixin,
+    AdventureTemplateMixin,
+    generics.RetrieveUpdateDestroyAPIView,
+):
     serializer_class = AdventureEventSerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = DETAIL_QUERY_BUDGET
 
     def get_queryset(self):
         return AdventureEvent.objects.filter(adventure=self.get_adventure())
@@ -7,6 +7,7 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from .base import AdventureTemplateMixin
+from .caching import AdventureETagMixin
 from ..models import (
     Adventure,
     AdventureEvent,
@@ -37,8 +38,9 @@ def _build_export_list(queryset, fields):
     return items, export_id_map
 
 
-class AdventureTemplateExportView(AdventureTemplateMixin, APIView):
+class AdventureTemplateExportView(AdventureETagMixin, AdventureTemplateMixin, APIView):
     permission_classes = [permissions.IsAuthenticated]
+    query_budget = 15
 
     def get(self, request, template_id):
         adventure = self.get_adventure()
@@ -56,7 +58,7 @@ class AdventureTemplateExportView(AdventureTemplateMixin, APIView):
             ["title", "description", "tags", "w_body", "w_mind", "w_will", "formula_hint"],
         )
         techniques, technique_map = _build_export_list(
-            Technique.objects.filter(system__adventure=adventure).order_by("title"),
+            Technique.objects.filter(adventure=adventure).order_by("title"),
             ["title", "description", "tags", "difficulty", "tier", "required_system_level"],
         )
         factions, faction_map = _build_export_list(
@@ -100,9 +102,7 @@ class AdventureTemplateExportView(AdventureTemplateMixin, APIView):
             entry["location"] = location_map.get(event.location_id)
 
         character_systems = []
-        for entry in CharacterSystem.objects.filter(
-            character__adventure=adventure
-        ).order_by("id"):
+        for entry in CharacterSystem.objects.filter(adventure=adventure).order_by("id"):
             character_systems.append(
                 {
                     "character": character_map.get(entry.character_id),
@@ -114,9 +114,7 @@ class AdventureTemplateExportView(AdventureTemplateMixin, APIView):
             )
 
         character_techniques = []
-        for entry in CharacterTechnique.objects.filter(
-            character__adventure=adventure
-        ).order_by("id"):
+        for entry in CharacterTechnique.objects.filter(adventure=adventure).order_by("id"):
             character_techniques.append(
                 {
                     "character": character_map.get(entry.character_id),
@@ -232,6 +230,7 @@ class AdventureTemplateImportView(APIView):
                 if system is None:
                     continue
                 technique = Technique.objects.create(
+                    adventure=adventure,
                     system=system,
                     title=entry.get("title", ""),
                     description=entry.get("description", ""),
@@ -296,6 +295,7 @@ class AdventureTemplateImportView(APIView):
                 if character is None or system is None:
                     continue
                 CharacterSystem.objects.create(
+                    adventure=adventure,
                     character=character,
                     system=system,
                     level=entry.get("level", 0),
@@ -309,6 +309,7 @@ class AdventureTemplateImportView(APIView):
                 if character is None or technique is None:
                     continue
                 CharacterTechnique.objects.create(
+                    adventure=adventure,
                     character=character,
                     technique=technique,
                     notes=entry.get("notes", ""),
@@ -0,0 +1,98 @@
+"""
+Local text embedders.
+
+Embeddings are computed on CPU without network access: either by a locally stored
+sentence-transformers model or by a feature-hashing fallback with no dependencies.
+"""
+from __future__ import annotations
+
+from abc import ABC, abstractmethod
+import math
+import os
+from pathlib import Path
+import re
+import zlib
+from typing import Optional
+
+
+class Embedder(ABC):
+    name = "base"
+    dim = 0
+
+    @abstractmethod
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        """Return one L2-normalised vector per text."""
+        raise NotImplementedError
+
+
+def _normalize(vector: list[float]) -> list[float]:
+    norm = math.sqrt(sum(value * value for value in vector))
+    if norm == 0:
+        return vector
+    return [value / norm for value in vector]
+
+
+class HashingEmbedder(Embedder):
+    """Feature hashing of words and character trigrams.
+
+    Trigrams make inflected forms ("дракон", "драконом") land close to each other,
+    which plain word matching misses.
+    """
+
+    _words = re.compile(r"\w+")
+
+    def __init__(self, dim: int = 256) -> None:
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def _features(self, text: str) -> list[tuple[str, float]]:
+        features = []
+        for word in self._words.findall(text.lower()):
+            features.append((word, 1.0))
+            padded = f"#{word}#"
+            for index in range(len(padded) - 2):
+                features.append((padded[index : index + 3], 0.5))
+        return features
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        vectors = []
+        for text in texts:
+            vector = [0.0] * self.dim
+            for feature, weight in self._features(text):
+                digest = zlib.crc32(feature.encode("utf-8"))
+                sign = 1.0 if digest & 0x80000000 else -1.0
+                vector[digest % self.dim] += sign * weight
+            vectors.append(_normalize(vector))
+        return vectors
+
+
+class SentenceTransformerEmbedder(Embedder):
+    """Locally stored sentence-transformers model (requires the optional package)."""
+
+    def __init__(self, model_path: str) -> None:
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model_path, device="cpu", local_files_only=True)
+        self.dim = self.model.get_sentence_embedding_dimension()
+        self.name = f"st-{Path(model_path).name}"
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        vectors = self.model.encode(texts, normalize_embeddings=True, convert_to_numpy=True)
+        return [vector.tolist() for vector in vectors]
+
+
+_embedder: Optional[Embedder] = None
+
+
+def get_embedder() -> Embedder:
+    global _embedder
+    if _embedder is None:
+        model_path = os.getenv("EMBEDDING_MODEL_PATH", "")
+        if model_path:
+            try:
+                _embedder = SentenceTransformerEmbedder(model_path)
+            except (ImportError, OSError):
+                _embedder = None
+        if _embedder is None:
+            _embedder = HashingEmbedder(int(os.getenv("EMBEDDING_DIM", "256")))
+    return _embedder
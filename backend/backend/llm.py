@@ -6,9 +6,16 @@ This module provides a minimal interface for talking to local or remote LLMs.
 from __future__ import annotations
 
 from abc import ABC, abstractmethod
-from dataclasses import dataclass
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, replace
+import hashlib
 import json
+import math
 import os
+import re
+import threading
+import time
 from typing import Iterable, Optional
 from urllib import error, request
 
@@ -23,18 +30,166 @@ class LLMMessage:
 class LLMResponse:
     text: str
     raw: Optional[dict] = None
+    provider: str = ""
+    prefix_hash: str = ""
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    cached_tokens: Optional[int] = None
+    cache_key: str = ""
+    cache_hit: bool = False
+    queue_wait_ms: Optional[int] = None
+
+
+def prefix_hash(system: Optional[str]) -> str:
+    """Stable identifier of a system prefix, used as a provider cache key."""
+    if not system:
+        return ""
+    return hashlib.sha256(system.encode("utf-8")).hexdigest()[:32]
+
+
+_PREFIX_RECENT_LIMIT = 256
+_prefix_lock = threading.Lock()
+_prefix_recent: "OrderedDict[tuple[str, str], None]" = OrderedDict()
+_prefix_stats: dict[str, dict[str, int]] = {}
+
+
+def _track_prefix(response: LLMResponse) -> LLMResponse:
+    """Count requests whose system prefix repeats a recent one and provider-reported cache hits."""
+    with _prefix_lock:
+        stats = _prefix_stats.setdefault(
+            response.provider,
+            {"requests": 0, "prefix_repeats": 0, "prompt_tokens": 0, "cached_tokens": 0},
+        )
+        stats["requests"] += 1
+        if response.prefix_hash:
+            key = (response.provider, response.prefix_hash)
+            if key in _prefix_recent:
+                stats["prefix_repeats"] += 1
+                _prefix_recent.move_to_end(key)
+            else:
+                _prefix_recent[key] = None
+                if len(_prefix_recent) > _PREFIX_RECENT_LIMIT:
+                    _prefix_recent.popitem(last=False)
+        stats["prompt_tokens"] += response.prompt_tokens or 0
+        stats["cached_tokens"] += response.cached_tokens or 0
+    return response
+
+
+def get_prefix_cache_stats() -> dict[str, dict[str, float]]:
+    """Per-provider prefix reuse counters with derived hit rates."""
+    with _prefix_lock:
+        snapshot = {provider: dict(stats) for provider, stats in _prefix_stats.items()}
+    for stats in snapshot.values():
+        stats["prefix_repeat_rate"] = (
+            stats["prefix_repeats"] / stats["requests"] if stats["requests"] else 0.0
+        )
+        stats["cached_token_rate"] = (
+            stats["cached_tokens"] / stats["prompt_tokens"] if stats["prompt_tokens"] else 0.0
+        )
+    return snapshot
+
+
+class Tokenizer(ABC):
+    """Counts prompt tokens for budgeting; `name` identifies cached counts."""
+
+    name = "base"
+
+    @abstractmethod
+    def count(self, text: str) -> int:
+        raise NotImplementedError
+
+
+class HeuristicTokenizer(Tokenizer):
+    """Provider-agnostic estimate: a few characters per token, at least one per word or symbol."""
+
+    _pieces = re.compile(r"\w+|[^\w\s]")
+
+    def __init__(self, chars_per_token: float = 3.0) -> None:
+        self.chars_per_token = max(chars_per_token, 1.0)
+        self.name = f"heuristic-{self.chars_per_token:g}"
+
+    def count(self, text: str) -> int:
+        return sum(
+            max(1, math.ceil(len(piece) / self.chars_per_token))
+            for piece in self._pieces.findall(text)
+        )
+
+
+class TiktokenTokenizer(Tokenizer):
+    """Exact BPE counts for OpenAI-compatible models (requires the optional `tiktoken`)."""
+
+    def __init__(self, model: str) -> None:
+        import tiktoken
+
+        try:
+            self.encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            self.encoding = tiktoken.get_encoding("cl100k_base")
+        self.name = f"tiktoken-{self.encoding.name}"
+
+    def count(self, text: str) -> int:
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+
+def get_tokenizer(provider: str, model: str) -> Tokenizer:
+    kind = os.getenv("LLM_TOKENIZER", "auto")
+    chars_per_token = float(os.getenv("LLM_TOKENIZER_CHARS_PER_TOKEN", "3"))
+    if kind == "heuristic":
+        return HeuristicTokenizer(chars_per_token)
+    if kind == "tiktoken" or (kind == "auto" and provider == "openai-compatible"):
+        try:
+            return TiktokenTokenizer(model)
+        except ImportError:
+            if kind == "tiktoken":
+                raise ValueError("LLM_TOKENIZER=tiktoken requires the tiktoken package.")
+    return HeuristicTokenizer(chars_per_token)
+
+
+JSON_MODES = ("schema", "object", "off")
+
+
+def get_json_mode() -> str:
+    mode = os.getenv("LLM_JSON_MODE", "schema")
+    return mode if mode in JSON_MODES else "schema"
 
 
 class LLMClient(ABC):
+    """Base client.
+
+    `generate(..., response_format=...)` asks for JSON output: pass `"json"` for any
+    JSON object or a JSON schema dict. Providers map it to their native structured
+    output mode according to `json_mode` (`schema`, `object` or `off`).
+    """
+
+    provider_name = "base"
+    json_mode = "off"
+
     def __init__(
         self,
         model: str,
         temperature: float = 0.7,
         max_tokens: int = 512,
+        tokenizer: Optional[Tokenizer] = None,
     ) -> None:
         self.model = model
         self.temperature = temperature
         self.max_tokens = max_tokens
+        self.tokenizer = tokenizer or HeuristicTokenizer()
+
+    def count_tokens(self, text: str) -> int:
+        return self.tokenizer.count(text)
+
+    @property
+    def supports_json_mode(self) -> bool:
+        return self.json_mode != "off"
+
+    def _resolve_response_format(self, response_format) -> tuple[str, Optional[dict]]:
+        """Native mode to use for a request: `("schema", schema)`, `("object", None)` or `("off", None)`."""
+        if response_format is None or self.json_mode == "off":
+            return "off", None
+        if isinstance(response_format, dict) and self.json_mode == "schema":
+            return "schema", response_format
+        return "object", None
 
     @abstractmethod
     def generate(self, prompt: str, system: Optional[str] = None, **kwargs) -> LLMResponse:
@@ -44,17 +199,36 @@ class LLMClient(ABC):
         prompt = "\n".join(f"{msg.role}: {msg.content}" for msg in messages)
         return self.generate(prompt, **kwargs)
 
+    def discard_cached(self, response: LLMResponse) -> None:
+        """Forget a cached response that turned out to be unusable (no-op without a cache)."""
+
 
 class LocalEchoLLMClient(LLMClient):
     """Temporary local client for testing without a real model."""
 
+    provider_name = "local"
+
     def generate(self, prompt: str, system: Optional[str] = None, **kwargs) -> LLMResponse:
         system_prefix = f"[system: {system}] " if system else ""
-        return LLMResponse(text=f"{system_prefix}{prompt}", raw={"provider": "local-echo"})
+        return _track_prefix(
+            LLMResponse(
+                text=f"{system_prefix}{prompt}",
+                raw={"provider": "local-echo"},
+                provider=self.provider_name,
+                prefix_hash=prefix_hash(system),
+            )
+        )
 
 
 class OpenAICompatibleLLMClient(LLMClient):
-    """Client for OpenAI-compatible chat completion endpoints."""
+    """Client for OpenAI-compatible chat completion endpoints.
+
+    The system prompt goes first so that the provider's automatic prompt caching can
+    reuse it; with `prompt_cache_key` enabled, requests sharing a prefix are also
+    routed to the same cache.
+    """
+
+    provider_name = "openai-compatible"
 
     def __init__(
         self,
@@ -64,11 +238,18 @@ class OpenAICompatibleLLMClient(LLMClient):
         temperature: float = 0.7,
         max_tokens: int = 512,
         timeout_seconds: float = 30.0,
+        tokenizer: Optional[Tokenizer] = None,
+        prompt_cache_key: bool = False,
+        json_mode: str = "schema",
     ) -> None:
-        super().__init__(model=model, temperature=temperature, max_tokens=max_tokens)
+        super().__init__(
+            model=model, temperature=temperature, max_tokens=max_tokens, tokenizer=tokenizer
+        )
         self.base_url = base_url.rstrip("/")
         self.api_key = api_key
         self.timeout_seconds = timeout_seconds
+        self.prompt_cache_key = prompt_cache_key
+        self.json_mode = json_mode
 
     def generate(self, prompt: str, system: Optional[str] = None, **kwargs) -> LLMResponse:
         if not self.base_url:
@@ -85,6 +266,17 @@ class OpenAICompatibleLLMClient(LLMClient):
             "temperature": kwargs.get("temperature", self.temperature),
             "max_tokens": kwargs.get("max_tokens", self.max_tokens),
         }
+        system_hash = prefix_hash(system)
+        if self.prompt_cache_key and system_hash:
+            payload["prompt_cache_key"] = system_hash
+        mode, schema = self._resolve_response_format(kwargs.get("response_format"))
+        if mode == "schema":
+            payload["response_format"] = {
+                "type": "json_schema",
+                "json_schema": {"name": "response", "schema": schema},
+            }
+        elif mode == "object":
+            payload["response_format"] = {"type": "json_object"}
         body = json.dumps(payload).encode("utf-8")
         req = request.Request(
             f"{self.base_url}/chat/completions",
@@ -98,11 +290,28 @@ class OpenAICompatibleLLMClient(LLMClient):
         with request.urlopen(req, timeout=self.timeout_seconds) as response:
             raw = json.loads(response.read().decode("utf-8"))
         text = raw.get("choices", [{}])[0].get("message", {}).get("content", "")
-        return LLMResponse(text=text, raw=raw)
+        usage = raw.get("usage") or {}
+        return _track_prefix(
+            LLMResponse(
+                text=text,
+                raw=raw,
+                provider=self.provider_name,
+                prefix_hash=system_hash,
+                prompt_tokens=usage.get("prompt_tokens"),
+                completion_tokens=usage.get("completion_tokens"),
+                cached_tokens=(usage.get("prompt_tokens_details") or {}).get("cached_tokens"),
+            )
+        )
 
 
 class OllamaLLMClient(LLMClient):
-    """Client for local Ollama server."""
+    """Client for local Ollama server.
+
+    Ollama reuses the KV cache of the longest matching prompt prefix while the model
+    stays loaded, so `keep_alive` keeps it resident between turns.
+    """
+
+    provider_name = "ollama"
 
     def __init__(
         self,
@@ -111,10 +320,17 @@ class OllamaLLMClient(LLMClient):
         temperature: float = 0.7,
         max_tokens: int = 512,
         timeout_seconds: float = 30.0,
+        tokenizer: Optional[Tokenizer] = None,
+        keep_alive: str = "",
+        json_mode: str = "schema",
     ) -> None:
-        super().__init__(model=model, temperature=temperature, max_tokens=max_tokens)
+        super().__init__(
+            model=model, temperature=temperature, max_tokens=max_tokens, tokenizer=tokenizer
+        )
         self.base_url = base_url.rstrip("/")
         self.timeout_seconds = timeout_seconds
+        self.keep_alive = keep_alive
+        self.json_mode = json_mode
 
     def generate(self, prompt: str, system: Optional[str] = None, **kwargs) -> LLMResponse:
         if not self.base_url:
@@ -130,6 +346,13 @@ class OllamaLLMClient(LLMClient):
         }
         if system:
             payload["system"] = system
+        if self.keep_alive:
+            payload["keep_alive"] = self.keep_alive
+        mode, schema = self._resolve_response_format(kwargs.get("response_format"))
+        if mode == "schema":
+            payload["format"] = schema
+        elif mode == "object":
+            payload["format"] = "json"
         body = json.dumps(payload).encode("utf-8")
         req = request.Request(
             f"{self.base_url}/api/generate",
@@ -140,12 +363,23 @@ class OllamaLLMClient(LLMClient):
         with request.urlopen(req, timeout=self.timeout_seconds) as response:
             raw = json.loads(response.read().decode("utf-8"))
         text = raw.get("response", "")
-        return LLMResponse(text=text, raw=raw)
+        return _track_prefix(
+            LLMResponse(
+                text=text,
+                raw=raw,
+                provider=self.provider_name,
+                prefix_hash=prefix_hash(system),
+                prompt_tokens=raw.get("prompt_eval_count"),
+                completion_tokens=raw.get("eval_count"),
+            )
+        )
 
 
 class YandexGPTClient(LLMClient):
     """Client for YandexGPT text completion endpoint."""
 
+    provider_name = "yandex"
+
     def __init__(
         self,
         model_uri: str,
@@ -155,13 +389,18 @@ class YandexGPTClient(LLMClient):
         temperature: float = 0.7,
         max_tokens: int = 512,
         timeout_seconds: float = 30.0,
+        tokenizer: Optional[Tokenizer] = None,
+        json_mode: str = "schema",
     ) -> None:
-        super().__init__(model=model_uri, temperature=temperature, max_tokens=max_tokens)
+        super().__init__(
+            model=model_uri, temperature=temperature, max_tokens=max_tokens, tokenizer=tokenizer
+        )
         self.model_uri = model_uri
         self.api_key = api_key
         self.folder_id = folder_id
         self.base_url = base_url
         self.timeout_seconds = timeout_seconds
+        self.json_mode = json_mode
 
     def generate(self, prompt: str, system: Optional[str] = None, **kwargs) -> LLMResponse:
         if not self.api_key:
@@ -181,6 +420,11 @@ class YandexGPTClient(LLMClient):
             },
             "messages": messages,
         }
+        mode, schema = self._resolve_response_format(kwargs.get("response_format"))
+        if mode == "schema":
+            payload["jsonSchema"] = {"schema": schema}
+        elif mode == "object":
+            payload["jsonObject"] = True
         body = json.dumps(payload).encode("utf-8")
         req = request.Request(
             self.base_url,
@@ -206,22 +450,590 @@ class YandexGPTClient(LLMClient):
             .get("message", {})
             .get("text", "")
         )
-        return LLMResponse(text=text, raw=raw)
+        usage = raw.get("result", {}).get("usage", {})
+        input_tokens = usage.get("inputTextTokens")
+        completion_tokens = usage.get("completionTokens")
+        return _track_prefix(
+            LLMResponse(
+                text=text,
+                raw=raw,
+                provider=self.provider_name,
+                prefix_hash=prefix_hash(system),
+                prompt_tokens=int(input_tokens) if input_tokens is not None else None,
+                completion_tokens=int(completion_tokens) if completion_tokens is not None else None,
+            )
+        )
 
 
-def get_llm_client() -> LLMClient:
+PRIORITY_BACKGROUND = 0
+PRIORITY_INTERACTIVE = 10
+
+
+class LLMQueueTimeout(RuntimeError):
+    pass
+
+
+def _get_concurrency_limit(provider: str) -> int:
+    limits = {}
+    for item in os.getenv("LLM_CONCURRENCY_LIMITS", "").split(","):
+        name, _, value = item.partition("=")
+        if name.strip() and value.strip():
+            limits[name.strip()] = int(value)
+    limit = limits.get(provider, int(os.getenv("LLM_CONCURRENCY_LIMIT", "0")))
+    return max(limit, 0)
+
+
+def _get_queue_settings() -> tuple[float, float]:
+    timeout = float(os.getenv("LLM_QUEUE_TIMEOUT_SECONDS", "60"))
+    stale = float(os.getenv("LLM_QUEUE_STALE_SECONDS", "300"))
+    if timeout < 1:
+        timeout = 1
+    if stale < 30:
+        stale = 30
+    return timeout, stale
+
+
+# Grants free slots to waiting tickets: higher priority first, then users with the
+# fewest running and earlier-queued calls (round robin between users), then FIFO.
+_GRANT_SQL = """
+WITH running AS (
+    SELECT user_id, count(*) AS n
+    FROM adventures_llmcallticket
+    WHERE provider = %(provider)s AND granted_at IS NOT NULL
+    GROUP BY user_id
+),
+waiting AS (
+    SELECT
+        t.id,
+        t.priority,
+        COALESCE(r.n, 0)
+            + row_number() OVER (PARTITION BY t.user_id, t.priority ORDER BY t.id) AS user_load
+    FROM adventures_llmcallticket t
+    LEFT JOIN running r ON r.user_id IS NOT DISTINCT FROM t.user_id
+    WHERE t.provider = %(provider)s AND t.granted_at IS NULL
+)
+UPDATE adventures_llmcallticket
+SET granted_at = now()
+WHERE id IN (
+    SELECT id FROM waiting ORDER BY priority DESC, user_load, id LIMIT %(free)s
+)
+"""
+
+
+class ConcurrencyLimitedLLMClient(LLMClient):
+    """Caps in-flight calls to one provider across all processes.
+
+    Each call inserts a ticket into `adventures_llmcallticket` and polls until granted.
+    Grants are decided under a transaction-scoped advisory lock per provider, so
+    only one process hands out slots at a time. Tickets of crashed processes stop
+    heartbeating and are expired after `LLM_QUEUE_STALE_SECONDS`.
+
+    `generate` accepts `priority` (PRIORITY_INTERACTIVE by default, or
+    PRIORITY_BACKGROUND) and `user_id`; the time spent queued is returned as
+    `queue_wait_ms`.
+    """
+
+    def __init__(self, inner: LLMClient, limit: int) -> None:
+        super().__init__(
+            model=inner.model,
+            temperature=inner.temperature,
+            max_tokens=inner.max_tokens,
+            tokenizer=inner.tokenizer,
+        )
+        self.inner = inner
+        self.limit = limit
+        self.provider_name = inner.provider_name
+        self.json_mode = inner.json_mode
+
+    def _try_grant(self, ticket_id: int, stale_seconds: float) -> bool:
+        from django.db import connection, transaction
+
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT pg_advisory_xact_lock(hashtext(%s))", [f"llm:{self.provider_name}"]
+                )
+                cursor.execute(
+                    "DELETE FROM adventures_llmcallticket WHERE provider = %s "
+                    "AND COALESCE(granted_at, heartbeat_at) < now() - make_interval(secs => %s)",
+                    [self.provider_name, stale_seconds],
+                )
+                cursor.execute(
+                    "SELECT count(*) FROM adventures_llmcallticket "
+                    "WHERE provider = %s AND granted_at IS NOT NULL",
+                    [self.provider_name],
+                )
+                free = self.limit - cursor.fetchone()[0]
+                if free > 0:
+                    cursor.execute(_GRANT_SQL, {"provider": self.provider_name, "free": free})
+                cursor.execute(
+                    "UPDATE adventures_llmcallticket SET heartbeat_at = now() "
+                    "WHERE id = %s RETURNING granted_at IS NOT NULL",
+                    [ticket_id],
+                )
+                row = cursor.fetchone()
+        if row is None:
+            raise LLMQueueTimeout("LLM queue ticket expired.")
+        return row[0]
+
+    def generate(self, prompt: str, system: Optional[str] = None, **kwargs) -> LLMResponse:
+        from django.db import connection
+
+        from adventures.models import LLMCallTicket
+
+        priority = kwargs.pop("priority", PRIORITY_INTERACTIVE)
+        user_id = kwargs.pop("user_id", None)
+        if connection.in_atomic_block:
+            # Tickets written inside an open transaction are invisible to other
+            # processes, so the queue cannot work here; call through unthrottled.
+            return self.inner.generate(prompt, system=system, **kwargs)
+        timeout, stale_seconds = _get_queue_settings()
+        started = time.monotonic()
+        ticket = LLMCallTicket.objects.create(
+            provider=self.provider_name, user_id=user_id, priority=priority
+        )
+        try:
+            delay = 0.02
+            while not self._try_grant(ticket.id, stale_seconds):
+                if time.monotonic() - started > timeout:
+                    raise LLMQueueTimeout("Timed out waiting for a free LLM slot.")
+                time.sleep(delay)
+                delay = min(delay * 2, 0.5)
+            queue_wait_ms = round((time.monotonic() - started) * 1000)
+            response = self.inner.generate(prompt, system=system, **kwargs)
+        finally:
+            LLMCallTicket.objects.filter(id=ticket.id).delete()
+        return replace(response, queue_wait_ms=queue_wait_ms)
+
+
+class CircuitBreaker:
+    """Error-rate breaker over the last `window` calls of one provider.
+
+    Once at least `min_calls` outcomes are recorded and the error rate reaches
+    `error_rate`, the breaker opens for `cooldown_seconds`; after that a single
+    trial call is let through (half-open) and its outcome closes or re-opens it.
+    """
+
+    def __init__(
+        self,
+        window: int = 20,
+        error_rate: float = 0.5,
+        min_calls: int = 5,
+        cooldown_seconds: float = 30.0,
+    ) -> None:
+        self.error_rate = error_rate
+        self.min_calls = min_calls
+        self.cooldown_seconds = cooldown_seconds
+        self.outcomes: "deque[bool]" = deque(maxlen=window)
+        self.opened_at: Optional[float] = None
+        self.trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.cooldown_seconds:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self.trial_in_flight:
+            self.trial_in_flight = True
+            return True
+        return False
+
+    def record(self, success: bool) -> None:
+        self.outcomes.append(success)
+        if self.opened_at is not None:
+            self.trial_in_flight = False
+            if success:
+                self.opened_at = None
+                self.outcomes.clear()
+            else:
+                self.opened_at = time.monotonic()
+            return
+        failures = self.outcomes.count(False)
+        if len(self.outcomes) >= self.min_calls and failures / len(self.outcomes) >= self.error_rate:
+            self.opened_at = time.monotonic()
+
+
+class _ProviderHealth:
+    """Breaker and recent successful latencies of one provider, shared across requests."""
+
+    def __init__(self, breaker: CircuitBreaker, samples: int = 200) -> None:
+        self.breaker = breaker
+        self.latencies: "deque[float]" = deque(maxlen=samples)
+        self.calls = 0
+        self.failures = 0
+        self.hedges = 0
+
+    def p95(self) -> Optional[float]:
+        if len(self.latencies) < 10:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, math.ceil(len(ordered) * 0.95) - 1)]
+
+
+_health_lock = threading.Lock()
+_provider_health: dict[str, _ProviderHealth] = {}
+_hedge_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _get_failover_settings() -> tuple[bool, float, float, int]:
+    hedge = os.getenv("LLM_HEDGE_ENABLED", "True") == "True"
+    initial_delay = float(os.getenv("LLM_HEDGE_INITIAL_DELAY_MS", "3000")) / 1000
+    min_delay = float(os.getenv("LLM_HEDGE_MIN_DELAY_MS", "500")) / 1000
+    workers = int(os.getenv("LLM_HEDGE_WORKERS", "8"))
+    if min_delay < 0:
+        min_delay = 0
+    if workers < 2:
+        workers = 2
+    return hedge, initial_delay, min_delay, workers
+
+
+def _get_health(provider: str) -> _ProviderHealth:
+    with _health_lock:
+        return _get_health_unlocked(provider)
+
+
+def _get_health_unlocked(provider: str) -> _ProviderHealth:
+    health = _provider_health.get(provider)
+    if health is None:
+        health = _ProviderHealth(
+            CircuitBreaker(
+                window=int(os.getenv("LLM_BREAKER_WINDOW", "20")),
+                error_rate=float(os.getenv("LLM_BREAKER_ERROR_RATE", "0.5")),
+                min_calls=int(os.getenv("LLM_BREAKER_MIN_CALLS", "5")),
+                cooldown_seconds=float(os.getenv("LLM_BREAKER_COOLDOWN_SECONDS", "30")),
+            )
+        )
+        _provider_health[provider] = health
+    return health
+
+
+def _get_hedge_executor(workers: int) -> ThreadPoolExecutor:
+    global _hedge_executor
+    with _health_lock:
+        if _hedge_executor is None:
+            _hedge_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="llm-hedge")
+        return _hedge_executor
+
+
+def get_llm_provider_stats() -> dict[str, dict]:
+    with _health_lock:
+        return {
+            provider: {
+                "state": health.breaker.state,
+                "calls": health.calls,
+                "failures": health.failures,
+                "hedges": health.hedges,
+                "p95_ms": round(health.p95() * 1000) if health.p95() is not None else None,
+            }
+            for provider, health in _provider_health.items()
+        }
+
+
+class FailoverLLMClient(LLMClient):
+    """Tries providers in order, skipping those whose circuit breaker is open.
+
+    With hedging enabled, a backup call to the next provider is fired once the
+    current one has been silent for its recent p95 latency; the first non-empty
+    answer wins and the slower call is left to finish in the background. A
+    failed call falls over to the next provider immediately.
+    """
+
+    def __init__(self, clients: list[LLMClient]) -> None:
+        primary = clients[0]
+        super().__init__(
+            model=primary.model,
+            temperature=primary.temperature,
+            max_tokens=primary.max_tokens,
+            tokenizer=primary.tokenizer,
+        )
+        self.clients = clients
+        self.provider_name = "+".join(client.provider_name for client in clients)
+        # A request may land on any provider, so native JSON counts only if all have it.
+        self.json_mode = max((client.json_mode for client in clients), key=JSON_MODES.index)
+
+    def _call(self, client: LLMClient, prompt: str, system: Optional[str], kwargs: dict) -> LLMResponse:
+        from django.db import connections
+
+        health = _get_health(client.provider_name)
+        started = time.monotonic()
+        try:
+            response = client.generate(prompt, system=system, **kwargs)
+            if not response.text.strip():
+                raise ValueError("Empty model response.")
+        except Exception:
+            with _health_lock:
+                health.calls += 1
+                health.failures += 1
+                health.breaker.record(False)
+            raise
+        finally:
+            # Runs on a pool thread: drop connections the concurrency limiter opened.
+            connections.close_all()
+        with _health_lock:
+            health.calls += 1
+            health.latencies.append(time.monotonic() - started)
+            health.breaker.record(True)
+        return response
+
+    def _hedge_delay(self, client: LLMClient, initial_delay: float, min_delay: float) -> float:
+        p95 = _get_health(client.provider_name).p95()
+        return initial_delay if p95 is None else max(min_delay, p95)
+
+    def generate(self, prompt: str, system: Optional[str] = None, **kwargs) -> LLMResponse:
+        hedge, initial_delay, min_delay, workers = _get_failover_settings()
+        with _health_lock:
+            candidates = [
+                client
+                for client in self.clients
+                if _get_health_unlocked(client.provider_name).breaker.state != "open"
+            ]
+        # Every breaker open: still try the providers rather than refuse outright.
+        forced = not candidates
+        candidates = candidates or list(self.clients)
+        executor = _get_hedge_executor(workers)
+        pending = {}
+        last_error: Optional[Exception] = None
+        next_index = 0
+        hedge_at = None
+        launched: Optional[LLMClient] = None
+
+        def launch() -> bool:
+            """Submit the next candidate its breaker lets through; False when none is left.
+
+            `allow()` is asked only here, so a half-open trial is claimed only by a
+            call that is actually made and therefore always recorded.
+            """
+            nonlocal next_index, hedge_at, launched
+            while next_index < len(candidates):
+                client = candidates[next_index]
+                next_index += 1
+                with _health_lock:
+                    allowed = forced or _get_health_unlocked(client.provider_name).breaker.allow()
+                if not allowed:
+                    continue
+                pending[executor.submit(self._call, client, prompt, system, dict(kwargs))] = client
+                hedge_at = time.monotonic() + self._hedge_delay(client, initial_delay, min_delay)
+                launched = client
+                return True
+            return False
+
+        launch()
+        while pending:
+            timeout = None
+            if hedge and next_index < len(candidates):
+                timeout = max(0.0, hedge_at - time.monotonic())
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                slow = launched
+                if launch():
+                    with _health_lock:
+                        _get_health_unlocked(slow.provider_name).hedges += 1
+                continue
+            for future in done:
+                pending.pop(future)
+                try:
+                    return future.result()
+                except Exception as exc:
+                    last_error = exc
+            if not pending:
+                launch()
+        raise last_error or ValueError("No LLM provider is available.")
+
+
+class _ResponseCache:
+    """Process-wide LRU of responses with a TTL, shared by all caching clients."""
+
+    def __init__(self, capacity: int = 256) -> None:
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, tuple[float, LLMResponse]]" = OrderedDict()
+        self.stats = {"memory_hits": 0, "db_hits": 0, "misses": 0, "bypassed": 0, "discarded": 0}
+
+    def resize(self, capacity: int) -> None:
+        with self._lock:
+            self.capacity = capacity
+            while len(self._entries) > capacity:
+                self._entries.popitem(last=False)
+
+    def count(self, stat: str) -> None:
+        with self._lock:
+            self.stats[stat] += 1
+
+    def get(self, key: str) -> Optional[LLMResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, response = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return response
+
+    def set(self, key: str, response: LLMResponse, ttl_seconds: int) -> None:
+        if self.capacity <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl_seconds, response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def snapshot(self) -> dict[str, int]:
+        with self._lock:
+            return {**self.stats, "size": len(self._entries), "capacity": self.capacity}
+
+
+_response_cache = _ResponseCache()
+
+# Arguments that do not change the completion and therefore stay out of the cache key.
+_CACHE_IGNORED_KWARGS = {"use_cache", "priority", "user_id"}
+
+
+class CachingLLMClient(LLMClient):
+    """Caches responses of another client by provider, model, prompt, system and sampling params.
+
+    Lookups go to the in-process LRU first, then to the optional database tier (the
+    `llm` Django cache). Caching is opt-in per call with `generate(..., use_cache=True)`
+    and meant for deterministic calls such as card updates and summaries; sampled
+    story text is never cached, so a rollback or a repeated prompt gets a fresh answer.
+    """
+
+    def __init__(self, inner: LLMClient, ttl_seconds: int = 86400, db_cache: bool = False) -> None:
+        super().__init__(
+            model=inner.model,
+            temperature=inner.temperature,
+            max_tokens=inner.max_tokens,
+            tokenizer=inner.tokenizer,
+        )
+        self.inner = inner
+        self.provider_name = inner.provider_name
+        self.json_mode = inner.json_mode
+        self.ttl_seconds = ttl_seconds
+        self.db_cache = db_cache
+
+    def cache_key(self, prompt: str, system: Optional[str], kwargs: dict) -> str:
+        params = {key: value for key, value in kwargs.items() if key not in _CACHE_IGNORED_KWARGS}
+        params.setdefault("temperature", self.temperature)
+        params.setdefault("max_tokens", self.max_tokens)
+        material = json.dumps(
+            [self.provider_name, self.model, system or "", prompt, params],
+            ensure_ascii=False,
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def _db_get(self, key: str) -> Optional[LLMResponse]:
+        from django.core.cache import caches
+        from django.db import DatabaseError
+
+        try:
+            return caches["llm"].get(key)
+        except DatabaseError:
+            return None
+
+    def _db_set(self, key: str, response: LLMResponse) -> None:
+        from django.core.cache import caches
+        from django.db import DatabaseError
+
+        try:
+            caches["llm"].set(key, response, timeout=self.ttl_seconds)
+        except DatabaseError:
+            pass
+
+    def generate(self, prompt: str, system: Optional[str] = None, **kwargs) -> LLMResponse:
+        if not kwargs.pop("use_cache", False):
+            _response_cache.count("bypassed")
+            return self.inner.generate(prompt, system=system, **kwargs)
+        key = self.cache_key(prompt, system, kwargs)
+        cached = _response_cache.get(key)
+        if cached is not None:
+            _response_cache.count("memory_hits")
+            return replace(cached, cache_key=key, cache_hit=True)
+        if self.db_cache:
+            cached = self._db_get(key)
+            if cached is not None:
+                _response_cache.count("db_hits")
+                _response_cache.set(key, cached, self.ttl_seconds)
+                return replace(cached, cache_key=key, cache_hit=True)
+        _response_cache.count("misses")
+        response = replace(self.inner.generate(prompt, system=system, **kwargs), cache_key=key)
+        if response.text.strip():
+            _response_cache.set(key, response, self.ttl_seconds)
+            if self.db_cache:
+                self._db_set(key, response)
+        return response
+
+    def discard_cached(self, response: LLMResponse) -> None:
+        if not response.cache_key:
+            return
+        _response_cache.delete(response.cache_key)
+        if self.db_cache:
+            from django.core.cache import caches
+            from django.db import DatabaseError
+
+            try:
+                caches["llm"].delete(response.cache_key)
+            except DatabaseError:
+                pass
+        _response_cache.count("discarded")
+
+
+def get_llm_cache_stats() -> dict[str, int]:
+    return _response_cache.snapshot()
+
+
+def _with_response_cache(client: LLMClient) -> LLMClient:
+    size = int(os.getenv("LLM_CACHE_SIZE", "256"))
+    db_cache = os.getenv("LLM_CACHE_DB", "False") == "True"
+    ttl_seconds = int(os.getenv("LLM_CACHE_TTL_SECONDS", "86400"))
+    if size < 0:
+        size = 0
+    if ttl_seconds < 1:
+        ttl_seconds = 1
+    _response_cache.resize(size)
+    if size == 0 and not db_cache:
+        return client
+    return CachingLLMClient(client, ttl_seconds=ttl_seconds, db_cache=db_cache)
+
+
+def _resolve_providers() -> list[str]:
+    providers = [name.strip() for name in os.getenv("LLM_PROVIDERS", "").split(",") if name.strip()]
+    if providers:
+        return providers
     provider = os.getenv("LLM_PROVIDER")
     if not provider and os.getenv("OLLAMA_URL"):
         provider = "ollama"
     if not provider and os.getenv("YANDEX_CLOUD_API_KEY"):
         provider = "yandex"
-    provider = provider or "local"
+    return [provider or "local"]
+
+
+def _build_provider_client(provider: str) -> LLMClient:
     model = os.getenv("LLM_MODEL", "local-echo")
     temperature = float(os.getenv("LLM_TEMPERATURE", "0.7"))
     max_tokens = int(os.getenv("LLM_MAX_TOKENS", "512"))
 
     if provider == "local":
-        return LocalEchoLLMClient(model=model, temperature=temperature, max_tokens=max_tokens)
+        return LocalEchoLLMClient(
+            model=model,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            tokenizer=get_tokenizer(provider, model),
+        )
     if provider == "openai-compatible":
         return OpenAICompatibleLLMClient(
             model=model,
@@ -230,14 +1042,21 @@ def get_llm_client() -> LLMClient:
             temperature=temperature,
             max_tokens=max_tokens,
             timeout_seconds=float(os.getenv("LLM_TIMEOUT_SECONDS", "30")),
+            tokenizer=get_tokenizer(provider, model),
+            prompt_cache_key=os.getenv("LLM_PROMPT_CACHE_KEY", "False") == "True",
+            json_mode=get_json_mode(),
         )
     if provider == "ollama":
+        ollama_model = os.getenv("OLLAMA_MODEL", model)
         return OllamaLLMClient(
-            model=os.getenv("OLLAMA_MODEL", model),
+            model=ollama_model,
             base_url=os.getenv("OLLAMA_URL", ""),
             temperature=temperature,
             max_tokens=max_tokens,
             timeout_seconds=float(os.getenv("LLM_TIMEOUT_SECONDS", "30")),
+            tokenizer=get_tokenizer(provider, ollama_model),
+            keep_alive=os.getenv("OLLAMA_KEEP_ALIVE", ""),
+            json_mode=get_json_mode(),
         )
     if provider == "yandex":
         folder_id = os.getenv("YC_FOLDER_ID", "") or os.getenv("YANDEX_CLOUD_FOLDER", "")
@@ -250,5 +1069,24 @@ def get_llm_client() -> LLMClient:
             temperature=temperature,
             max_tokens=max_tokens,
             timeout_seconds=float(os.getenv("LLM_TIMEOUT_SECONDS", "30")),
+            tokenizer=get_tokenizer(provider, model_uri),
+            json_mode=get_json_mode(),
         )
     raise ValueError(f"Unknown LLM_PROVIDER: {provider}")
+
+
+def _build_limited_client(provider: str) -> LLMClient:
+    client = _build_provider_client(provider)
+    limit = _get_concurrency_limit(client.provider_name)
+    if limit == 0:
+        return client
+    return ConcurrencyLimitedLLMClient(client, limit)
+
+
+def get_llm_client() -> LLMClient:
+    providers = _resolve_providers()
+    if len(providers) == 1:
+        return _with_response_cache(_build_limited_client(providers[0]))
+    return _with_response_cache(
+        FailoverLLMClient([_build_limited_client(provider) for provider in providers])
+    )
@@ -0,0 +1,158 @@
+"""
+Minimal in-process metrics with Prometheus text exposition.
+
+Metrics are kept per process: with several gunicorn workers every scrape sees the
+worker that served it, so scrape each worker or aggregate by `instance`.
+"""
+from __future__ import annotations
+
+import bisect
+import math
+import threading
+from typing import Callable, Iterable
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_lock = threading.Lock()
+_metrics: dict[str, "_Metric"] = {}
+_collectors: list[Callable[[], Iterable[tuple[str, str, str, dict, float]]]] = []
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    parts = []
+    for key, value in sorted(labels.items()):
+        escaped = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{key}="{escaped}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple[str, ...]) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def samples(self) -> list[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple[str, ...] = ()) -> None:
+        super().__init__(name, help_text, labelnames)
+        self.values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with _lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+    def samples(self) -> list[str]:
+        return [
+            f"{self.name}{_format_labels(dict(zip(self.labelnames, key)))} {_format_value(value)}"
+            for key, value in sorted(self.values.items())
+        ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.values: dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with _lock:
+            state = self.values.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def samples(self) -> list[str]:
+        lines = []
+        for key, (counts, total, count) in sorted(self.values.items()):
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                bucket_labels = _format_labels({**labels, "le": _format_value(bound)})
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': '+Inf'})} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+def _register(metric: _Metric) -> _Metric:
+    with _lock:
+        existing = _metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        _metrics[metric.name] = metric
+        return metric
+
+
+def counter(name: str, help_text: str, labelnames: tuple[str, ...] = ()) -> Counter:
+    return _register(Counter(name, help_text, labelnames))
+
+
+def histogram(
+    name: str,
+    help_text: str,
+    labelnames: tuple[str, ...] = (),
+    buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+) -> Histogram:
+    return _register(Histogram(name, help_text, labelnames, buckets))
+
+
+def register_collector(
+    collector: Callable[[], Iterable[tuple[str, str, str, dict, float]]],
+) -> None:
+    """Add a callback yielding `(name, kind, help, labels, value)` samples at scrape time."""
+    with _lock:
+        if collector not in _collectors:
+            _collectors.append(collector)
+
+
+def render() -> str:
+    with _lock:
+        metrics = sorted(_metrics.values(), key=lambda metric: metric.name)
+        blocks = []
+        for metric in metrics:
+            blocks.append(f"# HELP {metric.name} {metric.help_text}")
+            blocks.append(f"# TYPE {metric.name} {metric.kind}")
+            blocks.extend(metric.samples())
+        collectors = list(_collectors)
+    described = set()
+    for collector in collectors:
+        for name, kind, help_text, labels, value in collector():
+            if name not in described:
+                blocks.append(f"# HELP {name} {help_text}")
+                blocks.append(f"# TYPE {name} {kind}")
+                described.add(name)
+            blocks.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+    return "\n".join(blocks) + "\n"
@@ -0,0 +1,141 @@
+"""
+Per-request SQL accounting for development and staging.
+
+`QueryBudgetMiddleware` counts queries and database time of every request, adds
+`X-DB-Queries` and `X-DB-Time` (milliseconds) headers, and reports SQL shapes
+repeated within one request (the usual N+1 pattern) in `X-DB-Duplicates` and the
+log. Views declare their budget as a class attribute:
+
+    class AdventureRunStartView(APIView):
+        query_budget = 40                      # any method
+        query_budget = {"GET": 5, "POST": 40}  # per method
+
+A request over budget is logged, or raises `QueryBudgetExceeded` with
+`QUERY_BUDGET_STRICT=True`, so tests and staging fail loudly. Under
+`manage.py test` the middleware is enabled and strict by default.
+"""
+from __future__ import annotations
+
+from collections import Counter
+from contextlib import ExitStack
+import logging
+import os
+import re
+import time
+from typing import Optional
+
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from backend import metrics
+
+logger = logging.getLogger(__name__)
+
+_IN_LIST_RE = re.compile(r"\((?:%s|\?)(?:\s*,\s*(?:%s|\?))+\)")
+_NUMBER_RE = re.compile(r"\b\d+\b")
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+
+DB_QUERIES = metrics.histogram(
+    "http_request_db_queries",
+    "SQL queries per request.",
+    ("view",),
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000),
+)
+DB_SECONDS = metrics.histogram("http_request_db_seconds", "Database time per request.", ("view",))
+BUDGET_EXCEEDED = metrics.counter(
+    "http_request_query_budget_exceeded_total", "Requests over their query budget.", ("view",)
+)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def _get_query_budget_settings() -> tuple[bool, bool, int]:
+    from django.conf import settings
+
+    testing = getattr(settings, "TESTING", False)
+    enabled = os.getenv("QUERY_BUDGET_ENABLED", str(settings.DEBUG or testing)) == "True"
+    strict = os.getenv("QUERY_BUDGET_STRICT", str(testing)) == "True"
+    duplicate_threshold = max(2, int(os.getenv("QUERY_BUDGET_DUPLICATE_THRESHOLD", "5")))
+    return enabled, strict, duplicate_threshold
+
+
+def sql_shape(sql: str) -> str:
+    """SQL with literals and IN-lists collapsed, so repeated lookups compare equal."""
+    shape = _STRING_RE.sub("?", sql)
+    shape = _NUMBER_RE.sub("?", shape)
+    return _IN_LIST_RE.sub("(...)", shape)
+
+
+class _QueryLog:
+    def __init__(self) -> None:
+        self.count = 0
+        self.seconds = 0.0
+        self.shapes: Counter[str] = Counter()
+        self.view_class = None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.count += 1
+            self.shapes[sql_shape(sql)] += 1
+
+    def duplicates(self, threshold: int) -> list[tuple[str, int]]:
+        return [(shape, count) for shape, count in self.shapes.most_common() if count >= threshold]
+
+
+def get_query_budget(view_class, method: str) -> Optional[int]:
+    budget = getattr(view_class, "query_budget", None)
+    if isinstance(budget, dict):
+        return budget.get(method)
+    return budget
+
+
+class QueryBudgetMiddleware:
+    def __init__(self, get_response) -> None:
+        enabled, self.strict, self.duplicate_threshold = _get_query_budget_settings()
+        if not enabled:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        log = _QueryLog()
+        request._query_log = log
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(log))
+            response = self.get_response(request)
+
+        view_name = log.view_class.__name__ if log.view_class else "-"
+        response["X-DB-Queries"] = str(log.count)
+        response["X-DB-Time"] = f"{log.seconds * 1000:.1f}"
+        DB_QUERIES.observe(log.count, view=view_name)
+        DB_SECONDS.observe(log.seconds, view=view_name)
+
+        duplicates = log.duplicates(self.duplicate_threshold)
+        if duplicates:
+            response["X-DB-Duplicates"] = str(sum(count for _, count in duplicates))
+            for shape, count in duplicates:
+                logger.warning("Repeated query (%sx) in %s %s: %.300s", count, request.method, request.path, shape)
+
+        budget = get_query_budget(log.view_class, request.method) if log.view_class else None
+        if budget is not None and log.count > budget:
+            BUDGET_EXCEEDED.inc(view=view_name)
+            message = (
+                f"{view_name} {request.method} {request.path} ran {log.count} queries, "
+                f"budget is {budget}"
+            )
+            if self.strict:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        log = getattr(request, "_query_log", None)
+        if log is not None:
+            log.view_class = getattr(view_func, "view_class", None) or getattr(view_func, "cls", None)
+        return None
@@ -9,6 +9,7 @@ provided with the expected variables.
 from __future__ import annotations
 
 import os
+import sys
 from datetime import timedelta
 from pathlib import Path
 
@@ -26,6 +27,9 @@ SECRET_KEY = os.getenv('DJANGO_SECRET_KEY', 'replace_me_in_prod')
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = os.getenv('DJANGO_DEBUG', 'True') == 'True'
 
+# `manage.py test` forces DEBUG off; features that default to DEBUG check this too.
+TESTING = sys.argv[1:2] == ['test']
+
 ALLOWED_HOSTS: list[str] = os.getenv('DJANGO_ALLOWED_HOSTS', '*').split(',')
 
 # Application definition
@@ -46,6 +50,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'backend.query_budget.QueryBudgetMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -165,3 +170,17 @@ LLM_API_KEY = os.getenv('LLM_API_KEY', '')
 LLM_TEMPERATURE = float(os.getenv('LLM_TEMPERATURE', '0.7'))
 LLM_MAX_TOKENS = int(os.getenv('LLM_MAX_TOKENS', '512'))
 LLM_TIMEOUT_SECONDS = float(os.getenv('LLM_TIMEOUT_SECONDS', '30'))
+
+# Optional shared tier of the LLM response cache (see backend.llm.CachingLLMClient).
+# The table is created by `python manage.py createcachetable`.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'llm': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'llm_response_cache',
+        'TIMEOUT': int(os.getenv('LLM_CACHE_TTL_SECONDS', '86400')),
+        'OPTIONS': {'MAX_ENTRIES': int(os.getenv('LLM_CACHE_DB_MAX_ENTRIES', '10000'))},
+    },
+}
@@ -20,6 +20,8 @@ from rest_framework_simplejwt.views import TokenRefreshView
 
 from users.views import EmailOrUsernameTokenObtainPairView
 
+from .views import metrics_view
+
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -29,4 +31,6 @@ urlpatterns = [
     # User registration endpoint
     path('api/users/', include('users.urls')),
     path('api/adventures/', include('adventures.urls')),
+    # Prometheus metrics (protected by METRICS_TOKEN, open only with DEBUG)
+    path('metrics', metrics_view, name='metrics'),
 ]
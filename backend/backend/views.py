@@ -0,0 +1,28 @@
+"""Project-level views that do not belong to an app."""
+from __future__ import annotations
+
+import hmac
+import os
+
+from django.conf import settings
+from django.http import HttpRequest, HttpResponse
+from django.views.decorators.http import require_GET
+
+from . import metrics
+
+
+@require_GET
+def metrics_view(request: HttpRequest) -> HttpResponse:
+    """Prometheus scrape endpoint; requires `Authorization: Bearer <METRICS_TOKEN>`.
+
+    Without a configured token the endpoint is closed, except with DEBUG on.
+    """
+    token = os.getenv("METRICS_TOKEN", "")
+    if not token:
+        if not settings.DEBUG:
+            return HttpResponse(status=403)
+    else:
+        provided = request.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+        if not hmac.compare_digest(provided, token):
+            return HttpResponse(status=401)
+    return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,6 @@
+"""
+Benchmarks for the backend hot paths.
+
+Run them with `python manage.py run_benchmarks` against a local PostgreSQL. All
+seeded data lives in a transaction that is rolled back at the end.
+"""
@@ -0,0 +1,147 @@
+"""
+Benchmark cases.
+
+Each case receives the seeded `BenchmarkContext`, prepares its inputs (untimed)
+and returns the callable to measure.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+import json
+from typing import Callable, Optional
+
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from adventures.models import (
+    Adventure,
+    AdventureEvent,
+    AdventureHistory,
+    Character,
+    CharacterSystem,
+)
+from adventures.views import (
+    AdventureRunHistoryPdfView,
+    AdventureRunStartView,
+    AdventureTemplateExportView,
+    AdventureTemplateImportView,
+)
+from adventures.views.history_utils import _apply_card_updates, _prepare_history_for_prompt
+from adventures.views.prompts import _build_generation_prompt
+from backend.llm import LLMClient, LLMResponse
+
+from .worldgen import WorldSize, generate_template
+
+CASES: dict[str, Callable[["BenchmarkContext"], Callable[[], object]]] = {}
+
+
+def case(name: str):
+    def register(func):
+        CASES[name] = func
+        return func
+
+    return register
+
+
+class BenchmarkLLMClient(LLMClient):
+    """Answers instantly so that only the backend's own work is measured."""
+
+    provider_name = "benchmark"
+    json_mode = "object"
+
+    def generate(self, prompt: str, system: Optional[str] = None, **kwargs) -> LLMResponse:
+        if kwargs.get("response_format") is not None:
+            text = json.dumps(
+                {"events": [], "characters": [], "character_systems": [], "character_techniques": []}
+            )
+        else:
+            text = "Герой продолжил путь, и события сложились в короткий пересказ."
+        return LLMResponse(text=text, provider=self.provider_name)
+
+
+@dataclass
+class BenchmarkContext:
+    user: object
+    template: Adventure
+    run: Adventure
+    size: WorldSize
+    factory: APIRequestFactory = field(default_factory=APIRequestFactory)
+
+    def call_view(self, view_class, method: str, path: str, data=None, **kwargs):
+        request = getattr(self.factory, method)(path, data, format="json")
+        force_authenticate(request, user=self.user)
+        response = view_class.as_view()(request, **kwargs)
+        render = getattr(response, "render", None)
+        if render is not None:
+            render()
+        if response.status_code >= 400:
+            raise RuntimeError(f"{view_class.__name__} returned {response.status_code}: {response.content[:300]!r}")
+        return response
+
+
+@case("run_start")
+def run_start(ctx: BenchmarkContext):
+    template_id = ctx.template.id
+    return lambda: ctx.call_view(
+        AdventureRunStartView, "post", f"/api/adventures/templates/{template_id}/start/", template_id=template_id
+    )
+
+
+@case("template_export")
+def template_export(ctx: BenchmarkContext):
+    template_id = ctx.template.id
+    return lambda: ctx.call_view(
+        AdventureTemplateExportView, "get", f"/api/adventures/templates/{template_id}/export/", template_id=template_id
+    )
+
+
+@case("template_import")
+def template_import(ctx: BenchmarkContext):
+    payload = template_export(ctx)().data
+    return lambda: ctx.call_view(AdventureTemplateImportView, "post", "/api/adventures/templates/import/", payload)
+
+
+@case("world_bulk_insert")
+def world_bulk_insert(ctx: BenchmarkContext):
+    """Bulk inserts of every card and link table, where consistency triggers run per batch."""
+    return lambda: generate_template(ctx.user, ctx.size, seed=1)
+
+
+@case("generation_prompt")
+def generation_prompt(ctx: BenchmarkContext):
+    history_entries = list(AdventureHistory.objects.filter(adventure=ctx.run).order_by("-id")[:40])[::-1]
+    return lambda: _build_generation_prompt(ctx.run, history_entries)
+
+
+@case("prepare_history")
+def prepare_history(ctx: BenchmarkContext):
+    client = BenchmarkLLMClient(model="benchmark")
+    run = Adventure.objects.get(id=ctx.run.id)
+    return lambda: _prepare_history_for_prompt(run, client)
+
+
+@case("apply_card_updates")
+def apply_card_updates(ctx: BenchmarkContext):
+    payload = {
+        "events": [
+            {"id": event_id, "status": "active", "state": "Событие развивается."}
+            for event_id in AdventureEvent.objects.filter(adventure=ctx.run).values_list("id", flat=True)[:50]
+        ],
+        "characters": [
+            {"id": character_id, "description": "Персонаж изменился.", "body_power": 5, "mind_power_progress": 50}
+            for character_id in Character.objects.filter(adventure=ctx.run).values_list("id", flat=True)[:50]
+        ],
+        "character_systems": [
+            {"id": record_id, "level": 6, "progress_percent": 10}
+            for record_id in CharacterSystem.objects.filter(adventure=ctx.run).values_list("id", flat=True)[:50]
+        ],
+        "character_techniques": [],
+    }
+    return lambda: _apply_card_updates(ctx.run, payload)
+
+
+@case("history_pdf")
+def history_pdf(ctx: BenchmarkContext):
+    run_id = ctx.run.id
+    return lambda: ctx.call_view(
+        AdventureRunHistoryPdfView, "get", f"/api/adventures/runs/{run_id}/history/pdf/", run_id=run_id
+    )
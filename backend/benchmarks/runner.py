@@ -0,0 +1,148 @@
+"""Measurement, seeding and baseline comparison for the benchmark suite."""
+from __future__ import annotations
+
+import json
+from pathlib import Path
+import statistics
+import time
+import tracemalloc
+from typing import Iterable, Optional
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from adventures.models import AdventureHistory
+
+from .cases import CASES, BenchmarkContext
+from .worldgen import WorldSize, generate_run, generate_template
+
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baseline.json"
+
+# Differences below these floors are treated as noise regardless of the tolerance.
+WALL_NOISE_MS = 5.0
+MEMORY_NOISE_KIB = 256.0
+
+
+def seed_context(size: WorldSize, seed: int) -> BenchmarkContext:
+    """Seed a template and a run of it with `size.history` entries."""
+    user = get_user_model().objects.create_user(
+        username=f"benchmark_{seed}_{time.time_ns()}",
+        email=f"benchmark_{seed}_{time.time_ns()}@example.com",
+        password=None,
+    )
+    template = generate_template(user, size, seed=seed)
+    run = generate_run(template, user, size, seed=seed)
+    return BenchmarkContext(user=user, template=template, run=run, size=size)
+
+
+def _measure_case(name: str, ctx: BenchmarkContext, repeat: int) -> dict:
+    """Median wall time, query count and peak Python memory of one case.
+
+    Every pass runs in its own savepoint, so passes see identical data. Memory is
+    measured in a separate pass because tracemalloc slows the code down.
+    """
+    timings = []
+    queries = []
+    for _ in range(repeat):
+        savepoint = transaction.savepoint()
+        try:
+            func = CASES[name](ctx)
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                func()
+                timings.append((time.perf_counter() - started) * 1000)
+            queries.append(len(captured))
+        finally:
+            transaction.savepoint_rollback(savepoint)
+
+    savepoint = transaction.savepoint()
+    try:
+        func = CASES[name](ctx)
+        tracemalloc.start()
+        try:
+            func()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    finally:
+        transaction.savepoint_rollback(savepoint)
+
+    return {
+        "wall_ms": round(statistics.median(timings), 2),
+        "min_ms": round(min(timings), 2),
+        "queries": max(queries),
+        "peak_kib": round(peak / 1024, 1),
+    }
+
+
+def run_suite(
+    size_name: str,
+    size: WorldSize,
+    names: Iterable[str],
+    repeat: int = 5,
+    seed: int = 0,
+    progress=None,
+) -> dict:
+    """Seed the data, measure the cases and roll everything back."""
+    results = {}
+    with transaction.atomic():
+        started = time.perf_counter()
+        ctx = seed_context(size, seed)
+        seed_seconds = time.perf_counter() - started
+        if progress:
+            progress(
+                f"seeded {size_name} world in {seed_seconds:.1f}s "
+                f"({AdventureHistory.objects.filter(adventure=ctx.run).count()} history entries)"
+            )
+        for name in names:
+            if progress:
+                progress(f"running {name}")
+            results[name] = _measure_case(name, ctx, repeat)
+        transaction.set_rollback(True)
+    return {"size": size_name, "repeat": repeat, "seed": seed, "cases": results}
+
+
+def load_baseline(path: Path) -> dict:
+    if not path.exists():
+        return {}
+    with path.open(encoding="utf-8") as handle:
+        return json.load(handle)
+
+
+def save_baseline(path: Path, report: dict) -> None:
+    """Store `report` under its size, keeping the other sizes."""
+    baseline = load_baseline(path)
+    baseline[report["size"]] = {"repeat": report["repeat"], "seed": report["seed"], "cases": report["cases"]}
+    with path.open("w", encoding="utf-8") as handle:
+        json.dump(baseline, handle, ensure_ascii=False, indent=2, sort_keys=True)
+        handle.write("\n")
+
+
+def compare_with_baseline(report: dict, baseline: dict, tolerance: float) -> Optional[list[str]]:
+    """Regressions against the baseline of the same size; `None` without a baseline.
+
+    Query counts must not grow at all; wall time and peak memory may grow by
+    `tolerance` (relative) plus a small absolute noise floor. Metrics missing from
+    the baseline are not compared: the committed baseline holds only query counts,
+    which do not depend on the machine.
+    """
+    reference = baseline.get(report["size"])
+    if not reference:
+        return None
+    regressions = []
+    for name, result in report["cases"].items():
+        base = reference["cases"].get(name)
+        if not base:
+            continue
+        if "queries" in base and result["queries"] > base["queries"]:
+            regressions.append(f"{name}: queries {base['queries']} -> {result['queries']}")
+        if "wall_ms" in base:
+            wall_limit = max(base["wall_ms"] * (1 + tolerance), base["wall_ms"] + WALL_NOISE_MS)
+            if result["wall_ms"] > wall_limit:
+                regressions.append(f"{name}: wall time {base['wall_ms']}ms -> {result['wall_ms']}ms")
+        if "peak_kib" in base:
+            memory_limit = max(base["peak_kib"] * (1 + tolerance), base["peak_kib"] + MEMORY_NOISE_KIB)
+            if result["peak_kib"] > memory_limit:
+                regressions.append(f"{name}: peak memory {base['peak_kib']}KiB -> {result['peak_kib']}KiB")
+    return regressions
@@ -0,0 +1,410 @@
+"""
+Deterministic synthetic worlds, inserted in bulk.
+
+The same seed always produces the same template, runs and history, so
+benchmarks and load tests can reproduce production-scale data locally.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass, replace
+import random
+from typing import Callable, Iterator, Optional
+
+from adventures.models import (
+    Adventure,
+    AdventureEvent,
+    AdventureHeroSetup,
+    AdventureHistory,
+    Character,
+    CharacterFaction,
+    CharacterRelationship,
+    CharacterSystem,
+    CharacterTechnique,
+    Faction,
+    Location,
+    OtherInfo,
+    Race,
+    SkillSystem,
+    Technique,
+)
+
+WORDS = (
+    "ветер туман башня тракт река мост таверна кузница храм рынок лес пещера "
+    "дракон маг страж торговец наемник жрец вор охотник старейшина посох меч "
+    "древний тайный забытый северный серебряный темный золотой каменный"
+).split()
+
+ACTIONS = (
+    "{hero} идет в {location}.",
+    "{hero} спрашивает {character} о слухах.",
+    "{hero} осматривает {location} в поисках следов.",
+    "{hero} предлагает {character} сделку.",
+    "{hero} применяет {technique}.",
+)
+
+NARRATION = (
+    "В {location} пахнет дымом, {character} настороженно следит за чужаками.",
+    "{character} рассказывает о древней башне к северу от {location}.",
+    "Прием «{technique}» срабатывает, но отдача заметно утомляет героя.",
+    "Над {location} сгущается туман, вдали звонят колокола.",
+    "{character} хмурится и просит не вмешиваться в дела фракции.",
+)
+
+RELATIONSHIP_KINDS = ("друг", "соперник", "наставник", "должник", "родственник")
+
+BATCH_SIZE = 1000
+
+# Each place occupies part of a cell of this size on the `x/y` grid.
+CELL_SIZE = 4
+
+
+@dataclass(frozen=True)
+class WorldSize:
+    locations: int
+    races: int
+    characters: int
+    systems: int
+    techniques_per_system: int
+    factions: int
+    other_info: int
+    events: int
+    history: int
+
+
+SIZES = {
+    "small": WorldSize(
+        locations=50,
+        races=5,
+        characters=30,
+        systems=5,
+        techniques_per_system=5,
+        factions=5,
+        other_info=20,
+        events=30,
+        history=200,
+    ),
+    "medium": WorldSize(
+        locations=500,
+        races=10,
+        characters=200,
+        systems=20,
+        techniques_per_system=10,
+        factions=20,
+        other_info=100,
+        events=200,
+        history=2000,
+    ),
+    "large": WorldSize(
+        locations=3000,
+        races=20,
+        characters=800,
+        systems=50,
+        techniques_per_system=20,
+        factions=50,
+        other_info=500,
+        events=1000,
+        history=20000,
+    ),
+    "huge": WorldSize(
+        locations=10000,
+        races=30,
+        characters=2000,
+        systems=100,
+        techniques_per_system=30,
+        factions=100,
+        other_info=2000,
+        events=5000,
+        history=100000,
+    ),
+}
+
+
+def resolve_size(name: str, **overrides) -> WorldSize:
+    """Preset `name` with the non-None `overrides` applied."""
+    return replace(SIZES[name], **{key: value for key, value in overrides.items() if value is not None})
+
+
+def _phrase(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def _tags(rng: random.Random) -> list[str]:
+    return rng.sample(WORDS, rng.randint(1, 3))
+
+
+def _grid_locations(adventure: Adventure, count: int, rng: random.Random) -> list[Location]:
+    """Places in non-overlapping grid cells; every 4x4 block of cells is also covered by a region."""
+    side = max(1, int(count ** 0.5))
+    region_span = 4
+    locations = []
+    for index in range(count):
+        column, row = index % side, index // side
+        if column % region_span == 0 and row % region_span == 0:
+            title = f"Регион {index} {rng.choice(WORDS)}"
+            width = height = CELL_SIZE * region_span
+            x, y = column * CELL_SIZE, row * CELL_SIZE
+        else:
+            title = f"Локация {index} {rng.choice(WORDS)}"
+            width, height = rng.randint(1, CELL_SIZE - 1), rng.randint(1, CELL_SIZE - 1)
+            x = column * CELL_SIZE + rng.randint(0, CELL_SIZE - width)
+            y = row * CELL_SIZE + rng.randint(0, CELL_SIZE - height)
+        locations.append(
+            Location(
+                adventure=adventure,
+                title=title,
+                description=_phrase(rng, 20),
+                x=x,
+                y=y,
+                width=width,
+                height=height,
+                tags=_tags(rng),
+            )
+        )
+    return Location.objects.bulk_create(locations, batch_size=BATCH_SIZE)
+
+
+def _populate(adventure: Adventure, size: WorldSize, rng: random.Random) -> list[Character]:
+    """Create every entity kind of `size` in `adventure`; returns the characters."""
+    locations = _grid_locations(adventure, size.locations, rng)
+    races = Race.objects.bulk_create(
+        [
+            Race(adventure=adventure, title=f"Раса {index}", description=_phrase(rng, 10), tags=_tags(rng))
+            for index in range(size.races)
+        ]
+    )
+    characters = Character.objects.bulk_create(
+        [
+            Character(
+                adventure=adventure,
+                title=f"Персонаж {index} {rng.choice(WORDS)}",
+                description=_phrase(rng, 25),
+                is_player=index == 0,
+                in_party=index < 3,
+                age=rng.randint(16, 90),
+                body_power=rng.randint(0, 10),
+                mind_power=rng.randint(0, 10),
+                will_power=rng.randint(0, 10),
+                race=rng.choice(races) if races else None,
+                location=rng.choice(locations) if locations else None,
+                tags=_tags(rng),
+            )
+            for index in range(size.characters)
+        ],
+        batch_size=BATCH_SIZE,
+    )
+    systems = SkillSystem.objects.bulk_create(
+        [
+            SkillSystem(
+                adventure=adventure,
+                title=f"Система {index}",
+                description=_phrase(rng, 15),
+                w_body=rng.randint(0, 3),
+                w_mind=rng.randint(1, 3),
+                w_will=rng.randint(0, 3),
+                tags=_tags(rng),
+            )
+            for index in range(size.systems)
+        ]
+    )
+    techniques = Technique.objects.bulk_create(
+        [
+            Technique(
+                adventure=adventure,
+                system=system,
+                title=f"Прием {system_index}.{index}",
+                description=_phrase(rng, 12),
+                difficulty=rng.randint(0, 10),
+                tier=rng.randint(0, 3),
+                required_system_level=rng.randint(0, 5),
+                tags=_tags(rng),
+            )
+            for system_index, system in enumerate(systems)
+            for index in range(size.techniques_per_system)
+        ],
+        batch_size=BATCH_SIZE,
+    )
+    factions = Faction.objects.bulk_create(
+        [
+            Faction(adventure=adventure, title=f"Фракция {index}", description=_phrase(rng, 15), tags=_tags(rng))
+            for index in range(size.factions)
+        ]
+    )
+    character_systems = []
+    character_techniques = []
+    character_factions = []
+    relationships = []
+    for character in characters:
+        for system in rng.sample(systems, min(len(systems), rng.randint(1, 3))):
+            character_systems.append(
+                CharacterSystem(
+                    adventure=adventure,
+                    character=character,
+                    system=system,
+                    level=rng.randint(0, 5),
+                    progress_percent=rng.randint(0, 100),
+                )
+            )
+        for technique in rng.sample(techniques, min(len(techniques), rng.randint(0, 4))):
+            character_techniques.append(
+                CharacterTechnique(adventure=adventure, character=character, technique=technique)
+            )
+        for faction in rng.sample(factions, min(len(factions), rng.randint(0, 2))):
+            character_factions.append(CharacterFaction(character=character, faction=faction))
+        others = [other for other in rng.sample(characters, min(len(characters), 3)) if other.id != character.id]
+        for other in others[: rng.randint(0, 2)]:
+            relationships.append(
+                CharacterRelationship(
+                    from_character=character,
+                    to_character=other,
+                    kind=rng.choice(RELATIONSHIP_KINDS),
+                    description=_phrase(rng, 8),
+                )
+            )
+    CharacterSystem.objects.bulk_create(character_systems, batch_size=BATCH_SIZE)
+    CharacterTechnique.objects.bulk_create(character_techniques, batch_size=BATCH_SIZE)
+    CharacterFaction.objects.bulk_create(character_factions, batch_size=BATCH_SIZE)
+    CharacterRelationship.objects.bulk_create(relationships, batch_size=BATCH_SIZE, ignore_conflicts=True)
+    OtherInfo.objects.bulk_create(
+        [
+            OtherInfo(
+                adventure=adventure,
+                category=rng.choice(("лор", "история", "география")),
+                title=f"Заметка {index}",
+                description=_phrase(rng, 40),
+                tags=_tags(rng),
+            )
+            for index in range(size.other_info)
+        ],
+        batch_size=BATCH_SIZE,
+    )
+    AdventureEvent.objects.bulk_create(
+        [
+            AdventureEvent(
+                adventure=adventure,
+                title=f"Событие {index}",
+                status=rng.choice(AdventureEvent.Status.values),
+                trigger_hint=_phrase(rng, 8),
+                state=_phrase(rng, 8),
+                location=rng.choice(locations) if locations else None,
+            )
+            for index in range(size.events)
+        ],
+        batch_size=BATCH_SIZE,
+    )
+    AdventureHeroSetup.objects.create(
+        adventure=adventure,
+        default_location=locations[0] if locations else None,
+        require_race=False,
+        require_body_power=False,
+        require_mind_power=False,
+        require_will_power=False,
+    )
+    if characters:
+        adventure.primary_hero = characters[0]
+        adventure.save(update_fields=["primary_hero"])
+    return characters
+
+
+def generate_template(author, size: WorldSize, seed: int = 0) -> Adventure:
+    """Create a template with a primary hero and `size` entities per kind."""
+    rng = random.Random(seed)
+    adventure = Adventure.objects.create(
+        author_user=author,
+        is_template=True,
+        title=f"Синтетический мир {seed}",
+        description=_phrase(rng, 30),
+        intro="<main_hero> открывает глаза.",
+        spec_instructions=_phrase(rng, 10),
+    )
+    _populate(adventure, size, random.Random(f"world-{seed}"))
+    return adventure
+
+
+def generate_run(
+    template: Adventure,
+    player,
+    size: WorldSize,
+    seed: int = 0,
+    run_index: int = 0,
+    progress: Optional[Callable[[int], None]] = None,
+) -> Adventure:
+    """Create a run of `template` for `player` without going through the start view.
+
+    The run gets its own entities generated from the template's seed, so it
+    matches the template in shape and content, followed by `size.history`
+    history entries that differ per `run_index`.
+    """
+    run = Adventure.objects.create(
+        author_user=template.author_user,
+        player_user=player,
+        template_adventure=template,
+        is_template=False,
+        title=template.title,
+        description=template.description,
+        intro=template.intro,
+        spec_instructions=template.spec_instructions,
+    )
+    _populate(run, size, random.Random(f"world-{seed}"))
+    generate_history(run, size.history, seed=f"{seed}-{run_index}", progress=progress)
+    return run
+
+
+def _history_stream(adventure: Adventure, count: int, rng: random.Random) -> Iterator[AdventureHistory]:
+    hero = adventure.primary_hero.title if adventure.primary_hero_id else "Герой"
+    names = {
+        "character": list(
+            Character.objects.filter(adventure=adventure).values_list("title", flat=True)[:200]
+        ) or ["незнакомец"],
+        "location": list(
+            Location.objects.filter(adventure=adventure).values_list("title", flat=True)[:200]
+        ) or ["город"],
+        "technique": list(
+            Technique.objects.filter(adventure=adventure).values_list("title", flat=True)[:200]
+        ) or ["удар"],
+    }
+    if adventure.intro and count:
+        yield AdventureHistory(
+            adventure=adventure,
+            role=AdventureHistory.Role.SYSTEM,
+            content=adventure.intro.replace("<main_hero>", hero),
+            metadata={},
+        )
+        count -= 1
+    def pick() -> dict:
+        return {kind: rng.choice(options) for kind, options in names.items()}
+
+    for index in range(count):
+        if index % 2 == 0:
+            role = AdventureHistory.Role.USER
+            content = f"{hero}: " + rng.choice(ACTIONS).format(hero=hero, **pick())
+        else:
+            role = AdventureHistory.Role.AI
+            sentences = [rng.choice(NARRATION).format(**pick()) for _ in range(rng.randint(1, 3))]
+            sentences.append(_phrase(rng, rng.randint(5, 30)).capitalize() + ".")
+            content = " ".join(sentences)
+        yield AdventureHistory(adventure=adventure, role=role, content=content, metadata={})
+
+
+def generate_history(
+    adventure: Adventure,
+    count: int,
+    seed: int | str = 0,
+    progress: Optional[Callable[[int], None]] = None,
+) -> None:
+    """Append `count` alternating user/AI entries that mention the run's cards.
+
+    Entries are streamed in batches, so 100k-entry histories stay within memory.
+    """
+    rng = random.Random(seed)
+    batch = []
+    created = 0
+    for entry in _history_stream(adventure, count, rng):
+        batch.append(entry)
+        if len(batch) >= BATCH_SIZE:
+            AdventureHistory.objects.bulk_create(batch)
+            created += len(batch)
+            batch = []
+            if progress and created % (BATCH_SIZE * 10) == 0:
+                progress(created)
+    if batch:
+        AdventureHistory.objects.bulk_create(batch)
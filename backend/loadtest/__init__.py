@@ -0,0 +1,8 @@
+"""
+Capacity-planning tools that need only the standard library.
+
+- `fake_llm`: an OpenAI- and Ollama-compatible HTTP server with configurable
+  latency, token rate, streaming and error injection.
+- `driver`: simulates concurrent players against the real API and writes a JSON
+  report that can be diffed between releases.
+"""
@@ -0,0 +1,361 @@
+"""
+Load-test driver simulating concurrent players against the real API.
+
+Every player registers and builds a small template (untimed setup) unless
+`--template-id` points to a published one, then repeats the scenario: start run -> hero setup -> hero prompts -> regenerate -> rollback
+-> PDF. Per-step latency percentiles, error counts and throughput are written
+to a JSON report.
+
+Usage:
+    python -m loadtest.driver run --base-url http://localhost:8000 --players 20 \
+        --iterations 2 --prompts 3 --output report.json
+    python -m loadtest.driver compare baseline.json report.json --threshold 0.2
+
+`compare` exits with status 1 if any step regressed by more than the threshold
+(p95 latency or throughput) or started failing more often.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import platform
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from datetime import datetime, timezone
+
+STEPS = (
+    "start_run",
+    "hero_setup",
+    "hero_prompt",
+    "regenerate",
+    "rollback",
+    "pdf",
+)
+
+HERO_PROMPTS = (
+    "Осматриваюсь по сторонам.",
+    "Подхожу к торговцу и спрашиваю о новостях.",
+    "Иду к старой башне.",
+    "Прислушиваюсь к колоколам.",
+    "Достаю карту и ищу дорогу к реке.",
+)
+
+
+class StepError(Exception):
+    def __init__(self, step: str, status: int, detail: str) -> None:
+        super().__init__(f"{step}: HTTP {status} {detail}")
+        self.status = status
+
+
+class Recorder:
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.latencies: dict[str, list[float]] = {step: [] for step in STEPS}
+        self.errors: dict[str, dict[str, int]] = {step: {} for step in STEPS}
+        self.setup_failures = 0
+
+    def ok(self, step: str, seconds: float) -> None:
+        with self.lock:
+            self.latencies[step].append(seconds)
+
+    def fail(self, step: str, reason: str) -> None:
+        with self.lock:
+            counts = self.errors[step]
+            counts[reason] = counts.get(reason, 0) + 1
+
+
+class Player:
+    def __init__(self, args: argparse.Namespace, index: int, recorder: Recorder) -> None:
+        self.base_url = args.base_url.rstrip("/")
+        self.timeout = args.request_timeout
+        self.iterations = args.iterations
+        self.prompts = args.prompts
+        self.think_time = args.think_time
+        self.index = index
+        self.recorder = recorder
+        self.token = None
+        self.template_id = args.template_id
+
+    def request(self, method: str, path: str, payload: dict | None = None, raw: bool = False):
+        data = json.dumps(payload).encode("utf-8") if payload is not None else None
+        req = urllib.request.Request(self.base_url + path, data=data, method=method)
+        if data is not None:
+            req.add_header("Content-Type", "application/json")
+        if self.token:
+            req.add_header("Authorization", f"Bearer {self.token}")
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as response:
+                body = response.read()
+        except urllib.error.HTTPError as exc:
+            detail = exc.read()[:200].decode("utf-8", "replace")
+            raise StepError(path, exc.code, detail) from None
+        if raw:
+            return body
+        return json.loads(body) if body else None
+
+    def timed(self, step: str, method: str, path: str, payload: dict | None = None, raw: bool = False):
+        started = time.perf_counter()
+        try:
+            result = self.request(method, path, payload, raw)
+        except StepError as exc:
+            self.recorder.fail(step, f"http_{exc.status}")
+            raise
+        except (urllib.error.URLError, TimeoutError, OSError) as exc:
+            reason = getattr(exc, "reason", exc)
+            self.recorder.fail(step, type(reason).__name__)
+            raise StepError(step, 0, str(reason)) from None
+        self.recorder.ok(step, time.perf_counter() - started)
+        return result
+
+    def setup(self) -> None:
+        username = f"load_{uuid.uuid4().hex[:10]}"
+        password = "LoadTest-12345"
+        self.request(
+            "POST",
+            "/api/users/register/",
+            {"username": username, "email": f"{username}@example.com", "password": password, "password2": password},
+        )
+        tokens = self.request("POST", "/api/auth/token/", {"username": username, "password": password})
+        self.token = tokens["access"]
+        if self.template_id:
+            return
+        template = self.request(
+            "POST",
+            "/api/adventures/templates/",
+            {"title": f"Нагрузочный мир {self.index}", "intro": "<main_hero> просыпается в таверне."},
+        )
+        self.template_id = template["id"]
+        base = f"/api/adventures/templates/{self.template_id}"
+        location = self.request(
+            "POST",
+            f"{base}/locations/",
+            {"title": "Таверна", "description": "Шумная таверна у тракта", "x": 0, "y": 0, "width": 2, "height": 2},
+        )
+        self.request("POST", f"{base}/characters/", {"title": "Торговец", "location": location["id"], "tags": ["торговец"]})
+        self.request("POST", f"{base}/systems/", {"title": "Магия", "w_mind": 1})
+        self.request("POST", f"{base}/events/", {"title": "Ярмарка", "status": "active", "location": location["id"]})
+        self.request(
+            "PATCH",
+            f"{base}/hero-setup/",
+            {
+                "default_location": location["id"],
+                "require_race": False,
+                "require_body_power": False,
+                "require_mind_power": False,
+                "require_will_power": False,
+            },
+        )
+
+    def pause(self) -> None:
+        if self.think_time:
+            time.sleep(self.think_time)
+
+    def scenario(self) -> None:
+        run = self.timed("start_run", "POST", f"/api/adventures/templates/{self.template_id}/start/")
+        base = f"/api/adventures/runs/{run['id']}"
+        if run.get("primary_hero") is None:
+            self.timed(
+                "hero_setup",
+                "POST",
+                f"{base}/hero/",
+                {"hero": {"title": f"Герой {self.index}"}},
+            )
+        for turn in range(self.prompts):
+            self.pause()
+            result = self.timed(
+                "hero_prompt",
+                "POST",
+                f"{base}/history/hero/",
+                {"content": HERO_PROMPTS[turn % len(HERO_PROMPTS)]},
+            )
+            # The view answers 201 even when generation failed; count it as an error.
+            if not result.get("ai_entry"):
+                self.recorder.fail("hero_prompt", "no_ai_entry")
+        self.pause()
+        self.timed("regenerate", "POST", f"{base}/history/last/regenerate/")
+        history = self.request("GET", f"{base}/history/")
+        if len(history) > 2:
+            self.timed("rollback", "POST", f"{base}/history/{history[-3]['id']}/rollback/")
+        self.timed("pdf", "GET", f"{base}/history/pdf/", raw=True)
+
+    def run(self) -> None:
+        try:
+            self.setup()
+        except (StepError, urllib.error.URLError, OSError) as exc:
+            with self.recorder.lock:
+                self.recorder.setup_failures += 1
+            print(f"player {self.index}: setup failed: {exc}", file=sys.stderr)
+            return
+        for _ in range(self.iterations):
+            try:
+                self.scenario()
+            except StepError as exc:
+                print(f"player {self.index}: {exc}", file=sys.stderr)
+
+
+def percentile(values: list[float], share: float) -> float | None:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, math.ceil(share * len(ordered)) - 1)
+    return ordered[index]
+
+
+def summarize(recorder: Recorder, wall_seconds: float) -> dict:
+    steps = {}
+    for step in STEPS:
+        values = recorder.latencies[step]
+        errors = sum(recorder.errors[step].values())
+        total = len(values) + errors
+        steps[step] = {
+            "count": len(values),
+            "errors": errors,
+            "error_rate": round(errors / total, 4) if total else 0.0,
+            "error_reasons": recorder.errors[step],
+            "throughput_rps": round(len(values) / wall_seconds, 3) if wall_seconds else 0.0,
+            "latency_ms": {
+                name: round(value * 1000, 1) if value is not None else None
+                for name, value in (
+                    ("mean", sum(values) / len(values) if values else None),
+                    ("p50", percentile(values, 0.50)),
+                    ("p90", percentile(values, 0.90)),
+                    ("p95", percentile(values, 0.95)),
+                    ("p99", percentile(values, 0.99)),
+                    ("max", max(values) if values else None),
+                )
+            },
+        }
+    return steps
+
+
+def print_report(report: dict) -> None:
+    print(f"{'step':<12} {'count':>6} {'err':>5} {'rps':>8} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}")
+    for step, data in report["steps"].items():
+        latency = data["latency_ms"]
+        cells = [f"{latency[name]:>9.1f}" if latency[name] is not None else f"{'-':>9}" for name in ("p50", "p95", "p99", "max")]
+        print(f"{step:<12} {data['count']:>6} {data['errors']:>5} {data['throughput_rps']:>8.3f} {' '.join(cells)}")
+    print(f"wall time: {report['wall_seconds']:.1f}s")
+
+
+def run_command(args: argparse.Namespace) -> int:
+    recorder = Recorder()
+    players = [Player(args, index, recorder) for index in range(args.players)]
+    threads = []
+    started = time.perf_counter()
+    for player in players:
+        thread = threading.Thread(target=player.run, daemon=True)
+        thread.start()
+        threads.append(thread)
+        if args.ramp_up:
+            time.sleep(args.ramp_up / max(1, args.players))
+    for thread in threads:
+        thread.join()
+    wall_seconds = time.perf_counter() - started
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "label": args.label,
+        "config": {
+            "base_url": args.base_url,
+            "players": args.players,
+            "iterations": args.iterations,
+            "prompts": args.prompts,
+            "think_time": args.think_time,
+            "ramp_up": args.ramp_up,
+            "template_id": args.template_id,
+        },
+        "host": {"python": platform.python_version(), "machine": platform.machine()},
+        "wall_seconds": round(wall_seconds, 3),
+        "setup_failures": recorder.setup_failures,
+        "steps": summarize(recorder, wall_seconds),
+    }
+    print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump(report, handle, ensure_ascii=False, indent=2)
+        print(f"report written to {args.output}")
+    return 0
+
+
+def _relative(old, new) -> float | None:
+    if old in (None, 0) or new is None:
+        return None
+    return (new - old) / old
+
+
+def compare_command(args: argparse.Namespace) -> int:
+    with open(args.baseline, encoding="utf-8") as handle:
+        baseline = json.load(handle)
+    with open(args.current, encoding="utf-8") as handle:
+        current = json.load(handle)
+    if baseline.get("config") != current.get("config"):
+        print("warning: reports were produced with different configs", file=sys.stderr)
+    regressions = []
+    print(f"{'step':<12} {'p95 base':>10} {'p95 new':>10} {'delta':>8} {'rps delta':>10} {'err base':>9} {'err new':>8}")
+    for step in STEPS:
+        old = baseline["steps"].get(step)
+        new = current["steps"].get(step)
+        if not old or not new:
+            continue
+        p95_delta = _relative(old["latency_ms"]["p95"], new["latency_ms"]["p95"])
+        rps_delta = _relative(old["throughput_rps"], new["throughput_rps"])
+        print(
+            f"{step:<12} {old['latency_ms']['p95'] or 0:>10.1f} {new['latency_ms']['p95'] or 0:>10.1f} "
+            f"{p95_delta * 100 if p95_delta is not None else 0:>7.1f}% "
+            f"{rps_delta * 100 if rps_delta is not None else 0:>9.1f}% "
+            f"{old['error_rate']:>9.3f} {new['error_rate']:>8.3f}"
+        )
+        if p95_delta is not None and p95_delta > args.threshold:
+            regressions.append(f"{step}: p95 +{p95_delta * 100:.1f}%")
+        if rps_delta is not None and rps_delta < -args.threshold:
+            regressions.append(f"{step}: throughput {rps_delta * 100:.1f}%")
+        if new["error_rate"] > old["error_rate"] + args.error_threshold:
+            regressions.append(f"{step}: error rate {old['error_rate']:.3f} -> {new['error_rate']:.3f}")
+    if regressions:
+        print("regressions:")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    print("no regressions")
+    return 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="run the load test")
+    run_parser.add_argument("--base-url", default="http://localhost:8000")
+    run_parser.add_argument("--players", type=int, default=10)
+    run_parser.add_argument("--iterations", type=int, default=1, help="scenarios per player")
+    run_parser.add_argument("--prompts", type=int, default=3, help="hero prompts per scenario")
+    run_parser.add_argument("--think-time", type=float, default=0.0, help="seconds between player actions")
+    run_parser.add_argument("--ramp-up", type=float, default=0.0, help="seconds to start all players")
+    run_parser.add_argument("--request-timeout", type=float, default=300.0)
+    run_parser.add_argument(
+        "--template-id",
+        type=int,
+        default=None,
+        help="start this published template (e.g. from `manage.py generate_world --publish`) instead of a small one",
+    )
+    run_parser.add_argument("--label", default="")
+    run_parser.add_argument("--output", default="")
+    run_parser.set_defaults(handler=run_command)
+
+    compare_parser = subparsers.add_parser("compare", help="diff two reports")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative p95/throughput change")
+    compare_parser.add_argument("--error-threshold", type=float, default=0.01, help="allowed error rate increase")
+    compare_parser.set_defaults(handler=compare_command)
+
+    args = parser.parse_args()
+    sys.exit(args.handler(args))
+
+
+if __name__ == "__main__":
+    main()
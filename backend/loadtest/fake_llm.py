@@ -0,0 +1,281 @@
+"""
+Fake LLM server speaking the OpenAI chat completions and Ollama generate APIs.
+
+Usage:
+    python -m loadtest.fake_llm --port 8081 --latency lognormal:0.4,0.5 --tokens-per-second 40
+
+Then point the backend at it, e.g. `LLM_PROVIDER=openai-compatible
+LLM_BASE_URL=http://localhost:8081/v1 LLM_API_KEY=fake` or `LLM_PROVIDER=ollama
+OLLAMA_URL=http://localhost:8081`.
+
+Latency distributions (seconds until the first token):
+    const:0.5 | uniform:0.2,1.5 | normal:0.8,0.2 | lognormal:MU,SIGMA | exp:MEAN
+After the first token, completion tokens are produced at `--tokens-per-second`.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = (
+    "герой шагнул вперед ветер шептал над старым трактом где-то вдали звенели колокола "
+    "стража переглянулась торговец улыбнулся туман скрывал башню маг поднял посох "
+    "дракон спал под горой дорога вела к реке в таверне пахло дымом"
+).split()
+
+EMPTY_CARD_UPDATE = {
+    "events": [],
+    "characters": [],
+    "character_systems": [],
+    "character_techniques": [],
+}
+
+
+def parse_distribution(spec: str):
+    kind, _, raw = spec.partition(":")
+    args = [float(value) for value in raw.split(",") if value]
+    if kind == "const":
+        return lambda rng: args[0]
+    if kind == "uniform":
+        return lambda rng: rng.uniform(args[0], args[1])
+    if kind == "normal":
+        return lambda rng: max(0.0, rng.gauss(args[0], args[1]))
+    if kind == "lognormal":
+        return lambda rng: rng.lognormvariate(args[0], args[1])
+    if kind == "exp":
+        return lambda rng: rng.expovariate(1.0 / args[0])
+    raise argparse.ArgumentTypeError(f"Unknown latency distribution: {spec}")
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, math.ceil(len(text) / 4))
+
+
+class FakeLLM:
+    def __init__(self, args: argparse.Namespace) -> None:
+        self.latency = parse_distribution(args.latency)
+        self.tokens_per_second = args.tokens_per_second
+        self.max_words = args.max_words
+        self.error_rate = args.error_rate
+        self.timeout_rate = args.timeout_rate
+        self.hang_seconds = args.hang_seconds
+        self.rng = random.Random(args.seed)
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "errors": 0, "hangs": 0, "in_flight": 0, "max_in_flight": 0}
+
+    def plan(self, max_tokens: int, wants_json: bool) -> tuple[str, float, str]:
+        """Decide the outcome of a request: `(outcome, first_token_delay, text)`."""
+        with self.lock:
+            roll = self.rng.random()
+            delay = self.latency(self.rng)
+            words = self.rng.randint(max(1, self.max_words // 2), self.max_words)
+            text_words = [self.rng.choice(WORDS) for _ in range(words)]
+        if roll < self.error_rate:
+            return "error", delay, ""
+        if roll < self.error_rate + self.timeout_rate:
+            return "hang", self.hang_seconds, ""
+        if wants_json:
+            return "ok", delay, json.dumps(EMPTY_CARD_UPDATE, ensure_ascii=False)
+        text = " ".join(text_words).capitalize() + "."
+        while estimate_tokens(text) > max_tokens and " " in text:
+            text = text.rsplit(" ", 1)[0]
+        return "ok", delay, text
+
+    def chunks(self, text: str) -> list[str]:
+        pieces = text.split(" ")
+        return [piece if index == 0 else " " + piece for index, piece in enumerate(pieces)]
+
+    def token_delay(self, text: str) -> float:
+        if self.tokens_per_second <= 0:
+            return 0.0
+        return estimate_tokens(text) / self.tokens_per_second
+
+    def enter(self) -> None:
+        with self.lock:
+            self.stats["requests"] += 1
+            self.stats["in_flight"] += 1
+            self.stats["max_in_flight"] = max(self.stats["max_in_flight"], self.stats["in_flight"])
+
+    def leave(self, outcome: str) -> None:
+        with self.lock:
+            self.stats["in_flight"] -= 1
+            if outcome == "error":
+                self.stats["errors"] += 1
+            elif outcome == "hang":
+                self.stats["hangs"] += 1
+
+
+class Handler(BaseHTTPRequestHandler):
+    server_version = "FakeLLM/1.0"
+    protocol_version = "HTTP/1.1"
+
+    @property
+    def llm(self) -> FakeLLM:
+        return self.server.llm
+
+    def log_message(self, format, *args):  # noqa: A002 - signature of the base class
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, status: int, payload: dict) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _start_stream(self, content_type: str) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def _write_chunk(self, data: str) -> None:
+        raw = data.encode("utf-8")
+        self.wfile.write(f"{len(raw):X}\r\n".encode("ascii") + raw + b"\r\n")
+        self.wfile.flush()
+
+    def _end_stream(self) -> None:
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path in ("/stats", "/stats/"):
+            with self.llm.lock:
+                self._send_json(200, dict(self.llm.stats))
+        elif self.path in ("/v1/models", "/models"):
+            self._send_json(200, {"data": [{"id": "fake", "object": "model"}]})
+        elif self.path == "/api/tags":
+            self._send_json(200, {"models": [{"name": "fake"}]})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self._send_json(400, {"error": "invalid json"})
+            return
+        if self.path.endswith("/chat/completions"):
+            self._openai(payload)
+        elif self.path == "/api/generate":
+            self._ollama(payload)
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def _run(self, max_tokens: int, wants_json: bool) -> tuple[str, str]:
+        outcome, delay, text = self.llm.plan(max_tokens, wants_json)
+        time.sleep(delay)
+        return outcome, text
+
+    def _openai(self, payload: dict) -> None:
+        messages = payload.get("messages") or []
+        prompt_text = "\n".join(str(message.get("content", "")) for message in messages)
+        wants_json = bool(payload.get("response_format"))
+        self.llm.enter()
+        outcome = "ok"
+        try:
+            outcome, text = self._run(int(payload.get("max_tokens") or 512), wants_json)
+            if outcome != "ok":
+                self._send_json(500, {"error": {"message": "injected failure"}})
+                return
+            prompt_tokens = estimate_tokens(prompt_text)
+            completion_tokens = estimate_tokens(text)
+            if payload.get("stream"):
+                self._start_stream("text/event-stream")
+                for piece in self.llm.chunks(text):
+                    time.sleep(self.llm.token_delay(piece))
+                    chunk = {"object": "chat.completion.chunk", "choices": [{"index": 0, "delta": {"content": piece}}]}
+                    self._write_chunk(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n")
+                self._write_chunk("data: [DONE]\n\n")
+                self._end_stream()
+                return
+            time.sleep(self.llm.token_delay(text))
+            self._send_json(
+                200,
+                {
+                    "object": "chat.completion",
+                    "model": payload.get("model", "fake"),
+                    "choices": [
+                        {"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}
+                    ],
+                    "usage": {
+                        "prompt_tokens": prompt_tokens,
+                        "completion_tokens": completion_tokens,
+                        "total_tokens": prompt_tokens + completion_tokens,
+                        "prompt_tokens_details": {"cached_tokens": 0},
+                    },
+                },
+            )
+        finally:
+            self.llm.leave(outcome)
+
+    def _ollama(self, payload: dict) -> None:
+        prompt_text = f"{payload.get('system', '')}\n{payload.get('prompt', '')}"
+        options = payload.get("options") or {}
+        wants_json = bool(payload.get("format"))
+        self.llm.enter()
+        outcome = "ok"
+        try:
+            outcome, text = self._run(int(options.get("num_predict") or 512), wants_json)
+            if outcome != "ok":
+                self._send_json(500, {"error": "injected failure"})
+                return
+            done = {
+                "model": payload.get("model", "fake"),
+                "done": True,
+                "prompt_eval_count": estimate_tokens(prompt_text),
+                "eval_count": estimate_tokens(text),
+            }
+            # Ollama streams by default.
+            if payload.get("stream", True):
+                self._start_stream("application/x-ndjson")
+                for piece in self.llm.chunks(text):
+                    time.sleep(self.llm.token_delay(piece))
+                    self._write_chunk(json.dumps({"response": piece, "done": False}, ensure_ascii=False) + "\n")
+                self._write_chunk(json.dumps({**done, "response": ""}) + "\n")
+                self._end_stream()
+                return
+            time.sleep(self.llm.token_delay(text))
+            self._send_json(200, {**done, "response": text})
+        finally:
+            self.llm.leave(outcome)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", default="lognormal:-1.0,0.5", help="first-token latency distribution")
+    parser.add_argument("--tokens-per-second", type=float, default=40.0, help="0 disables the token delay")
+    parser.add_argument("--max-words", type=int, default=50)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with HTTP 500")
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="share of requests that hang")
+    parser.add_argument("--hang-seconds", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=0, help="RNG seed (fixed by default so runs are repeatable)")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+    parse_distribution(args.latency)
+
+    server = ThreadingHTTPServer((args.host, args.port), Handler)
+    server.daemon_threads = True
+    server.llm = FakeLLM(args)
+    server.verbose = args.verbose
+    print(f"Fake LLM listening on http://{args.host}:{args.port} (latency {args.latency})", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()